@@ -0,0 +1,202 @@
+import os
+import re
+import hashlib
+import logging
+import threading
+from concurrent.futures import Future
+from datetime import date, datetime, timedelta, timezone
+from functools import wraps
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import orjson
+from fastapi_cache.backends import Backend
+from fastapi_cache.coder import Coder
+from fastapi_cache.backends.inmemory import InMemoryBackend
+from starlette.requests import Request
+from starlette.responses import Response
+
+from static_snapshots import TRAIN_RUNS_SNAPSHOT, snapshot_path
+
+# Typy argumentów endpointu, które wchodzą do klucza cache. Zależności (klient bazy, Request)
+# mają w repr adres obiektu, więc domyślny key builder fastapi-cache dawał inny klucz przy każdym żądaniu.
+_KEY_ARG_TYPES = (str, int, float, bool, date, type(None))
+
+# Dane z wczoraj są ostateczne dopiero po nocnym łataniu (backup_patch.yml startuje najwcześniej o 01:00 UTC)
+FINALISED_AFTER_UTC_HOUR = int(os.environ.get("FINALISED_AFTER_UTC_HOUR", "5"))
+# Czas trzymania odpowiedzi dla dni zamkniętych: w cache serwera i w przeglądarkach/CDN
+FINAL_SERVER_TTL = 7 * 24 * 3600
+FINAL_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Tylko szczegóły przejazdu (/train-runs/{id}) — /train-runs/{id}/prediction zależy od codziennie uczonego modelu
+_TRAIN_ID_PATH_RE = re.compile(r"^/train-runs/(\d{8})[^/]*$")
+
+
+def is_finalised(day: date, now: Optional[datetime] = None) -> bool:
+    """
+    Czy dane dla dnia już się nie zmienią: minęła godzina graniczna następnego dnia i dzień ma statyczny snapshot.
+    Snapshot powstaje dopiero po opróżnieniu kolejki pobierania dnia i nocnym łataniu (scripts/check_day_ready.py),
+    więc pociągi pobierane po przyjeździe, także po północy, są już w bazie.
+    """
+    now = now or datetime.now(timezone.utc)
+    next_day = day + timedelta(days=1)
+    finalised_at = datetime(next_day.year, next_day.month, next_day.day, FINALISED_AFTER_UTC_HOUR, tzinfo=timezone.utc)
+    return now >= finalised_at and os.path.exists(snapshot_path(day.isoformat(), TRAIN_RUNS_SNAPSHOT))
+
+
+def request_day(request: Request) -> Optional[date]:
+    """
+    Dzień, którego dotyczy żądanie: z identyfikatora przejazdu (YYYYMMDDnnnn) albo z jawnego parametru ?date=.
+    Żądania bez daty (domyślnie "wczoraj") zmieniają znaczenie co dobę, więc zwracamy dla nich None.
+    """
+    match = _TRAIN_ID_PATH_RE.match(request.url.path)
+    raw = f"{match.group(1)[:4]}-{match.group(1)[4:6]}-{match.group(1)[6:]}" if match else request.query_params.get("date")
+    if not raw:
+        return None
+    try:
+        return date.fromisoformat(raw)
+    except ValueError:
+        return None
+
+
+def is_final_request(request: Optional[Request]) -> bool:
+    """Czy odpowiedź na żądanie jest niezmienna i może być trzymana długo."""
+    if request is None:
+        return False
+    day = request_day(request)
+    return day is not None and is_finalised(day)
+
+
+def create_cache_backend(logger: logging.Logger) -> Backend:
+    """
+    Zwraca backend cache współdzielony przez workery: Redis, jeśli ustawiono REDIS_URL,
+    w przeciwnym razie lokalny InMemoryBackend (np. uruchomienie lokalne i testy).
+    """
+    redis_url = os.environ.get("REDIS_URL")
+    if not redis_url:
+        logger.info("Brak REDIS_URL — cache API w pamięci procesu.")
+        return FinalDayBackend(InMemoryBackend())
+
+    try:
+        from redis import asyncio as aioredis
+        from fastapi_cache.backends.redis import RedisBackend
+    except ImportError as e:
+        logger.error(f"Ustawiono REDIS_URL, ale nie można zaimportować klienta Redis: {e}. Cache w pamięci procesu.")
+        return FinalDayBackend(InMemoryBackend())
+
+    logger.info("Cache API w Redis (współdzielony przez workery).")
+    return FinalDayBackend(RedisBackend(aioredis.from_url(redis_url)))
+
+
+def _call_key(func: Callable, kwargs: Dict[str, Any]) -> str:
+    """Klucz wywołania endpointu zbudowany wyłącznie z argumentów żądania (ścieżka i parametry zapytania)."""
+    args = sorted((k, repr(v)) for k, v in kwargs.items() if isinstance(v, _KEY_ARG_TYPES))
+    return hashlib.md5(f"{func.__module__}:{func.__name__}:{args}".encode()).hexdigest()
+
+
+def request_key_builder(
+    func: Callable[..., Any],
+    namespace: str = "",
+    *,
+    request: Optional[Request] = None,
+    response: Optional[Response] = None,
+    args: tuple = (),
+    kwargs: Dict[str, Any],
+) -> str:
+    """
+    Key builder dla fastapi-cache: ten sam klucz w każdym workerze i po każdym restarcie.
+    Klucze odpowiedzi dla dni zamkniętych dostają znacznik ":final:", po którym FinalDayBackend wydłuża TTL.
+    """
+    scope = "final" if is_final_request(request) else "live"
+    return f"{namespace}:{scope}:{_call_key(func, kwargs)}"
+
+
+class FinalDayBackend(Backend):
+    """Nakładka na backend cache: wpisy dla dni zamkniętych trzymamy FINAL_SERVER_TTL zamiast TTL endpointu."""
+
+    def __init__(self, backend: Backend):
+        self.backend = backend
+
+    async def get_with_ttl(self, key: str) -> Tuple[int, Optional[bytes]]:
+        return await self.backend.get_with_ttl(key)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.backend.get(key)
+
+    async def set(self, key: str, value: bytes, expire: Optional[int] = None) -> None:
+        if ":final:" in key:
+            expire = FINAL_SERVER_TTL
+        await self.backend.set(key, value, expire)
+
+    async def clear(self, namespace: Optional[str] = None, key: Optional[str] = None) -> int:
+        return await self.backend.clear(namespace, key)
+
+
+def strong_etag(body: bytes) -> str:
+    """Silny ETag z treści odpowiedzi — identyczny w każdym workerze (w przeciwieństwie do hash() w fastapi-cache)."""
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Porównanie nagłówka If-None-Match z ETagiem (lista wartości, "*" i prefiks W/)."""
+    if not if_none_match:
+        return False
+    candidates = [c.strip() for c in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+class RawJSONCoder(Coder):
+    """
+    Koder dla endpointów zwracających gotowy tekst JSON: w cache trzymamy dokładnie treść odpowiedzi,
+    a trafienie zwraca ją bez dekodowania i ponownej serializacji.
+    """
+
+    @classmethod
+    def encode(cls, value: Any) -> bytes:
+        if isinstance(value, str):
+            return value.encode("utf-8")
+        return orjson.dumps(value)
+
+    @classmethod
+    def decode(cls, value: bytes) -> Any:
+        return value.decode("utf-8")
+
+    @classmethod
+    def decode_as_type(cls, value: bytes, *, type_: Any) -> Any:
+        return cls.decode(value)
+
+
+_inflight: Dict[str, Future] = {}
+_inflight_lock = threading.Lock()
+
+
+def coalesce(func: Callable) -> Callable:
+    """
+    Łączy równoległe wywołania synchronicznego endpointu z tymi samymi argumentami:
+    pierwsze wykonuje zapytanie do bazy, pozostałe czekają na jego wynik (lub wyjątek).
+    Używany pod @cache, więc chroni przed lawiną zapytań przy pustym cache (np. po deployu).
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        key = _call_key(func, kwargs)
+        with _inflight_lock:
+            future = _inflight.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = _inflight[key] = Future()
+
+        if not is_leader:
+            return future.result()
+
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with _inflight_lock:
+                _inflight.pop(key, None)
+
+    return wrapper
@@ -0,0 +1,111 @@
+import io
+from datetime import date
+from typing import Iterator, List, Tuple
+
+import orjson
+import psycopg
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Kolumny widoku view_run_stops_export (sql/setup_api.sql) w kolejności eksportu
+EXPORT_SCHEMA = pa.schema([
+    ("date", pa.date32()),
+    ("train_id", pa.string()),
+    ("number", pa.string()),
+    ("name", pa.string()),
+    ("category", pa.string()),
+    ("from_station", pa.string()),
+    ("to_station", pa.string()),
+    ("is_domestic", pa.bool_()),
+    ("occupancy", pa.string()),
+    ("run_is_cancelled", pa.bool_()),
+    ("stop_order", pa.int32()),
+    ("station_name", pa.string()),
+    ("scheduled_arrival", pa.time64("us")),
+    ("scheduled_departure", pa.time64("us")),
+    ("delay_arrival_min", pa.int32()),
+    ("delay_departure_min", pa.int32()),
+    ("distance_from_start_km", pa.float64()),
+    ("stop_is_cancelled", pa.bool_()),
+    ("difficulties", pa.string()),
+])
+EXPORT_COLUMNS = EXPORT_SCHEMA.names
+
+EXPORT_QUERY = (
+    f"SELECT {', '.join(EXPORT_COLUMNS)} FROM view_run_stops_export "
+    "WHERE date BETWEEN %s AND %s "
+    "ORDER BY date, number, stop_order"
+)
+
+# Liczba wierszy pobieranych z kursora serwerowego naraz (i wielkość grupy wierszy w pliku Parquet)
+EXPORT_BATCH_SIZE = 10000
+
+
+def iter_export_batches(database_url: str, date_from: date, date_to: date,
+                        batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[List[Tuple]]:
+    """
+    Zwraca kolejne porcje wierszy eksportu z kursora po stronie serwera (nazwany kursor psycopg),
+    więc pamięć API zależy od wielkości porcji, a nie od długości zakresu dat.
+    """
+    with psycopg.connect(database_url) as conn:
+        with conn.cursor(name="run_stops_export") as cur:
+            cur.itersize = batch_size
+            cur.execute(EXPORT_QUERY, (date_from, date_to))
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    return
+                yield rows
+
+
+def ndjson_stream(batches: Iterator[List[Tuple]]) -> Iterator[bytes]:
+    """NDJSON: jeden przystanek w linii; każda porcja z kursora jest wysyłana jako jeden fragment odpowiedzi."""
+    for rows in batches:
+        yield b"".join(orjson.dumps(dict(zip(EXPORT_COLUMNS, row))) + b"\n" for row in rows)
+
+
+class _ChunkSink(io.RawIOBase):
+    """Strumień tylko do zapisu, z którego generator odbiera bajty zapisane przez ParquetWriter."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def parquet_stream(batches: Iterator[List[Tuple]]) -> Iterator[bytes]:
+    """
+    Parquet: każda porcja z kursora staje się osobną grupą wierszy, a jej bajty są wysyłane od razu
+    po zapisaniu; stopka pliku trafia do klienta na końcu.
+    """
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, EXPORT_SCHEMA, compression="zstd")
+    try:
+        for rows in batches:
+            columns = list(zip(*rows))
+            table = pa.Table.from_arrays(
+                [pa.array(column, type=field.type) for column, field in zip(columns, EXPORT_SCHEMA)],
+                schema=EXPORT_SCHEMA,
+            )
+            writer.write_table(table)
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    finally:
+        writer.close()
+    yield sink.drain()
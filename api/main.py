@@ -1,19 +1,35 @@
 from datetime import date, datetime, timedelta
 from typing import List, Optional
 from pydantic import BaseModel
-from fastapi import FastAPI, HTTPException, Query, Depends, Request
+from fastapi import FastAPI, HTTPException, Query, Depends, Request, Response
 from supabase import create_client, Client
 import os
 import time
 import logging
 from dotenv import load_dotenv
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import StreamingResponse
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 from fastapi_cache import FastAPICache
-from fastapi_cache.backends.inmemory import InMemoryBackend
 from fastapi_cache.decorator import cache
+from api.cache import (
+    FINAL_CACHE_CONTROL,
+    RawJSONCoder,
+    coalesce,
+    create_cache_backend,
+    etag_matches,
+    is_final_request,
+    request_key_builder,
+    strong_etag,
+)
+from api.export import iter_export_batches, ndjson_stream, parquet_stream
+from api.responses import RawJSONResponse, dump_json
+from delay_prediction import DelayPredictor, latest_observed_stop, prediction_features
+from delay_stats import DELAY_STATS_SORT_FIELDS, STATS_DIMENSIONS
+from static_snapshots import STATION_SCHEDULE_FIELDS, STATION_SCHEDULES_SNAPSHOT, TRAIN_RUNS_SNAPSHOT, read_snapshot
 # ── Logging setup ──────────────────────────────────────────────────────────────
 logging.basicConfig(
     level=logging.INFO,
@@ -29,7 +45,8 @@ _startup_time: float = time.time()
 _first_request_time: Optional[float] = None
 _requests_since_startup: int = 0
 
-app = FastAPI(title="Train Delays API")
+# Endpointy zwracają gotowy tekst JSON (dump_json) — bez walidacji wierszy modelami Pydantic i bez ponownej serializacji
+app = FastAPI(title="Train Delays API", default_response_class=RawJSONResponse)
 
 origins = [
     "http://localhost:3000",
@@ -41,6 +58,9 @@ origins = [
 
 def custom_key_func(request: Request) -> str:
     ip = get_remote_address(request)
+    # Eksport jest kosztowny (pełny skan zakresu dat), więc ma własny bucket niezależny od nagłówka klienta
+    if request.url.path.startswith("/export"):
+        return f"export:{ip}"
     # Rozdzielamy buckety na podstawie nagłówka by skrypty nie blokowały przeglądarki na tym samym IP
     if request.headers.get("x-custom-client") == "spoznienia-frontend":
         return f"front:{ip}"
@@ -63,7 +83,8 @@ app.add_middleware(
 async def on_startup():
     global _startup_time
     _startup_time = time.time()
-    FastAPICache.init(InMemoryBackend(), prefix="fastapi-cache")
+    FastAPICache.init(create_cache_backend(logger), prefix="fastapi-cache", key_builder=request_key_builder,
+                      coder=RawJSONCoder)
     logger.info("=== API SERVER STARTED (cold start) at %s ===", datetime.utcnow().isoformat())
 
 
@@ -100,6 +121,45 @@ async def log_requests(request: Request, call_next):
     return response
 
 
+@app.middleware("http")
+async def http_cache_headers(request: Request, call_next):
+    """
+    Strong ETag + 304 Not Modified for GET responses. Data for finalised days (past dates after
+    the nightly patch) never changes, so those responses are marked immutable for browsers and the CDN;
+    everything else keeps the short max-age set by @cache.
+    """
+    response = await call_next(request)
+    if request.method != "GET" or response.status_code != 200:
+        return response
+    # Odpowiedzi strumieniowe (eksport) nie mają content-length — nie buforujemy ich w pamięci
+    if "content-length" not in response.headers:
+        return response
+
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    headers = dict(response.headers)
+    etag = strong_etag(body)
+    headers["etag"] = etag
+    if is_final_request(request):
+        headers["cache-control"] = FINAL_CACHE_CONTROL
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        headers.pop("content-length", None)
+        headers.pop("content-type", None)
+        return Response(status_code=304, headers=headers)
+
+    return Response(content=body, status_code=response.status_code, headers=headers,
+                    media_type=response.media_type)
+
+
+# Kompresja jako najbardziej zewnętrzna warstwa (ETag liczony jest z nieskompresowanej treści).
+# Brotli, jeśli dostępny brotli-asgi (z gzip dla klientów bez "br"), w przeciwnym razie sam gzip.
+try:
+    from brotli_asgi import BrotliMiddleware
+    app.add_middleware(BrotliMiddleware, minimum_size=1000, gzip_fallback=True)
+except ImportError:
+    app.add_middleware(GZipMiddleware, minimum_size=1000)
+
+
 def get_db() -> Client:
     url: str = os.environ.get("SUPABASE_URL")
     key: str = os.environ.get("SUPABASE_SERVICE_KEY")
@@ -112,17 +172,20 @@ class TrainSummary(BaseModel):
     id: str
     date: str
     number: str
-    name: Optional[str]
-    category: Optional[str]
-    from_station: Optional[str]
-    to_station: Optional[str]
-    is_domestic: bool
-    occupancy: Optional[str]
-    scheduled_departure: Optional[str]
-    scheduled_arrival: Optional[str]
+    name: Optional[str] = None
+    category: Optional[str] = None
+    from_station: Optional[str] = None
+    to_station: Optional[str] = None
+    is_domestic: Optional[bool] = None
+    occupancy: Optional[str] = None
+    scheduled_departure: Optional[str] = None
+    scheduled_arrival: Optional[str] = None
     delay_at_destination: Optional[int] = 0
     is_cancelled: bool = False
 
+# Pola zawsze zwracane przy projekcji (?fields=...) — identyfikują przejazd i służą jako kursor stronicowania
+TRAIN_SUMMARY_KEY_FIELDS = ["id", "date", "number"]
+
 class StationScheduleItem(BaseModel):
     train_number: str
     train_category: Optional[str]
@@ -152,11 +215,53 @@ class StopDetail(BaseModel):
 class TrainDetail(TrainSummary):
     stops: List[StopDetail]
 
+class DelayPrediction(BaseModel):
+    train_id: str
+    station_name: str
+    stop_order: int
+    current_delay: int
+    predicted_delay_at_destination: float
+    delay_at_destination: Optional[int] = None
+    model_trained_at: str
+
+class DelayStat(BaseModel):
+    date: str
+    dimension: str
+    key: str
+    runs: int
+    stops: int
+    mean_delay: Optional[float]
+    median_delay: Optional[float]
+    p90_delay: Optional[float]
+    delayed_share: Optional[float]
+    cancelled_runs: int
+    cancellation_rate: float
+
+class DifficultyStat(BaseModel):
+    date: str
+    category: str
+    stops: int
+    runs: int
+
+def _filter_train_snapshot(rows: List[dict], number: Optional[str], station: Optional[str], cursor: Optional[str],
+                           offset: int, limit: int, columns: List[str]) -> List[dict]:
+    """Applies the /train-runs filters, keyset pagination and projection to a day snapshot (rows sorted by number)."""
+    if number:
+        rows = [r for r in rows if r["number"].startswith(number)]
+    if station:
+        station_lower = station.lower()
+        rows = [r for r in rows if station_lower in ((r["from_station"] or "").lower(), (r["to_station"] or "").lower())]
+    if cursor:
+        rows = [r for r in rows if r["number"] > cursor]
+    rows = rows[offset:offset + limit] if offset and not cursor else rows[:limit]
+    return [{c: r.get(c) for c in columns} for r in rows]
+
 # --- Endpoints ---
 
-@app.get("/stations", response_model=List[str])
+@app.get("/stations", response_model=None, responses={200: {"model": List[str]}})
 @limiter.limit("60/minute")
 @cache(expire=3600)  # Czas trzymania: 1 godzina
+@coalesce
 def list_stations(request: Request, db: Client = Depends(get_db)):
     """
     Returns a list of domestic station names ranked by passenger volume (cacheable on frontend).
@@ -167,45 +272,76 @@ def list_stations(request: Request, db: Client = Depends(get_db)):
             .eq("is_domestic", True)\
             .order("passenger_volume_rank", nullsfirst=False)\
             .execute()
-        return [s["name"] for s in response.data]
+        return dump_json([s["name"] for s in response.data])
     except Exception as e:
         logger.error("Error in list_stations: %s", str(e))
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
-@app.get("/train-runs", response_model=List[TrainSummary])
+@app.get("/train-runs", response_model=None, responses={200: {"model": List[TrainSummary]}})
 @limiter.limit("60/minute")
 @cache(expire=60)
+@coalesce
 def list_trains(
     request: Request,
     date: Optional[date] = None,
-    number: Optional[str] = None,
+    number: Optional[str] = Query(None, description="Prefix of the train number."),
     station: Optional[str] = None, # Simple/Global filter
-    offset: int = 0,
-    limit: int = 500,
+    cursor: Optional[str] = Query(None, description="Keyset cursor: number of the last train on the previous page."),
+    fields: Optional[str] = Query(None, description="Comma-separated list of fields to return (id, date and number are always included)."),
+    offset: int = Query(0, ge=0, description="Deprecated, use cursor instead."),
+    limit: int = Query(500, ge=1, le=500),
     db: Client = Depends(get_db)
 ):
     # Default date: Yesterday
     if not date:
         date = datetime.today() - timedelta(days=1)
-    
-    # Use the SQL View
-    query = db.table("view_train_summaries").select("*")
+
+    if fields:
+        requested = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = [f for f in requested if f not in TrainSummary.model_fields]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+        columns = list(dict.fromkeys(TRAIN_SUMMARY_KEY_FIELDS + requested))
+    else:
+        columns = list(TrainSummary.model_fields)
+
+    if number and not number.isalnum():
+        raise HTTPException(status_code=400, detail="Train number may only contain letters and digits.")
+
+    # Zamknięte dni mają statyczny snapshot (scripts/export_snapshots.py) — odpowiadamy z niego bez zapytania do bazy
+    snapshot = read_snapshot(date.strftime("%Y-%m-%d"), TRAIN_RUNS_SNAPSHOT)
+    if snapshot is not None:
+        return dump_json(_filter_train_snapshot(snapshot, number, station, cursor, offset, limit, columns))
+
+    # Use the SQL View (backed by train_run_summaries, index on (date, number))
+    query = db.table("view_train_summaries").select(",".join(columns))
     query = query.eq("date", date)
     
     if number:
-        query = query.ilike("number", f"%{number}%")
+        # Wyszukiwanie prefiksowe korzysta z indeksu (date, number varchar_pattern_ops) zamiast pełnego skanu '%number%'
+        query = query.like("number", f"{number}%")
         
     if station:
         query = query.or_(f"from_station.ilike.{station},to_station.ilike.{station}")
 
-    query = query.range(offset, offset + limit - 1)
+    # Stronicowanie keyset po (date, number): data jest ustalona filtrem, więc wystarczy warunek na numerze
+    if cursor:
+        query = query.gt("number", cursor)
+    query = query.order("number")
+
+    if offset and not cursor:
+        query = query.range(offset, offset + limit - 1)
+    else:
+        query = query.limit(limit)
     response = query.execute()
     
-    return response.data
+    # Wiersze mają już kształt TrainSummary (kolumny widoku) — serializujemy je bez ponownej walidacji
+    return dump_json(response.data)
 
-@app.get("/stations/{name}/schedule", response_model=List[StationScheduleItem])
+@app.get("/stations/{name}/schedule", response_model=None, responses={200: {"model": List[StationScheduleItem]}})
 @limiter.limit("60/minute")
 @cache(expire=30)
+@coalesce
 def get_station_schedule(
     request: Request,
     name: str,
@@ -219,6 +355,12 @@ def get_station_schedule(
     if not date:
         date = datetime.today() - timedelta(days=1)
 
+    # Snapshot zamkniętego dnia zawiera tablice wszystkich stacji (nazwa porównywana bez względu na wielkość liter)
+    boards = read_snapshot(date.strftime("%Y-%m-%d"), STATION_SCHEDULES_SNAPSHOT)
+    if boards is not None:
+        name_lower = name.lower()
+        return dump_json(next((items for station_name, items in boards.items() if station_name.lower() == name_lower), []))
+
     # Call the SQL function (RPC)
     try:
         response = db.rpc("get_station_schedule", {
@@ -226,15 +368,16 @@ def get_station_schedule(
             "p_date": date.isoformat()
         }).execute()
         
-        return response.data
+        return dump_json([{f: row.get(f) for f in STATION_SCHEDULE_FIELDS} for row in response.data])
     except Exception as e:
         logger.error("Error in get_station_schedule (station=%s, date=%s): %s", name, date, str(e))
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 
-@app.get("/train-runs/{train_id}", response_model=TrainDetail)
+@app.get("/train-runs/{train_id}", response_model=None, responses={200: {"model": TrainDetail}})
 @limiter.limit("60/minute")
 @cache(expire=60)
+@coalesce
 def get_train_detail(request: Request, train_id: str, db: Client = Depends(get_db)):
     # 1. Parse ID: YYYYMMDDnnnn -> Date, Number
     if len(train_id) < 9:
@@ -243,50 +386,281 @@ def get_train_detail(request: Request, train_id: str, db: Client = Depends(get_d
     date_part = f"{train_id[:4]}-{train_id[4:6]}-{train_id[6:8]}"
     number_part = train_id[8:]
     
-    # 2. Get Train Info
-    train_res = db.table("view_train_summaries")\
-        .select("*")\
-        .eq("date", date_part)\
-        .eq("number", number_part)\
-        .execute()
+    # 2. Podsumowanie, przystanki i utrudnienia jednym wywołaniem RPC (funkcja get_train_detail w sql/setup_api.sql).
+    # Dokument ma już kształt TrainDetail, więc zwracamy go bez budowania modeli StopDetail dla każdego przystanku.
+    try:
+        response = db.rpc("get_train_detail", {
+            "p_date": date_part,
+            "p_number": number_part
+        }).execute()
+    except Exception as e:
+        logger.error("Error in get_train_detail (train_id=%s): %s", train_id, str(e))
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
         
-    if not train_res.data:
+    if not response.data:
         raise HTTPException(status_code=404, detail="Train not found")
     
-    train = train_res.data[0]
-    internal_id = train['internal_id'] 
-    
-    # 3. Get Stops
-    stops_res = db.table("run_stops")\
-        .select("*, stations(name, is_domestic, latitude, longitude), run_stop_difficulties(*, difficulties(description))")\
-        .eq("run_id", internal_id)\
-        .order("stop_order")\
-        .execute()
-        
-    stops_data = []
-    for s in stops_res.data:
-        diffs = []
-        if s.get('run_stop_difficulties'):
-            for d in s['run_stop_difficulties']:
-                 if d.get('difficulties'):
-                     diffs.append({
-                         "description": d['difficulties']['description'],
-                         "location": d.get('location')
-                     })
-        
-        stops_data.append(StopDetail(
-            station_name=s['stations']['name'],
-            stop_order=s['stop_order'],
-            arrival_time=s['scheduled_arrival'],
-            departure_time=s['scheduled_departure'],
-            delay_minutes_arrival=s['delay_arrival_min'],
-            delay_minutes_departure=s['delay_departure_min'],
-            distance_from_start_km=s['distance_from_start_km'],
-            is_domestic=s['stations']['is_domestic'],
-            latitude=s['stations'].get('latitude'),
-            longitude=s['stations'].get('longitude'),
-            difficulties=diffs,
-            is_cancelled=s.get('is_cancelled', False)
-        ))
-        
-    return {**train, "stops": stops_data}
+    return dump_json(response.data)
+
+
+# Model predykcji (delay_model.py) trzymany w pamięci procesu; nowa wersja z nocnego uczenia jest
+# pobierana najpóźniej po MODEL_REFRESH_SECONDS
+MODEL_REFRESH_SECONDS = 3600
+_delay_model = {"predictor": None, "trained_at": None, "loaded_at": 0.0}
+
+def _get_delay_predictor(db: Client) -> Optional[DelayPredictor]:
+    """Returns the newest delay model, reloading it from the delay_models table at most once per MODEL_REFRESH_SECONDS."""
+    if time.monotonic() - _delay_model["loaded_at"] < MODEL_REFRESH_SECONDS and _delay_model["predictor"]:
+        return _delay_model["predictor"]
+    try:
+        rows = db.table("delay_models").select("trained_at,model").order("id", desc=True).limit(1).execute().data
+    except Exception as e:
+        logger.error("Error loading delay model: %s", str(e))
+        return _delay_model["predictor"]
+    if rows:
+        _delay_model.update(predictor=DelayPredictor(rows[0]["model"]), trained_at=rows[0]["trained_at"],
+                            loaded_at=time.monotonic())
+        logger.info("Loaded delay model trained at %s", rows[0]["trained_at"])
+    return _delay_model["predictor"]
+
+@app.get("/train-runs/{train_id}/prediction", response_model=None, responses={200: {"model": DelayPrediction}})
+@limiter.limit("60/minute")
+@cache(expire=60)
+@coalesce
+def predict_train_delay(
+    request: Request,
+    train_id: str,
+    station: Optional[str] = Query(None, description="Predict as seen at this stop (default: the last stop the train has passed)."),
+    db: Client = Depends(get_db)
+):
+    """
+    Returns the predicted delay at the destination station for a train run, based on its delay at one stop,
+    the remaining route, the train, station, hour, weekday and difficulties reported so far.
+    The model is retrained nightly and evaluated in memory (microseconds per prediction).
+    """
+    if len(train_id) < 9:
+        raise HTTPException(status_code=400, detail="Invalid ID format. Expected YYYYMMDDnnnn")
+
+    predictor = _get_delay_predictor(db)
+    if predictor is None:
+        raise HTTPException(status_code=503, detail="Delay model is not available.")
+
+    try:
+        response = db.rpc("get_train_detail", {
+            "p_date": f"{train_id[:4]}-{train_id[4:6]}-{train_id[6:8]}",
+            "p_number": train_id[8:]
+        }).execute()
+    except Exception as e:
+        logger.error("Error in predict_train_delay (train_id=%s): %s", train_id, str(e))
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+    detail = response.data
+    if not detail or not detail["stops"]:
+        raise HTTPException(status_code=404, detail="Train not found")
+
+    if station:
+        matches = [i for i, s in enumerate(detail["stops"][:-1]) if s["station_name"].lower() == station.lower()]
+        if not matches:
+            raise HTTPException(status_code=404, detail="Station is not on the route before the destination.")
+        stop_index = matches[0]
+    else:
+        stop_index = latest_observed_stop(detail)
+        if stop_index is None:
+            raise HTTPException(status_code=404, detail="The train has not passed any stop yet.")
+
+    features = prediction_features(detail, stop_index)
+    stop = detail["stops"][stop_index]
+    return dump_json({
+        "train_id": train_id,
+        "station_name": stop["station_name"],
+        "stop_order": stop["stop_order"],
+        "current_delay": features["delay"],
+        "predicted_delay_at_destination": round(predictor.predict(features), 1),
+        "delay_at_destination": detail.get("delay_at_destination"),
+        "model_trained_at": _delay_model["trained_at"]
+    })
+
+# Maksymalna liczba przejazdów w jednym żądaniu /train-details?ids=...
+MAX_BATCH_IDS = 100
+
+@app.get("/train-details", response_model=None, responses={200: {"model": List[TrainDetail]}})
+@limiter.limit("30/minute")
+@cache(expire=60)
+@coalesce
+def get_train_details(
+    request: Request,
+    ids: Optional[str] = Query(None, description=f"Comma-separated train IDs (YYYYMMDDnnnn), at most {MAX_BATCH_IDS}."),
+    date: Optional[date] = Query(None, description="Return details of all trains running on this date (instead of ids)."),
+    number: Optional[str] = Query(None, description="Prefix of the train number (with date)."),
+    station: Optional[str] = Query(None, description="Start or end station (with date)."),
+    limit: int = Query(100, ge=1, le=500, description="Maximum number of trains (with date)."),
+    db: Client = Depends(get_db)
+):
+    """
+    Returns full details (as in /train-runs/{train_id}) of many trains in one response, built by a single
+    set-based database query. Select trains either by a list of IDs or by a date plus /train-runs filters.
+    """
+    if bool(ids) == bool(date):
+        raise HTTPException(status_code=400, detail="Provide either ids or date.")
+
+    if ids:
+        train_ids = list(dict.fromkeys(i.strip() for i in ids.split(",") if i.strip()))
+        if len(train_ids) > MAX_BATCH_IDS:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_IDS} ids per request.")
+        dates, numbers = [], []
+        for train_id in train_ids:
+            try:
+                run_date = datetime.strptime(train_id[:8], "%Y%m%d").date()
+            except ValueError:
+                run_date = None
+            if run_date is None or len(train_id) < 9 or not train_id[8:].isalnum():
+                raise HTTPException(status_code=400, detail=f"Invalid ID format: {train_id}. Expected YYYYMMDDnnnn")
+            dates.append(run_date.isoformat())
+            numbers.append(train_id[8:])
+        rpc_name, params = "get_train_details", {"p_dates": dates, "p_numbers": numbers}
+    else:
+        if number and not number.isalnum():
+            raise HTTPException(status_code=400, detail="Train number may only contain letters and digits.")
+        rpc_name, params = "get_day_train_details", {
+            "p_date": date.isoformat(),
+            "p_number": number,
+            "p_station": station,
+            "p_limit": limit
+        }
+
+    try:
+        response = db.rpc(rpc_name, params).execute()
+    except Exception as e:
+        logger.error("Error in get_train_details (%s): %s", params, str(e))
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+    return dump_json(response.data or [])
+
+
+# Maksymalna długość zakresu dat w zapytaniach o statystyki
+MAX_STATS_DAYS = 366
+
+def _stats_date_range(date_from: Optional[date], date_to: Optional[date]):
+    """Resolves the /stats date range (default: yesterday) and validates its length."""
+    if not date_from and not date_to:
+        date_from = date_to = date.today() - timedelta(days=1)
+    date_from = date_from or date_to
+    date_to = date_to or date_from
+    if date_to < date_from:
+        raise HTTPException(status_code=400, detail="date_to must not be earlier than date_from.")
+    if (date_to - date_from).days >= MAX_STATS_DAYS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_STATS_DAYS} days per request.")
+    return date_from, date_to
+
+@app.get("/stats/delays", response_model=None, responses={200: {"model": List[DelayStat]}})
+@limiter.limit("60/minute")
+@cache(expire=600)
+@coalesce
+def get_delay_stats(
+    request: Request,
+    dimension: str = Query(..., pattern=f"^({'|'.join(STATS_DIMENSIONS)})$", description="Grouping: station, train, category or hour."),
+    date_from: Optional[date] = Query(None, description="First date of the range (default: yesterday)."),
+    date_to: Optional[date] = Query(None, description="Last date of the range (default: date_from)."),
+    key: Optional[str] = Query(None, description="Only this station name, train number, category or hour (00-23)."),
+    sort: str = Query("p90_delay", pattern=f"^({'|'.join(DELAY_STATS_SORT_FIELDS)})$", description="Column to rank by (descending)."),
+    limit: int = Query(100, ge=1, le=1000),
+    db: Client = Depends(get_db)
+):
+    """
+    Returns daily delay statistics (mean, median and 90th percentile of the delay at stops, share of stops
+    delayed by more than 5 minutes, cancellations) grouped by station, train number, category or scheduled hour.
+    Rows are precomputed per day after each ingest; each row describes one day, sorted by date and the chosen column.
+    """
+    date_from, date_to = _stats_date_range(date_from, date_to)
+    try:
+        query = db.table("daily_delay_stats")\
+            .select(",".join(DelayStat.model_fields))\
+            .eq("dimension", dimension)\
+            .gte("date", date_from.isoformat())\
+            .lte("date", date_to.isoformat())
+        if key:
+            query = query.eq("key", key)
+        response = query\
+            .order("date")\
+            .order(sort, desc=True, nullsfirst=False)\
+            .order("key")\
+            .limit(limit)\
+            .execute()
+    except Exception as e:
+        logger.error("Error in get_delay_stats (dimension=%s, %s..%s): %s", dimension, date_from, date_to, str(e))
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+    return dump_json(response.data)
+
+@app.get("/stats/difficulties", response_model=None, responses={200: {"model": List[DifficultyStat]}})
+@limiter.limit("60/minute")
+@cache(expire=600)
+@coalesce
+def get_difficulty_stats(
+    request: Request,
+    date_from: Optional[date] = Query(None, description="First date of the range (default: yesterday)."),
+    date_to: Optional[date] = Query(None, description="Last date of the range (default: date_from)."),
+    limit: int = Query(1000, ge=1, le=1000),
+    db: Client = Depends(get_db)
+):
+    """
+    Returns the daily number of reported difficulties per category (stops and train runs affected),
+    sorted by date and the number of affected stops.
+    """
+    date_from, date_to = _stats_date_range(date_from, date_to)
+    try:
+        response = db.table("daily_difficulty_stats")\
+            .select(",".join(DifficultyStat.model_fields))\
+            .gte("date", date_from.isoformat())\
+            .lte("date", date_to.isoformat())\
+            .order("date")\
+            .order("stops", desc=True)\
+            .order("category")\
+            .limit(limit)\
+            .execute()
+    except Exception as e:
+        logger.error("Error in get_difficulty_stats (%s..%s): %s", date_from, date_to, str(e))
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+    return dump_json(response.data)
+
+
+# Maksymalna długość zakresu dat w jednym eksporcie
+MAX_EXPORT_DAYS = 366
+
+EXPORT_FORMATS = {
+    "ndjson": (ndjson_stream, "application/x-ndjson", "ndjson"),
+    "parquet": (parquet_stream, "application/vnd.apache.parquet", "parquet"),
+}
+
+@app.get("/export", response_class=StreamingResponse)
+@limiter.limit("5/minute")
+def export_run_stops(
+    request: Request,
+    date_from: date = Query(..., description="First date of the range (YYYY-MM-DD)."),
+    date_to: date = Query(..., description=f"Last date of the range (YYYY-MM-DD), at most {MAX_EXPORT_DAYS} days after date_from."),
+    format: str = Query("ndjson", pattern="^(ndjson|parquet)$", description="Output format: ndjson or parquet."),
+):
+    """
+    Streams every stop of every train run in the date range (one row per stop, with train attributes),
+    as NDJSON or Parquet. Rows are read from a server-side cursor in fixed-size batches, so memory use
+    does not depend on the length of the range.
+    """
+    if date_to < date_from:
+        raise HTTPException(status_code=400, detail="date_to must not be earlier than date_from.")
+    if (date_to - date_from).days >= MAX_EXPORT_DAYS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_EXPORT_DAYS} days per export.")
+
+    database_url = os.environ.get("DATABASE_URL")
+    if not database_url:
+        logger.error("Export requested but DATABASE_URL is not set")
+        raise HTTPException(status_code=503, detail="Export is not available.")
+
+    stream, media_type, extension = EXPORT_FORMATS[format]
+    filename = f"run_stops_{date_from.isoformat()}_{date_to.isoformat()}.{extension}"
+    logger.info("Export %s..%s as %s", date_from, date_to, format)
+    return StreamingResponse(
+        stream(iter_export_batches(database_url, date_from, date_to)),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
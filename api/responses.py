@@ -0,0 +1,23 @@
+from typing import Any
+
+import orjson
+from starlette.responses import Response
+
+
+def dump_json(content: Any) -> str:
+    """Serializuje wynik zapytania (listy i słowniki z bazy) do tekstu JSON przez orjson, bez walidacji modelami."""
+    return orjson.dumps(content).decode("utf-8")
+
+
+class RawJSONResponse(Response):
+    """
+    Klasa odpowiedzi dla endpointów zwracających gotowy tekst JSON (dump_json).
+    FastAPI przepuszcza str przez jsonable_encoder bez zmian, więc nagłówki ustawione przez @cache
+    na wstrzykniętej odpowiedzi są zachowane, a treść nie jest ponownie serializowana.
+    """
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, str):
+            return content.encode("utf-8")
+        return orjson.dumps(content)
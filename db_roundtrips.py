@@ -0,0 +1,311 @@
+import json
+import time
+import threading
+import itertools
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional
+
+# Liczenie zapytań do bazy (round-trips) wykonywanych przez klienta supabase-py.
+# RecordingClient opakowuje dowolnego klienta (prawdziwy Supabase/PostgREST, np. lokalny `supabase start`,
+# albo InMemoryClient poniżej) i dla każdego execute() zapisuje tabelę lub funkcję, operację, rozmiar
+# wysłanych i odebranych danych oraz czas, opcjonalnie z symulowanym opóźnieniem sieci.
+# Używa go scripts/check_db_budget.py, który pilnuje limitów zapytań na pociąg i na żądanie API.
+
+_WRITE_METHODS = ("insert", "upsert", "update")
+_OPERATIONS = ("select", "insert", "upsert", "update", "delete")
+
+
+def _json_size(value: Any) -> int:
+    if value is None:
+        return 0
+    return len(json.dumps(value, ensure_ascii=False, default=str).encode("utf-8"))
+
+
+class RoundTripLog:
+    """Lista wykonanych zapytań; bezpieczna dla wątków (save_data_bulk zapisuje paczki równolegle)."""
+
+    def __init__(self):
+        self.calls: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def add(self, call: Dict[str, Any]):
+        with self._lock:
+            self.calls.append(call)
+
+    def reset(self):
+        with self._lock:
+            self.calls = []
+
+    def __len__(self) -> int:
+        return len(self.calls)
+
+    def summary(self) -> Dict[str, Any]:
+        """Liczba zapytań, przesłane bajty i czas łącznie oraz liczba zapytań na (rodzaj, nazwa, operacja)."""
+        by_target = Counter(f"{c['kind']}:{c['name']}:{c['method']}" for c in self.calls)
+        return {
+            "round_trips": len(self.calls),
+            "request_bytes": sum(c["request_bytes"] for c in self.calls),
+            "response_bytes": sum(c["response_bytes"] for c in self.calls),
+            "seconds": round(sum(c["seconds"] for c in self.calls), 3),
+            "by_target": dict(by_target.most_common()),
+        }
+
+
+class _RecordingQuery:
+    """Przepuszcza wywołania budowniczego zapytania; execute() jest liczone jako jeden round-trip."""
+
+    def __init__(self, builder, log: RoundTripLog, kind: str, name: str, method: str, request_bytes: int,
+                 latency_s: float):
+        self._builder = builder
+        self._log = log
+        self._kind = kind
+        self._name = name
+        self._method = method
+        self._request_bytes = request_bytes
+        self._latency_s = latency_s
+
+    def __getattr__(self, attr: str):
+        target = getattr(self._builder, attr)
+        if not callable(target):
+            return target
+
+        def call(*args, **kwargs):
+            result = target(*args, **kwargs)
+            if not hasattr(result, "execute"):
+                return result
+            method = attr if attr in _OPERATIONS else self._method
+            request_bytes = self._request_bytes + (_json_size(args[0]) if attr in _WRITE_METHODS and args else 0)
+            return _RecordingQuery(result, self._log, self._kind, self._name, method, request_bytes, self._latency_s)
+
+        return call
+
+    def execute(self):
+        started_at = time.perf_counter()
+        if self._latency_s:
+            time.sleep(self._latency_s)
+        response = self._builder.execute()
+        data = getattr(response, "data", None)
+        self._log.add({
+            "kind": self._kind,
+            "name": self._name,
+            "method": self._method,
+            "request_bytes": self._request_bytes,
+            "response_bytes": _json_size(data),
+            "rows": len(data) if isinstance(data, list) else int(data is not None),
+            "seconds": time.perf_counter() - started_at,
+        })
+        return response
+
+
+class RecordingClient:
+    """Klient supabase-py z zapisem każdego zapytania w `log` i opcjonalnym opóźnieniem `latency_ms` na zapytanie."""
+
+    def __init__(self, client, log: Optional[RoundTripLog] = None, latency_ms: float = 0):
+        self.client = client
+        self.log = log if log is not None else RoundTripLog()
+        self.latency_s = latency_ms / 1000
+
+    def table(self, name: str) -> _RecordingQuery:
+        return _RecordingQuery(self.client.table(name), self.log, "table", name, "select", 0, self.latency_s)
+
+    def rpc(self, fn: str, params: Optional[dict] = None) -> _RecordingQuery:
+        return _RecordingQuery(self.client.rpc(fn, params or {}), self.log, "rpc", fn, "rpc", _json_size(params),
+                               self.latency_s)
+
+
+# --- Baza w pamięci ----------------------------------------------------------------------------------------
+
+class _Response:
+    def __init__(self, data):
+        self.data = data
+
+
+def _comparable(value: Any) -> str:
+    # PostgREST przesyła wartości filtrów jako tekst, więc 5 i "5" są równe
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+class _InMemoryQuery:
+    """Podzbiór budowniczego zapytań supabase-py używany przez save_to_postgres.py i api/main.py."""
+
+    def __init__(self, db: "InMemoryClient", table: str):
+        self._db = db
+        self._table = table
+        self._operation = "select"
+        self._columns: Optional[List[str]] = None
+        self._filters: List[Callable[[dict], bool]] = []
+        self._order: List[tuple] = []
+        self._offset = 0
+        self._limit: Optional[int] = None
+        self._single = False
+        self._payload: Any = None
+        self._on_conflict: List[str] = ["id"]
+        self._ignore_duplicates = False
+
+    # Operacje
+    def select(self, columns: str = "*", **kwargs):
+        parts = [c.strip() for c in columns.split(",")]
+        # Osadzone relacje (np. "run_stops(id)") nie są obsługiwane — zwracamy tylko kolumny tabeli
+        self._columns = None if "*" in parts else [c for c in parts if c and "(" not in c]
+        return self
+
+    def insert(self, payload):
+        self._operation, self._payload = "insert", payload
+        return self
+
+    def upsert(self, payload, on_conflict: str = "id", ignore_duplicates: bool = False, **kwargs):
+        self._operation, self._payload = "upsert", payload
+        self._on_conflict = [c.strip() for c in on_conflict.split(",")]
+        self._ignore_duplicates = ignore_duplicates
+        return self
+
+    def update(self, payload):
+        self._operation, self._payload = "update", payload
+        return self
+
+    def delete(self):
+        self._operation = "delete"
+        return self
+
+    # Filtry i modyfikatory
+    def _where(self, predicate: Callable[[dict], bool]):
+        self._filters.append(predicate)
+        return self
+
+    def eq(self, column: str, value):
+        return self._where(lambda r: r.get(column) is not None and _comparable(r.get(column)) == _comparable(value))
+
+    def neq(self, column: str, value):
+        return self._where(lambda r: r.get(column) is not None and _comparable(r.get(column)) != _comparable(value))
+
+    def in_(self, column: str, values):
+        allowed = {_comparable(v) for v in values}
+        return self._where(lambda r: r.get(column) is not None and _comparable(r.get(column)) in allowed)
+
+    def match(self, query: dict):
+        for column, value in query.items():
+            self.eq(column, value)
+        return self
+
+    def gt(self, column: str, value):
+        return self._where(lambda r: r.get(column) is not None and _comparable(r.get(column)) > _comparable(value))
+
+    def gte(self, column: str, value):
+        return self._where(lambda r: r.get(column) is not None and _comparable(r.get(column)) >= _comparable(value))
+
+    def lt(self, column: str, value):
+        return self._where(lambda r: r.get(column) is not None and _comparable(r.get(column)) < _comparable(value))
+
+    def lte(self, column: str, value):
+        return self._where(lambda r: r.get(column) is not None and _comparable(r.get(column)) <= _comparable(value))
+
+    def like(self, column: str, pattern: str):
+        prefix, _, suffix = pattern.partition("%")
+        return self._where(lambda r: isinstance(r.get(column), str)
+                           and r[column].startswith(prefix) and r[column].endswith(suffix))
+
+    def order(self, column: str, desc: bool = False, nullsfirst: Optional[bool] = None, **kwargs):
+        self._order.append((column, desc, nullsfirst))
+        return self
+
+    def limit(self, count: int, **kwargs):
+        self._limit = count
+        return self
+
+    def range(self, start: int, end: int, **kwargs):
+        self._offset, self._limit = start, end - start + 1
+        return self
+
+    def single(self):
+        self._single = True
+        return self
+
+    # Wykonanie
+    def _matches(self, row: dict) -> bool:
+        return all(predicate(row) for predicate in self._filters)
+
+    def _project(self, row: dict) -> dict:
+        if self._columns is None:
+            return dict(row)
+        return {c: row.get(c) for c in self._columns}
+
+    def execute(self) -> _Response:
+        with self._db.lock:
+            rows = self._db.tables.setdefault(self._table, [])
+            if self._operation == "select":
+                return self._select(rows)
+            if self._operation == "delete":
+                self._db.tables[self._table] = [r for r in rows if not self._matches(r)]
+                return _Response([])
+            if self._operation == "update":
+                updated = [r for r in rows if self._matches(r)]
+                for r in updated:
+                    r.update(self._payload)
+                return _Response([dict(r) for r in updated])
+            payload = self._payload if isinstance(self._payload, list) else [self._payload]
+            return _Response([dict(r) for r in self._write(rows, payload)])
+
+    def _select(self, rows: List[dict]) -> _Response:
+        result = [r for r in rows if self._matches(r)]
+        for column, desc, nullsfirst in reversed(self._order):
+            present = sorted((r for r in result if r.get(column) is not None), key=lambda r: r[column], reverse=desc)
+            missing = [r for r in result if r.get(column) is None]
+            nulls_first = desc if nullsfirst is None else nullsfirst
+            result = missing + present if nulls_first else present + missing
+        result = result[self._offset:]
+        if self._limit is not None:
+            result = result[:self._limit]
+        result = [self._project(r) for r in result]
+        if self._single:
+            if len(result) != 1:
+                raise ValueError(f"Oczekiwano jednego wiersza z tabeli {self._table}, otrzymano {len(result)}.")
+            return _Response(result[0])
+        return _Response(result)
+
+    def _write(self, rows: List[dict], payload: List[dict]) -> List[dict]:
+        written = []
+        for item in payload:
+            existing = None
+            if self._operation == "upsert":
+                key = [_comparable(item.get(c)) for c in self._on_conflict]
+                existing = next((r for r in rows if [_comparable(r.get(c)) for c in self._on_conflict] == key), None)
+            if existing is not None:
+                if not self._ignore_duplicates:
+                    existing.update(item)
+                    written.append(existing)
+                continue
+            row = dict(item)
+            row.setdefault("id", next(self._db.ids(self._table)))
+            rows.append(row)
+            written.append(row)
+        return written
+
+
+class InMemoryClient:
+    """
+    Baza w pamięci z interfejsem klienta supabase-py (table/rpc) — wystarczająca do zapisu przejazdów
+    (save_to_postgres.py) bez sieci. Nie ma wyzwalaczy ani funkcji SQL: rpc() zwraca wynik z `rpc_results`
+    (domyślnie pustą listę), więc odczyty API oparte na funkcjach wymagają prawdziwej bazy.
+    """
+
+    def __init__(self, tables: Optional[Dict[str, List[dict]]] = None, rpc_results: Optional[Dict[str, Any]] = None):
+        self.tables: Dict[str, List[dict]] = {name: [dict(r) for r in rows] for name, rows in (tables or {}).items()}
+        self.rpc_results = rpc_results or {}
+        self.lock = threading.RLock()
+        self._ids: Dict[str, itertools.count] = {}
+
+    def ids(self, table: str) -> itertools.count:
+        if table not in self._ids:
+            start = max((r["id"] for r in self.tables.get(table, []) if isinstance(r.get("id"), int)), default=0) + 1
+            self._ids[table] = itertools.count(start)
+        return self._ids[table]
+
+    def table(self, name: str) -> _InMemoryQuery:
+        return _InMemoryQuery(self, name)
+
+    def rpc(self, fn: str, params: Optional[dict] = None) -> _InMemoryQuery:
+        query = _InMemoryQuery(self, f"rpc:{fn}")
+        query.execute = lambda: _Response(self.rpc_results.get(fn, []))
+        return query
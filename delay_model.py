@@ -0,0 +1,203 @@
+import io
+import time
+import logging
+from datetime import date, timedelta
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+import psycopg
+import scipy.sparse as sp
+from psycopg import sql
+from psycopg.types.json import Jsonb
+from sklearn.linear_model import Ridge
+
+from delay_prediction import CATEGORICAL_FEATURES, MAX_DELAY_MIN, NUMERIC_FEATURES
+
+# Okno uczenia (dni wstecz) i część końcowa okna odkładana do oceny modelu
+TRAINING_DAYS = 90
+VALIDATION_DAYS = 7
+# Liczba przechowywanych wersji modelu w tabeli delay_models
+KEEP_MODELS = 30
+
+# Jeden wiersz na obserwację: przejazd widziany na przystanku (bez stacji końcowej), cel = opóźnienie na stacji końcowej.
+# Pozostały dystans i liczba przystanków liczone są przed odfiltrowaniem przystanków odwołanych.
+_OBSERVATIONS_QUERY = """
+    SELECT * FROM (
+        SELECT
+            rs.run_id,
+            rs.date,
+            trs.number,
+            trs.category,
+            s.name AS station,
+            to_char(COALESCE(rs.scheduled_departure, rs.scheduled_arrival), 'HH24') AS hour,
+            EXTRACT(ISODOW FROM rs.date)::INT::TEXT AS weekday,
+            rs.stop_order,
+            COALESCE(rs.delay_departure_min, rs.delay_arrival_min) AS delay,
+            MAX(rs.distance_from_start_km) OVER w - rs.distance_from_start_km AS remaining_km,
+            MAX(rs.stop_order) OVER w - rs.stop_order AS remaining_stops,
+            COALESCE(rs.is_cancelled, FALSE) AS stop_cancelled,
+            trs.delay_at_destination AS final_delay
+        FROM run_stops rs
+        JOIN train_run_summaries trs ON trs.run_id = rs.run_id AND trs.date = rs.date
+        JOIN stations s ON rs.station_id = s.id
+        WHERE rs.date BETWEEN {date_from} AND {date_to}
+            AND trs.date BETWEEN {date_from} AND {date_to}
+            AND NOT trs.is_cancelled
+            AND trs.delay_at_destination IS NOT NULL
+        WINDOW w AS (PARTITION BY rs.run_id)
+    ) o
+    WHERE NOT o.stop_cancelled
+        AND o.remaining_stops > 0
+        AND o.delay IS NOT NULL
+"""
+
+# Kategorie utrudnień w przejeździe z numerem pierwszego przystanku, na którym je zgłoszono
+_DIFFICULTIES_QUERY = """
+    SELECT rs.run_id, MIN(rs.stop_order) AS first_stop_order, d.description AS difficulty
+    FROM run_stop_difficulties rsd
+    JOIN run_stops rs ON rs.id = rsd.stop_id AND rs.date = rsd.date
+    JOIN difficulties d ON rsd.difficulty_id = d.id
+    WHERE rsd.date BETWEEN {date_from} AND {date_to}
+        AND rs.date BETWEEN {date_from} AND {date_to}
+    GROUP BY rs.run_id, d.description
+"""
+
+_TEXT_COLUMNS = {"number": str, "category": str, "station": str, "hour": str, "weekday": str, "difficulty": str, "date": str}
+
+
+def _copy_to_dataframe(conn: psycopg.Connection, query: str, date_from: date, date_to: date) -> pd.DataFrame:
+    """Wynik zapytania jako DataFrame, przesłany jednym poleceniem COPY (CSV)."""
+    statement = sql.SQL(query).format(date_from=sql.Literal(date_from), date_to=sql.Literal(date_to))
+    buffer = io.BytesIO()
+    with conn.cursor() as cur:
+        with cur.copy(sql.SQL("COPY ({}) TO STDOUT WITH (FORMAT csv, HEADER)").format(statement)) as copy:
+            for block in copy:
+                buffer.write(block)
+    buffer.seek(0)
+    return pd.read_csv(buffer, dtype=_TEXT_COLUMNS, keep_default_na=False, na_values=[""])
+
+
+def load_training_data(conn: psycopg.Connection, date_from: date, date_to: date) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Obserwacje (przejazd na przystanku) i utrudnienia z zakresu dat."""
+    observations = _copy_to_dataframe(conn, _OBSERVATIONS_QUERY, date_from, date_to)
+    difficulties = _copy_to_dataframe(conn, _DIFFICULTIES_QUERY, date_from, date_to)
+    return observations.reset_index(drop=True), difficulties
+
+
+def build_design_matrix(observations: pd.DataFrame, difficulties: pd.DataFrame) -> Tuple[sp.csr_matrix, List[Tuple[str, str]]]:
+    """
+    Rzadka macierz cech: kolumny liczbowe (NUMERIC_FEATURES), a dalej one-hot dla każdej cechy kategorycznej.
+    Kategorie utrudnień są aktywne od przystanku, na którym je zgłoszono. Zwraca macierz i opis kolumn (cecha, wartość).
+    """
+    n_rows = len(observations)
+    rows: List[np.ndarray] = []
+    cols: List[np.ndarray] = []
+    values: List[np.ndarray] = []
+    columns: List[Tuple[str, str]] = []
+
+    numeric = np.column_stack([
+        observations["delay"].clip(-MAX_DELAY_MIN, MAX_DELAY_MIN).to_numpy(dtype=np.float64),
+        observations["remaining_km"].fillna(0).to_numpy(dtype=np.float64),
+        observations["remaining_stops"].to_numpy(dtype=np.float64),
+    ])
+    for i, name in enumerate(NUMERIC_FEATURES):
+        rows.append(np.arange(n_rows))
+        cols.append(np.full(n_rows, len(columns)))
+        values.append(numeric[:, i])
+        columns.append((name, ""))
+
+    for name in CATEGORICAL_FEATURES:
+        if name == "difficulty":
+            active = observations[["run_id", "stop_order"]].reset_index().merge(difficulties, on="run_id")
+            active = active[active["stop_order"] >= active["first_stop_order"]]
+            row_index, source = active["index"].to_numpy(), active["difficulty"]
+        else:
+            row_index, source = np.arange(n_rows), observations[name].fillna("")
+        codes, uniques = pd.factorize(source)
+        rows.append(row_index)
+        cols.append(codes + len(columns))
+        values.append(np.ones(len(codes)))
+        columns.extend((name, str(u)) for u in uniques)
+
+    matrix = sp.csr_matrix(
+        (np.concatenate(values), (np.concatenate(rows), np.concatenate(cols))),
+        shape=(n_rows, len(columns)),
+    )
+    return matrix, columns
+
+
+def _fit(matrix: sp.csr_matrix, target: np.ndarray) -> Ridge:
+    model = Ridge(alpha=10.0, solver="sparse_cg")
+    model.fit(matrix, target)
+    return model
+
+
+def to_artifact(model: Ridge, columns: List[Tuple[str, str]]) -> dict:
+    """Wagi modelu w formacie DelayPredictor: wyraz wolny, wagi liczbowe i słowniki wag dla wartości kategorycznych."""
+    artifact = {
+        "intercept": round(float(model.intercept_), 4),
+        "numeric": {},
+        "categorical": {name: {} for name in CATEGORICAL_FEATURES},
+    }
+    for (name, value), weight in zip(columns, model.coef_):
+        if name in NUMERIC_FEATURES:
+            artifact["numeric"][name] = round(float(weight), 6)
+        elif abs(weight) >= 1e-4:
+            artifact["categorical"][name][value] = round(float(weight), 4)
+    return artifact
+
+
+def train_delay_model(conn: psycopg.Connection, date_from: date, date_to: date, logger: logging.Logger) -> Dict:
+    """
+    Uczy model na oknie dat. Najpierw ocena: uczenie bez ostatnich VALIDATION_DAYS dni i MAE na nich
+    (w porównaniu z prognozą "opóźnienie się nie zmieni"), potem uczenie na całym oknie.
+    Zwraca rekord do tabeli delay_models.
+    """
+    started_at = time.monotonic()
+    observations, difficulties = load_training_data(conn, date_from, date_to)
+    if observations.empty:
+        raise ValueError(f"Brak obserwacji w zakresie {date_from}..{date_to}.")
+    logger.info(f"Wczytano {len(observations)} obserwacji i {len(difficulties)} utrudnień "
+                f"({time.monotonic() - started_at:.1f}s).")
+
+    matrix, columns = build_design_matrix(observations, difficulties)
+    target = observations["final_delay"].clip(-MAX_DELAY_MIN, MAX_DELAY_MIN).to_numpy(dtype=np.float64)
+
+    mae, baseline_mae = None, None
+    validation_from = (date_to - timedelta(days=VALIDATION_DAYS - 1)).isoformat()
+    is_validation = (observations["date"] >= validation_from).to_numpy()
+    if is_validation.any() and not is_validation.all():
+        held_out = _fit(matrix[~is_validation], target[~is_validation])
+        predicted = np.clip(held_out.predict(matrix[is_validation]), 0, MAX_DELAY_MIN)
+        mae = float(np.mean(np.abs(predicted - target[is_validation])))
+        baseline_mae = float(np.mean(np.abs(matrix[is_validation, 0].toarray().ravel() - target[is_validation])))
+        logger.info(f"Ocena na ostatnich {VALIDATION_DAYS} dniach: MAE {mae:.2f} min "
+                    f"(bez modelu, opóźnienie bez zmian: {baseline_mae:.2f} min).")
+
+    model = _fit(matrix, target)
+    logger.info(f"Wyuczono model: {matrix.shape[0]} obserwacji, {matrix.shape[1]} cech "
+                f"({time.monotonic() - started_at:.1f}s).")
+    return {
+        "date_from": date_from,
+        "date_to": date_to,
+        "observations": int(matrix.shape[0]),
+        "mae": mae,
+        "baseline_mae": baseline_mae,
+        "model": to_artifact(model, columns),
+    }
+
+
+def save_delay_model(conn: psycopg.Connection, record: Dict):
+    """Zapisuje nową wersję modelu (API odczytuje najnowszą) i usuwa najstarsze ponad KEEP_MODELS."""
+    with conn.transaction():
+        conn.execute(
+            "INSERT INTO delay_models (date_from, date_to, observations, mae, baseline_mae, model) "
+            "VALUES (%s, %s, %s, %s, %s, %s)",
+            (record["date_from"], record["date_to"], record["observations"], record["mae"],
+             record["baseline_mae"], Jsonb(record["model"])),
+        )
+        conn.execute(
+            "DELETE FROM delay_models WHERE id NOT IN (SELECT id FROM delay_models ORDER BY id DESC LIMIT %s)",
+            (KEEP_MODELS,),
+        )
@@ -0,0 +1,105 @@
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Optional
+from zoneinfo import ZoneInfo
+
+# Cechy kategoryczne modelu (delay_model.py) — w artefakcie każda ma słownik {wartość: waga}
+CATEGORICAL_FEATURES = ("number", "category", "station", "hour", "weekday", "difficulty")
+# Cechy liczbowe: bieżące opóźnienie, pozostały dystans i liczba przystanków do stacji końcowej
+NUMERIC_FEATURES = ("delay", "remaining_km", "remaining_stops")
+# Opóźnienia powyżej tej wartości (zwykle objazdy lub błędne dane) przycinamy przy uczeniu i predykcji
+MAX_DELAY_MIN = 360
+# Godziny w rozkładzie są czasem lokalnym
+WARSAW_TZ = ZoneInfo("Europe/Warsaw")
+
+
+class DelayPredictor:
+    """
+    Model liniowy opóźnienia na stacji końcowej, odczytany z artefaktu (tabela delay_models).
+    Wagi cech kategorycznych są trzymane w słownikach, więc predykcja to kilkanaście odczytów
+    i mnożeń — pojedyncze mikrosekundy, bez numpy/scikit-learn w procesie API.
+    """
+
+    def __init__(self, artifact: dict):
+        self.artifact = artifact
+        self.intercept: float = artifact["intercept"]
+        self.numeric: Dict[str, float] = artifact["numeric"]
+        self.categorical: Dict[str, Dict[str, float]] = artifact["categorical"]
+
+    def predict(self, features: dict) -> float:
+        """Przewidywane opóźnienie na stacji końcowej (min) dla cech z prediction_features."""
+        score = self.intercept
+        for name in NUMERIC_FEATURES:
+            score += self.numeric.get(name, 0.0) * features[name]
+        for name in CATEGORICAL_FEATURES:
+            weights = self.categorical.get(name, {})
+            values = features[name]
+            if isinstance(values, list):
+                score += sum(weights.get(v, 0.0) for v in values)
+            else:
+                score += weights.get(values, 0.0)
+        return min(max(score, 0.0), MAX_DELAY_MIN)
+
+
+def _clip_delay(delay: Optional[int]) -> int:
+    return min(max(delay or 0, -MAX_DELAY_MIN), MAX_DELAY_MIN)
+
+
+def _stop_delay(stop: dict) -> Optional[int]:
+    """Opóźnienie na przystanku tak jak w delay_model.load_training_data: z odjazdu, w razie braku z przyjazdu."""
+    delay = stop["delay_minutes_departure"]
+    if delay is None:
+        delay = stop["delay_minutes_arrival"]
+    return delay
+
+
+def prediction_features(detail: dict, stop_index: int) -> dict:
+    """
+    Cechy dla przejazdu (dokument TrainDetail z get_train_detail) obserwowanego na przystanku stop_index.
+    Te same definicje co w delay_model.load_training_data: godzina i opóźnienie z odjazdu (w razie braku z przyjazdu),
+    kategorie utrudnień zgłoszonych na przystankach do bieżącego włącznie.
+    """
+    stops: List[dict] = detail["stops"]
+    stop = stops[stop_index]
+    last = stops[-1]
+    delay = _stop_delay(stop)
+    time_str = stop["departure_time"] or stop["arrival_time"] or ""
+    return {
+        "number": detail["number"],
+        "category": detail["category"],
+        "station": stop["station_name"],
+        "hour": time_str[:2],
+        "weekday": str(date.fromisoformat(detail["date"]).isoweekday()),
+        "difficulty": sorted({d["description"] for s in stops[:stop_index + 1] for d in s["difficulties"]}),
+        "delay": _clip_delay(delay),
+        "remaining_km": float(last["distance_from_start_km"] or 0) - float(stop["distance_from_start_km"] or 0),
+        "remaining_stops": len(stops) - 1 - stop_index,
+    }
+
+
+def latest_observed_stop(detail: dict, now: Optional[datetime] = None) -> Optional[int]:
+    """
+    Indeks ostatniego nieodwołanego przystanku przed stacją końcową, który pociąg już minął:
+    planowy odjazd (w razie braku przyjazd) jest w przeszłości albo portal podał na nim niezerowe opóźnienie.
+    Portal zapisuje brak opóźnienia jako 0, więc samo istnienie wartości nie znaczy, że pociąg tam był.
+    """
+    stops = detail["stops"]
+    now = now or datetime.now(WARSAW_TZ)
+    run_date = date.fromisoformat(detail["date"])
+    day_offset = 0
+    previous_minutes = None
+    latest = None
+    for index, stop in enumerate(stops[:-1]):
+        time_str = stop["departure_time"] or stop["arrival_time"]
+        passed = bool(_stop_delay(stop))
+        if time_str:
+            minutes = int(time_str[:2]) * 60 + int(time_str[3:5])
+            # Godziny po północy należą do następnego dnia przejazdu
+            if previous_minutes is not None and minutes < previous_minutes:
+                day_offset += 1
+            previous_minutes = minutes
+            scheduled = datetime.combine(run_date + timedelta(days=day_offset),
+                                         time(minutes // 60, minutes % 60), tzinfo=WARSAW_TZ)
+            passed = passed or scheduled <= now
+        if passed and not stop["is_cancelled"]:
+            latest = index
+    return latest
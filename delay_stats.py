@@ -0,0 +1,30 @@
+import logging
+from typing import Iterable
+
+from supabase import Client
+
+# Wymiary dziennych statystyk opóźnień (daily_delay_stats.dimension, sql/delay_stats.sql)
+STATS_DIMENSIONS = ("station", "train", "category", "hour")
+
+# Kolumny daily_delay_stats, po których można sortować rankingi w API
+DELAY_STATS_SORT_FIELDS = (
+    "runs", "stops", "mean_delay", "median_delay", "p90_delay", "delayed_share", "cancelled_runs", "cancellation_rate",
+)
+
+
+def refresh_delay_stats(supabase: Client, dates: Iterable[str], logger: logging.Logger) -> int:
+    """
+    Przelicza dzienne statystyki opóźnień i utrudnień dla podanych dat (YYYY-MM-DD).
+    Każdy dzień jest liczony osobno w bazie (refresh_daily_delay_stats), więc po zapisie
+    odświeżamy tylko dni, których dotyczyły zmiany. Zwraca liczbę odświeżonych dni.
+    """
+    refreshed = 0
+    for date_str in sorted(set(dates)):
+        try:
+            supabase.rpc("refresh_daily_delay_stats", {"p_date": date_str}).execute()
+            refreshed += 1
+        except Exception as e:
+            logger.error(f"Nie udało się przeliczyć statystyk opóźnień dla daty {date_str}: {e}")
+    if refreshed:
+        logger.info(f"Przeliczono statystyki opóźnień dla {refreshed} dni.")
+    return refreshed
@@ -1,7 +1,9 @@
-import re
+import json
 import time
 import logging
 import os
+from datetime import datetime
+from zoneinfo import ZoneInfo
 from playwright.sync_api import sync_playwright, TimeoutError, Page
 try:
     from playwright_stealth import stealth_sync
@@ -12,44 +14,43 @@ except ImportError:
     def apply_stealth(page):
         Stealth().apply_stealth_sync(page)
 
-URL = "https://portalpasazera.pl/Wyszukiwarka/Index"
-
-
-def parse_delay(delay_text: str) -> int:
-    """Wyciąga liczbę minut opóźnienia z tekstu"""
-    if not delay_text:
-        return 0
-    match = re.search(r'\(\+(\d+)\s*min\)', delay_text, re.IGNORECASE)
-    return int(match.group(1)) if match else 0
+from har_replay import har_settings_from_env, new_context, install_fault_injection
+from portal_html import CARRIER, parse_stop, merge_duplicate_stations, is_matching_train
 
+URL = "https://portalpasazera.pl/Wyszukiwarka/Index"
 
-def parse_distance_and_time_info(info_text: str) -> tuple:
-    """Wyciąga dystans i czas przejazdu z tekstu."""
-    if not info_text:
-        return None, None
+# Opcjonalny katalog korpusu stron: strony wyników i trasy oraz wynik get_train_details dla każdego pociągu
+# (pliki <numer>_<data>.search.html / .timeline.html / .expected.json, zob. scripts/benchmark_parser.py)
+HTML_CAPTURE_DIR = os.environ.get("HTML_CAPTURE_DIR")
+CAPTURE_SUFFIXES = (".search.html", ".timeline.html", ".expected.json")
 
-    distance_km = None
-    travel_time = None
 
-    # Wyszukiwanie dystansu (np. 12.6 km lub 12,6 km) w całym tekście
-    distance_match = re.search(r'([\d,\.]+)\s*km', info_text)
-    if distance_match:
-        distance_km = float(distance_match.group(1).replace(',', '.'))
+def _capture_path(train_number: str, target_date: str, suffix: str) -> str:
+    return os.path.join(HTML_CAPTURE_DIR, f"{train_number}_{target_date or 'dzis'}{suffix}")
 
-    # Wyszukiwanie czasu przejazdu (np. 12h:14min) w całym tekście
-    time_match = re.search(r'(\d+h:\d+min)', info_text)
-    if time_match:
-        travel_time = time_match.group(1)
 
-    return distance_km, travel_time
+def capture_page(page: Page, train_number: str, target_date: str, suffix: str, logger: logging.Logger):
+    """Zapisuje bieżący HTML strony do korpusu, jeśli ustawiono HTML_CAPTURE_DIR."""
+    if not HTML_CAPTURE_DIR:
+        return
+    try:
+        os.makedirs(HTML_CAPTURE_DIR, exist_ok=True)
+        with open(_capture_path(train_number, target_date, suffix), "w", encoding="utf-8") as f:
+            f.write(page.content())
+    except Exception as e:
+        logger.warning(f"Nie udało się zapisać strony {suffix} pociągu {train_number} do korpusu: {e}")
 
 
-def parse_difficulties(difficulties_text: str) -> tuple:
-    """Wyciąga informacje o utrudnieniach i stacji z tekstu."""
-    if not difficulties_text:
-        return None, None
-    parts = difficulties_text.split('\n')
-    return parts[1].strip(), parts[2].strip() if len(parts) > 1 else None
+def capture_result(train_number: str, target_date: str, details, logger: logging.Logger):
+    """Zapisuje wynik get_train_details obok stron, jako oczekiwany wynik parsera statycznego HTML."""
+    if not HTML_CAPTURE_DIR:
+        return
+    try:
+        with open(_capture_path(train_number, target_date, ".expected.json"), "w", encoding="utf-8") as f:
+            json.dump({"train_number": train_number, "target_date": target_date, "expected": details},
+                      f, ensure_ascii=False, indent=2)
+    except Exception as e:
+        logger.warning(f"Nie udało się zapisać wyniku pociągu {train_number} do korpusu: {e}")
 
 
 def get_train_details(page: Page, train_number: str, logger: logging.Logger, target_date: str = None):
@@ -59,6 +60,13 @@ def get_train_details(page: Page, train_number: str, logger: logging.Logger, tar
     else:
         logger.info(f"Pobieranie danych dla pociągu nr: {train_number}")
 
+    if HTML_CAPTURE_DIR:
+        # Pliki z poprzedniej próby nie mogą trafić do korpusu razem z wynikiem tej próby
+        for suffix in CAPTURE_SUFFIXES:
+            path = _capture_path(train_number, target_date, suffix)
+            if os.path.exists(path):
+                os.remove(path)
+
     input_field = page.locator("#ftnu-number")
     input_field.click()
     input_field.clear()
@@ -89,6 +97,8 @@ def get_train_details(page: Page, train_number: str, logger: logging.Logger, tar
         logger.warning(f"Strona nie załadowała wyników ani komunikatu o błędzie dla pociągu {train_number}.")
         return "page_load_timeout"
 
+    capture_page(page, train_number, target_date, ".search.html", logger)
+
     no_train_msg = page.locator("h3:has-text('dobie brak kursujących pociągów'), h3:has-text('brak kursujących pociągów')").first
     if no_train_msg.is_visible():
         logger.warning(
@@ -117,15 +127,14 @@ def get_train_details(page: Page, train_number: str, logger: logging.Logger, tar
 
             carrier = carrier_element.inner_text().strip()
 
-            if carrier == "IC":
+            if carrier == CARRIER:
                 found_numbers_str = numbers_container.locator("span").all_inner_texts()
 
                 if not found_numbers_str:
                     found_numbers_str = [numbers_container.inner_text().strip()]
 
                 try:
-                    is_number_match = any(abs(int(num) - int(train_number)) <= 1 for num in found_numbers_str)
-                    if is_number_match:
+                    if is_matching_train(found_numbers_str, train_number):
                         logger.debug(f"Znaleziono pasujący pociąg IC w wierszu nr {i + 1}.")
                         target_row = row
                         break
@@ -150,107 +159,30 @@ def get_train_details(page: Page, train_number: str, logger: logging.Logger, tar
         logger.error(f"Nie można otworzyć szczegółów trasy dla pociągu {train_number}. Wyjątek: {e.__class__.__name__}")
         return "not_found"
 
+    capture_page(page, train_number, target_date, ".timeline.html", logger)
+
     # parsowanie listy stacji
     station_items = page.locator("div.timeline--connection div.timeline__item:not(.timeline__item-detour)").all()
     route_details = []
 
     for item in station_items:
-        raw_station_name = item.locator("h3.timeline__content-station").first.inner_text().split(":", 1)[-1].strip()
-        station_name = re.sub(r'(?i)\s*przesiadka$', '', raw_station_name).strip()
-
-        # Detekcja stacji odwołanej
-        is_cancelled = False
         hidden_span = item.locator("span.visuallyhidden").first
-        if hidden_span.count() > 0:
-            is_cancelled = "odwołan" in hidden_span.inner_text().lower()
-
-        arrival_time = None
-        delay_minutes_arrival = 0
         arrival_locator = item.locator("span.timeline__numbers-time__stop").first
-        if arrival_locator.count() > 0:
-            arr_time_text = arrival_locator.text_content() or ""
-            time_match = re.search(r'\b(\d{2}:\d{2})\b', arr_time_text)
-            if time_match:
-                arrival_time = time_match.group(1)
-            delay_minutes_arrival = parse_delay(arr_time_text)
-
-        departure_time = None
-        delay_minutes_departure = 0
         departure_locator = item.locator("span.timeline__numbers-time__start").first
-        if departure_locator.count() > 0:
-            dep_time_text = departure_locator.text_content() or ""
-            time_match = re.search(r'\b(\d{2}:\d{2})\b', dep_time_text)
-            if time_match:
-                departure_time = time_match.group(1)
-            delay_minutes_departure = parse_delay(dep_time_text)
-
-        info_text = ""
         info_locator = item.locator("p.timeline__numbers-km").first
-        if info_locator.count() > 0:
-            info_text = info_locator.inner_text()
-        distance_km, travel_time_to_next = parse_distance_and_time_info(info_text)
-
         difficulties_btn = item.locator("button[data-window-type='difficulties']").first
-        station_diff, difficulties_reason = "", ""
-        if difficulties_btn.count() > 0:
-            data_obj_1_value = difficulties_btn.get_attribute("data-obj-1")
-            if data_obj_1_value:
-                parts = data_obj_1_value.split('$')
-                if len(parts) > 0:
-                    first_part_elements = parts[0].split('###')
-                    if len(first_part_elements) > 1:
-                        station_diff = first_part_elements[1].lstrip('#').strip()
-                if len(parts) > 2:
-                    difficulties_reason = parts[2]
-                    if '#' in difficulties_reason:
-                        reason_parts = difficulties_reason.split('#', 1)
-                        difficulties_reason = reason_parts[0].strip()
-                        if len(reason_parts) > 1 and reason_parts[1].strip():
-                            station_diff = reason_parts[1].strip()
-
-        route_details.append({
-            "station_name": station_name, "arrival_time": arrival_time, "departure_time": departure_time,
-            "delay_minutes_arrival": delay_minutes_arrival, "delay_minutes_departure": delay_minutes_departure,
-            "distance_km_from_start_to_next": distance_km, "travel_time_from_start_to_next": travel_time_to_next,
-            "difficulties_info": [difficulties_reason, station_diff],
-            "is_cancelled": is_cancelled
-        })
-
-    # Usunięcie duplikatów stacji (np. przy częściowo odwołanych pociągach)
-    merged_route_details = []
-    station_index_map = {}
-
-    for stop in route_details:
-        name = stop["station_name"]
-        if name not in station_index_map:
-            station_index_map[name] = len(merged_route_details)
-            merged_route_details.append(stop)
-        else:
-            existing_stop = merged_route_details[station_index_map[name]]
-
-            # Scalanie czasów i opóźnień
-            if stop.get("arrival_time") and not existing_stop.get("arrival_time"):
-                existing_stop["arrival_time"] = stop["arrival_time"]
-                existing_stop["delay_minutes_arrival"] = stop.get("delay_minutes_arrival", 0)
-
-            if stop.get("departure_time") and not existing_stop.get("departure_time"):
-                existing_stop["departure_time"] = stop["departure_time"]
-                existing_stop["delay_minutes_departure"] = stop.get("delay_minutes_departure", 0)
-
-            # Stacja nie jest odwołana, jeśli choć jedno jej wystąpienie nie było odwołane
-            existing_stop["is_cancelled"] = existing_stop["is_cancelled"] and stop["is_cancelled"]
-
-            # Scalanie informacji o utrudnieniach
-            for idx in range(len(existing_stop["difficulties_info"])):
-                if idx < len(stop["difficulties_info"]):
-                    if stop["difficulties_info"][idx] and not existing_stop["difficulties_info"][idx]:
-                        existing_stop["difficulties_info"][idx] = stop["difficulties_info"][idx]
-
-            # Scalanie odległości i czasu przejazdu do następnej stacji
-            if stop.get("distance_km_from_start_to_next") is not None and existing_stop.get("distance_km_from_start_to_next") is None:
-                existing_stop["distance_km_from_start_to_next"] = stop["distance_km_from_start_to_next"]
-            if stop.get("travel_time_from_start_to_next") is not None and existing_stop.get("travel_time_from_start_to_next") is None:
-                existing_stop["travel_time_from_start_to_next"] = stop["travel_time_from_start_to_next"]
+
+        # Teksty elementów zamieniane są na rekord przystanku wspólną funkcją (ta sama w parserze statycznego HTML)
+        route_details.append(parse_stop(
+            item.locator("h3.timeline__content-station").first.inner_text(),
+            hidden_span.inner_text() if hidden_span.count() > 0 else None,
+            (arrival_locator.text_content() or "") if arrival_locator.count() > 0 else None,
+            (departure_locator.text_content() or "") if departure_locator.count() > 0 else None,
+            info_locator.inner_text() if info_locator.count() > 0 else None,
+            difficulties_btn.get_attribute("data-obj-1") if difficulties_btn.count() > 0 else None,
+        ))
+
+    merged_route_details = merge_duplicate_stations(route_details)
 
     logger.info(f"Pomyślnie pobrano dane dla {len(merged_route_details)} stacji dla pociągu {train_number} (po scaleniu {len(route_details)} -> {len(merged_route_details)}).")
 
@@ -274,7 +206,10 @@ def process_single_train(page: Page, train: dict, logger: logging.Logger, target
             page.locator("li:has-text('po numerze')").click()
     
             details = get_train_details(page, train_number, logger, target_date)
+            capture_result(train_number, target_date, details, logger)
             train["delay_info"] = details
+            # Czas pobrania — save_to_postgres._is_run_final porównuje go z przyjazdem na stację końcową
+            train["scraped_at"] = datetime.now(ZoneInfo("Europe/Warsaw")).isoformat(timespec="seconds")
             if isinstance(details, list) and details:
                 is_run_cancelled = all(stop.get("is_cancelled", False) for stop in details)
                 train["is_cancelled"] = is_run_cancelled
@@ -307,9 +242,15 @@ def process_single_train(page: Page, train: dict, logger: logging.Logger, target
                 train["delay_info"] = "unknown_error"
 
 
-def get_delays(trains_data: list = None, logger=None) -> list:
+def get_delays(trains_data: list = None, logger=None, har_settings: dict = None) -> list:
+    """
+    Pobiera trasy i opóźnienia dla listy pociągów. `har_settings` (domyślnie z HAR_MODE, zob. har_replay.py)
+    włącza nagrywanie ruchu przeglądarki albo odtwarzanie go bez sieci.
+    """
     if logger is None:
         logger = logging.getLogger(__name__)
+    if har_settings is None:
+        har_settings = har_settings_from_env()
 
     with sync_playwright() as p:
         try:
@@ -343,7 +284,7 @@ def get_delays(trains_data: list = None, logger=None) -> list:
                 logger.info(f"Uruchamianie Playwright z proxy: {proxy_host}:{proxy_port}")
 
             browser = p.chromium.launch(**launch_args)
-            context = browser.new_context(**context_args)
+            context = new_context(browser, context_args, har_settings, "portalpasazera", logger)
             page = context.new_page()
 
             def block_unnecessary_resources(route):
@@ -352,9 +293,11 @@ def get_delays(trains_data: list = None, logger=None) -> list:
                 elif any(domain in route.request.url.lower() for domain in ["google-analytics", "googletagmanager", "hotjar", "facebook", "doubleclick", "analytics", "pixel"]):
                     route.abort()
                 else:
-                    route.continue_()
+                    # fallback zamiast continue_: przy odtwarzaniu żądanie trafia do odpowiedzi z HAR
+                    route.fallback()
 
             page.route("**/*", block_unnecessary_resources)
+            install_fault_injection(page, har_settings, logger)
             apply_stealth(page)
             logger.info("Pomyślnie uruchomiono przeglądarkę Playwright z filtrowaniem zasobów.")
         except Exception as e:
@@ -376,6 +319,8 @@ def get_delays(trains_data: list = None, logger=None) -> list:
             target_date = train.get("target_date")
             process_single_train(page, train, logger, target_date=target_date)
 
+        # Zamknięcie kontekstu zapisuje nagranie HAR
+        context.close()
         browser.close()
         logger.info("Zakończono działanie przeglądarki Playwright.")
 
@@ -18,8 +18,14 @@ except ImportError:
         Stealth().apply_stealth_sync(page)
 
 from get_delays import get_delays
+from har_replay import (
+    har_settings_from_env, new_context, install_fault_injection, write_manifest, read_manifest,
+)
+from json_stream import write_json_lines
 from logger_config import setup_logging
-from save_to_postgres import save_data
+from parquet_archive import write_parquet_archive
+from save_to_postgres import _create_client_from_env, save_data
+from scrape_queue import enqueue_trains, plan_scrape_times
 
 import urllib.request
 import urllib.error
@@ -93,9 +99,10 @@ def fetch_page_data(page, url, page_num, logger, max_retries=3):
                 raise
 
 
-def get_train_data(target_date: datetime.date, logger: logging.Logger) -> list:
+def get_train_data(target_date: datetime.date, logger: logging.Logger, har_settings: dict = None) -> list:
     """
     Pobiera dane o frekwencji pociągów ze strony intercity.pl.
+    `har_settings` włącza nagrywanie lub odtwarzanie ruchu przeglądarki (zob. har_replay.py).
     """
     logger.info(f"Rozpoczęto pobieranie podstawowych danych o pociągach na dzień: {target_date}")
     all_trains_data = []
@@ -133,7 +140,7 @@ def get_train_data(target_date: datetime.date, logger: logging.Logger) -> list:
 
             browser = p.chromium.launch(**launch_args)
             # browser = p.chromium.launch(headless=False)
-            context = browser.new_context(**context_args)
+            context = new_context(browser, context_args, har_settings, "intercity", logger)
             page = context.new_page()
 
             def block_unnecessary_resources(route):
@@ -142,9 +149,10 @@ def get_train_data(target_date: datetime.date, logger: logging.Logger) -> list:
                 elif any(domain in route.request.url.lower() for domain in ["google-analytics", "googletagmanager", "hotjar", "facebook", "doubleclick", "analytics", "pixel"]):
                     route.abort()
                 else:
-                    route.continue_()
+                    route.fallback()
 
             page.route("**/*", block_unnecessary_resources)
+            install_fault_injection(page, har_settings, logger)
             apply_stealth(page)
         except Exception as e:
             logger.critical(f"Nie udało się zainicjować przeglądarki Playwright: {e}")
@@ -182,6 +190,7 @@ def get_train_data(target_date: datetime.date, logger: logging.Logger) -> list:
             logger.info(f"Pobrano {len(page_data)} pociągów ze strony {page_num}. Łącznie: {len(all_trains_data)}")
             page_num += 1
 
+        context.close()
         browser.close()
 
     headers_data = [
@@ -199,6 +208,40 @@ def get_train_data(target_date: datetime.date, logger: logging.Logger) -> list:
     return result_list
 
 
+def write_backups(data_with_delays: list, now: datetime.datetime, logger: logging.Logger, name_suffix: str = "",
+                  parquet: bool = True):
+    """
+    Zapisuje kopię danych do pliku JSON (lub JSON Lines przy OUTPUT_FORMAT=jsonl) w katalogu data/
+    oraz do archiwum Parquet partycjonowanego po dacie. `name_suffix` rozróżnia pliki workerów kolejki.
+    """
+    output_dir = "data"
+    os.makedirs(output_dir, exist_ok=True)
+    now_str = now.strftime("%Y-%m-%d-%H%M")
+    # OUTPUT_FORMAT=jsonl zapisuje kompaktowy JSON Lines (jeden pociąg w linii), który można czytać strumieniowo
+    output_format = os.environ.get("OUTPUT_FORMAT", "json").lower()
+    extension = "jsonl" if output_format == "jsonl" else "json"
+    output_filename = os.path.join(output_dir, f"train_data_{now_str}{name_suffix}.{extension}")
+    logger.info(f"Zapisywanie wszystkich danych do pliku: {output_filename}")
+
+    try:
+        if output_format == "jsonl":
+            write_json_lines(data_with_delays, output_filename)
+        else:
+            with open(output_filename, "w", encoding="utf-8-sig") as f:
+                json.dump(data_with_delays, f, ensure_ascii=False, indent=4)
+        logger.info("Zapisywanie danych do pliku JSON zakończone pomyślnie.")
+    except IOError as e:
+        logger.critical(f"Nie udało się zapisać pliku JSON: {e}")
+
+    if not parquet:
+        return
+    # Kolumnowe archiwum Parquet (partycjonowane po dacie)
+    try:
+        write_parquet_archive(data_with_delays, logger, scraped_at=now)
+    except Exception as e:
+        logger.error(f"Nie udało się zapisać archiwum Parquet: {e}", exc_info=True)
+
+
 if __name__ == "__main__":
     load_dotenv()
 
@@ -213,29 +256,44 @@ if __name__ == "__main__":
     warsaw_timezone = ZoneInfo("Europe/Warsaw")
     now = datetime.datetime.now(warsaw_timezone)
     today = now.date()
-    train_data_wo_delays = get_train_data(today, logger)
+
+    # HAR_MODE=record/replay: nagranie lub odtworzenie całego przebiegu (har_replay.py)
+    har_settings = har_settings_from_env()
+    if har_settings and har_settings["mode"] == "replay":
+        today = datetime.date.fromisoformat(read_manifest(har_settings["dir"])["target_date"])
+        logger.info(f"Odtwarzanie nagranego przebiegu z {har_settings['dir']} dla daty {today}.")
+
+    train_data_wo_delays = get_train_data(today, logger, har_settings)
+    if har_settings and har_settings["mode"] == "record":
+        write_manifest(har_settings, today.isoformat(), train_data_wo_delays)
 
     if not train_data_wo_delays:
         logger.warning("Nie udało się pobrać żadnych danych o pociągach. Zamykanie aplikacji.")
         sys.exit(0)
 
-    # 3. Pobranie informacji o opóźnieniach
-    logger.info("Rozpoczęto proces pobierania informacji o opóźnieniach...")
-    data_with_delays = get_delays(train_data_wo_delays, logger)
+    # 3. Pociągi trafiają do kolejki (sql/scrape_queue.sql), każdy z czasem tuż po planowym przyjeździe
+    # na stację końcową; trasy pobierają workery (scripts/scrape_worker.py, także na kolejnych maszynach).
+    # Nagrywanie/odtwarzanie HAR i dry run pobierają trasy od razu w tym procesie, tak jak przy niedostępnej kolejce.
+    if not har_settings and os.environ.get("DRY_RUN") != "1":
+        try:
+            supabase = _create_client_from_env(logger)
+            if supabase is not None:
+                scrape_times = plan_scrape_times(supabase, train_data_wo_delays, today, logger)
+                enqueue_trains(supabase, train_data_wo_delays, logger, scrape_times)
+                logger.info("Pociągi dodane do kolejki. Trasy pobiera scripts/scrape_worker.py po przyjeździe pociągów.")
+                sys.exit(0)
+        except Exception as e:
+            logger.error(f"Nie udało się dodać pociągów do kolejki: {e}. Pobieranie tras w tym procesie.", exc_info=True)
 
-    # 4. Zapis wyników do pliku JSON
-    output_dir = "data"
-    os.makedirs(output_dir, exist_ok=True)
-    now_str = now.strftime("%Y-%m-%d-%H%M")
-    output_filename = os.path.join(output_dir, f"train_data_{now_str}.json")
-    logger.info(f"Zapisywanie wszystkich danych do pliku: {output_filename}")
+    logger.info("Rozpoczęto proces pobierania informacji o opóźnieniach...")
+    data_with_delays = get_delays(train_data_wo_delays, logger, har_settings)
 
-    try:
-        with open(output_filename, "w", encoding="utf-8-sig") as f:
-            json.dump(data_with_delays, f, ensure_ascii=False, indent=4)
-        logger.info("Zapisywanie danych do pliku JSON zakończone pomyślnie.")
-    except IOError as e:
-        logger.critical(f"Nie udało się zapisać pliku JSON: {e}")
+    # 4. Zapis wyników do pliku JSON i archiwum Parquet
+    if har_settings and har_settings["mode"] == "replay":
+        write_backups(data_with_delays, now, logger, parquet=False)
+        logger.info("Odtworzony przebieg: pomijanie zapisu do archiwum Parquet i Supabase.")
+        sys.exit(0)
+    write_backups(data_with_delays, now, logger)
 
     if os.environ.get("DRY_RUN") == "1":
         logger.info("Uruchomiono w trybie dry_run. Pomijanie wysyłania danych do Supabase.")
@@ -245,4 +303,4 @@ if __name__ == "__main__":
 
     logger.info("=" * 50)
     logger.info("PROCES SCRAPOWANIA ZAKOŃCZONY")
-    logger.info("=" * 50)
\ No newline at end of file
+    logger.info("=" * 50)
@@ -0,0 +1,101 @@
+import os
+import json
+import time
+import random
+import logging
+from typing import List, Optional
+
+# Nagrywanie i odtwarzanie ruchu przeglądarki (HAR) dla get_train_data.py i get_delays.py.
+#   HAR_MODE=record  — każdy kontekst przeglądarki zapisuje ruch do <HAR_DIR>/<etykieta>.har.zip,
+#   HAR_MODE=replay  — odpowiedzi są serwowane z tych plików (route_from_har), bez sieci;
+#                      żądanie, którego nie ma w HAR, jest przerywane.
+# W trybie odtwarzania można wstrzyknąć opóźnienie każdej odpowiedzi (HAR_LATENCY_MS) i odsetek
+# nieudanych żądań (HAR_FAILURE_RATE, losowanie z ziarnem HAR_SEED), żeby powtarzalnie porównywać
+# strategie czekania i ponawiania.
+
+HAR_MODES = ("record", "replay")
+DEFAULT_HAR_DIR = os.path.join("data", "har")
+MANIFEST_FILENAME = "run.json"
+
+
+def har_settings_from_env() -> Optional[dict]:
+    """Ustawienia nagrywania/odtwarzania z environment variables albo None, jeśli HAR_MODE nie jest ustawione."""
+    mode = os.environ.get("HAR_MODE", "").lower()
+    if not mode:
+        return None
+    if mode not in HAR_MODES:
+        raise ValueError(f"Nieznany HAR_MODE: {mode} (dozwolone: {', '.join(HAR_MODES)}).")
+    return {
+        "mode": mode,
+        "dir": os.environ.get("HAR_DIR", DEFAULT_HAR_DIR),
+        "latency_ms": int(os.environ.get("HAR_LATENCY_MS", "0")),
+        "failure_rate": float(os.environ.get("HAR_FAILURE_RATE", "0")),
+        "seed": int(os.environ.get("HAR_SEED", "0")),
+    }
+
+
+def har_path(settings: dict, label: str) -> str:
+    return os.path.join(settings["dir"], f"{label}.har.zip")
+
+
+def new_context(browser, context_args: dict, settings: Optional[dict], label: str, logger: logging.Logger):
+    """
+    Tworzy kontekst przeglądarki; przy nagrywaniu z zapisem HAR (treści odpowiedzi w archiwum zip),
+    przy odtwarzaniu z odpowiedziami z HAR. Plik HAR jest zapisywany dopiero przy zamknięciu kontekstu.
+    """
+    if settings is None:
+        return browser.new_context(**context_args)
+
+    path = har_path(settings, label)
+    if settings["mode"] == "record":
+        os.makedirs(settings["dir"], exist_ok=True)
+        logger.info(f"Nagrywanie ruchu przeglądarki do {path}.")
+        return browser.new_context(**context_args, record_har_path=path, record_har_mode="full")
+
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Brak nagrania {path} do odtworzenia.")
+    context = browser.new_context(**context_args)
+    context.route_from_har(path, not_found="abort")
+    logger.info(f"Odtwarzanie ruchu przeglądarki z {path} (opóźnienie {settings['latency_ms']} ms, "
+                f"odsetek błędów {settings['failure_rate']:.0%}, ziarno {settings['seed']}).")
+    return context
+
+
+def install_fault_injection(page, settings: Optional[dict], logger: logging.Logger):
+    """
+    W trybie odtwarzania opóźnia każde żądanie o latency_ms i przerywa losowy odsetek failure_rate.
+    Handler jest rejestrowany jako ostatni, więc działa przed pozostałymi; przepuszczone żądania
+    trafiają przez route.fallback() dalej, aż do odpowiedzi z HAR. W API synchronicznym Playwright
+    handler wstrzymuje obsługę pozostałych żądań, więc opóźnienia kolejnych żądań strony się sumują.
+    """
+    if settings is None or settings["mode"] != "replay":
+        return
+    if not settings["latency_ms"] and not settings["failure_rate"]:
+        return
+
+    rng = random.Random(settings["seed"])
+    latency_s = settings["latency_ms"] / 1000
+    failure_rate = settings["failure_rate"]
+
+    def inject(route):
+        if latency_s:
+            time.sleep(latency_s)
+        if failure_rate and rng.random() < failure_rate:
+            logger.debug(f"Wstrzyknięty błąd żądania: {route.request.url}")
+            route.abort("failed")
+        else:
+            route.fallback()
+
+    page.route("**/*", inject)
+
+
+def write_manifest(settings: dict, target_date: str, trains: List[dict]):
+    """Zapisuje datę i listę pociągów nagranego przebiegu — odtworzenie pyta portal o te same pociągi."""
+    os.makedirs(settings["dir"], exist_ok=True)
+    with open(os.path.join(settings["dir"], MANIFEST_FILENAME), "w", encoding="utf-8") as f:
+        json.dump({"target_date": target_date, "trains": trains}, f, ensure_ascii=False, indent=2)
+
+
+def read_manifest(har_dir: str) -> dict:
+    with open(os.path.join(har_dir, MANIFEST_FILENAME), encoding="utf-8") as f:
+        return json.load(f)
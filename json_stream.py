@@ -0,0 +1,78 @@
+import json
+from typing import Iterable, Iterator
+
+_WHITESPACE = " \t\r\n"
+
+
+def iter_json_records(file_path: str, chunk_size: int = 1 << 16) -> Iterator[dict]:
+    """
+    Strumieniowo wczytuje rekordy pociągów z pliku zrzutu, bez parsowania całego pliku naraz.
+    Obsługuje zarówno JSON Lines (.jsonl, jeden rekord w linii), jak i klasyczny zrzut
+    w postaci tablicy JSON (indent=4, utf-8-sig) — wtedy elementy tablicy są dekodowane pojedynczo.
+    """
+    with open(file_path, "r", encoding="utf-8-sig") as f:
+        if file_path.endswith(".jsonl"):
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+            return
+
+        yield from _iter_json_array(f, chunk_size)
+
+
+def _iter_json_array(f, chunk_size: int) -> Iterator[dict]:
+    """Dekoduje kolejne elementy tablicy JSON najwyższego poziomu, doczytując plik porcjami."""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    eof = False
+    started = False
+
+    while True:
+        # Pomijamy białe znaki i separatory między elementami
+        while pos < len(buffer) and (buffer[pos] in _WHITESPACE or (started and buffer[pos] == ",")):
+            pos += 1
+
+        if pos >= len(buffer):
+            if eof:
+                raise ValueError("Nieoczekiwany koniec pliku JSON (brak zamykającego ']').")
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buffer, pos = buffer[pos:] + chunk, 0
+            continue
+
+        if not started:
+            if buffer[pos] != "[":
+                raise ValueError("Oczekiwano tablicy JSON na początku pliku.")
+            started = True
+            pos += 1
+            continue
+
+        if buffer[pos] == "]":
+            return
+
+        try:
+            record, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            # Element nie mieści się jeszcze w buforze — doczytujemy kolejną porcję
+            if eof:
+                raise
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buffer, pos = buffer[pos:] + chunk, 0
+            continue
+
+        yield record
+        buffer, pos = buffer[end:], 0
+
+
+def write_json_lines(records: Iterable[dict], file_path: str) -> int:
+    """Zapisuje rekordy w kompaktowym formacie JSON Lines. Zwraca liczbę zapisanych rekordów."""
+    count = 0
+    with open(file_path, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")))
+            f.write("\n")
+            count += 1
+    return count
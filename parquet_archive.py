@@ -0,0 +1,193 @@
+import os
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+ARCHIVE_DIR = os.path.join("data", "parquet")
+
+# Kolumny o niskiej kardynalności kodujemy słownikowo — nazwy stacji, kategorie
+# i opisy utrudnień powtarzają się w tysiącach wierszy każdego dnia.
+_DICT_STRING = pa.dictionary(pa.int32(), pa.string())
+
+ARCHIVE_SCHEMA = pa.schema([
+    # kolumny na poziomie przejazdu
+    ("number", pa.string()),
+    ("name", _DICT_STRING),
+    ("category", _DICT_STRING),
+    ("domestic", _DICT_STRING),
+    ("from_station", _DICT_STRING),
+    ("to_station", _DICT_STRING),
+    ("occupancy", _DICT_STRING),
+    ("is_cancelled", pa.bool_()),
+    ("delay_info_status", _DICT_STRING),
+    ("scraped_at", pa.timestamp("s")),
+    # kolumny na poziomie przystanku
+    ("stop_order", pa.int16()),
+    ("station_name", _DICT_STRING),
+    ("arrival_time", pa.string()),
+    ("departure_time", pa.string()),
+    ("delay_minutes_arrival", pa.int32()),
+    ("delay_minutes_departure", pa.int32()),
+    ("distance_km_from_start_to_next", pa.float64()),
+    ("travel_time_from_start_to_next", pa.string()),
+    ("difficulty_description", _DICT_STRING),
+    ("difficulty_location", _DICT_STRING),
+    ("stop_is_cancelled", pa.bool_()),
+])
+
+
+def _flatten_train(train: dict, scraped_at: datetime) -> List[dict]:
+    """Spłaszcza pojedynczy przejazd do listy wierszy (jeden wiersz na przystanek)."""
+    run_row = {
+        "number": train.get("number"),
+        "name": train.get("name"),
+        "category": train.get("category"),
+        "domestic": train.get("domestic"),
+        "from_station": train.get("from"),
+        "to_station": train.get("to"),
+        "occupancy": train.get("occupancy") or None,
+        "is_cancelled": bool(train.get("is_cancelled", False)),
+        "delay_info_status": None,
+        "scraped_at": scraped_at,
+    }
+
+    delay_info = train.get("delay_info")
+    if not isinstance(delay_info, list) or not delay_info:
+        # Przejazd bez trasy (np. "N/A", "page_load_timeout") zachowujemy jako pojedynczy
+        # wiersz z pustymi kolumnami przystanku, aby nie zgubić informacji o błędzie.
+        run_row["delay_info_status"] = delay_info if isinstance(delay_info, str) else None
+        return [run_row]
+
+    rows = []
+    for i, stop in enumerate(delay_info):
+        difficulties_info = stop.get("difficulties_info") or ["", ""]
+        rows.append({
+            **run_row,
+            "stop_order": i + 1,
+            "station_name": stop.get("station_name"),
+            "arrival_time": stop.get("arrival_time"),
+            "departure_time": stop.get("departure_time"),
+            "delay_minutes_arrival": stop.get("delay_minutes_arrival"),
+            "delay_minutes_departure": stop.get("delay_minutes_departure"),
+            "distance_km_from_start_to_next": stop.get("distance_km_from_start_to_next"),
+            "travel_time_from_start_to_next": stop.get("travel_time_from_start_to_next"),
+            "difficulty_description": difficulties_info[0] if len(difficulties_info) > 0 and difficulties_info[0] else None,
+            "difficulty_location": difficulties_info[1] if len(difficulties_info) > 1 and difficulties_info[1] else None,
+            "stop_is_cancelled": bool(stop.get("is_cancelled", False)),
+        })
+    return rows
+
+
+def write_parquet_archive(data_with_delays: list, logger: logging.Logger, scraped_at: Optional[datetime] = None,
+                          base_dir: str = ARCHIVE_DIR) -> List[str]:
+    """
+    Zapisuje dane pociągów do archiwum Parquet partycjonowanego po dacie
+    (base_dir/date=YYYY-MM-DD/train_data_<czas_scrapowania>.parquet).
+    Zwraca listę zapisanych plików.
+    """
+    if scraped_at is None:
+        scraped_at = datetime.now()
+    scraped_at = scraped_at.replace(tzinfo=None, microsecond=0)
+
+    rows_by_date: Dict[str, List[dict]] = {}
+    for train in data_with_delays:
+        date_str = train.get("date")
+        if not date_str:
+            logger.warning(f"Pociąg nr {train.get('number')} nie ma daty. Pomijanie w archiwum Parquet.")
+            continue
+        rows_by_date.setdefault(date_str, []).extend(_flatten_train(train, scraped_at))
+
+    written_files = []
+    for date_str, rows in sorted(rows_by_date.items()):
+        partition_dir = os.path.join(base_dir, f"date={date_str}")
+        os.makedirs(partition_dir, exist_ok=True)
+        file_path = os.path.join(partition_dir, f"train_data_{scraped_at.strftime('%Y-%m-%d-%H%M%S')}.parquet")
+
+        table = pa.Table.from_pylist(rows, schema=ARCHIVE_SCHEMA)
+        pq.write_table(table, file_path, compression="zstd")
+        written_files.append(file_path)
+        logger.info(f"Zapisano archiwum Parquet dla daty {date_str}: {file_path} ({table.num_rows} wierszy).")
+
+    return written_files
+
+
+def read_parquet_archive(start_date: Optional[str] = None, end_date: Optional[str] = None,
+                         columns: Optional[List[str]] = None, base_dir: str = ARCHIVE_DIR) -> pa.Table:
+    """
+    Wczytuje archiwum Parquet dla przedziału dat [start_date, end_date] (format YYYY-MM-DD, oba końce włącznie).
+    Dzięki partycjonowaniu po dacie czytane są wyłącznie pliki z żądanego przedziału.
+    """
+    partitioning = ds.partitioning(pa.schema([("date", pa.string())]), flavor="hive")
+    dataset = ds.dataset(base_dir, format="parquet", partitioning=partitioning)
+
+    date_filter = None
+    if start_date:
+        date_filter = ds.field("date") >= start_date
+    if end_date:
+        end_filter = ds.field("date") <= end_date
+        date_filter = end_filter if date_filter is None else date_filter & end_filter
+
+    return dataset.to_table(columns=columns, filter=date_filter)
+
+
+def read_parquet_file(file_path: str) -> pa.Table:
+    """
+    Wczytuje pojedynczy plik archiwum. Kolumna daty nie jest zapisana w pliku (wynika z katalogu
+    partycji date=YYYY-MM-DD), więc dołączamy ją na podstawie ścieżki.
+    """
+    table = pq.read_table(file_path, schema=ARCHIVE_SCHEMA)
+    partition_dir = os.path.basename(os.path.dirname(os.path.abspath(file_path)))
+    date_str = partition_dir.split("=", 1)[1] if partition_dir.startswith("date=") else None
+    return table.append_column("date", pa.array([date_str] * table.num_rows, type=pa.string()))
+
+
+def table_to_trains(table: pa.Table) -> List[dict]:
+    """
+    Odtwarza z płaskiej tabeli archiwum listę słowników w formacie zwracanym przez get_delays
+    (ten sam kształt co w plikach data/train_data_*.json), gotową do przekazania do save_data.
+    Każde wywołanie write_parquet_archive daje osobny plik, więc przejazdy grupujemy
+    po (numer, data, czas scrapowania).
+    """
+    trains: Dict[tuple, dict] = {}
+    for row in table.to_pylist():
+        key = (row["number"], row["date"], row["scraped_at"])
+        train = trains.get(key)
+        if train is None:
+            train = {
+                "domestic": row["domestic"],
+                "number": row["number"],
+                "category": row["category"],
+                "name": row["name"],
+                "from": row["from_station"],
+                "to": row["to_station"],
+                "occupancy": row["occupancy"],
+                "date": row["date"],
+                "is_cancelled": row["is_cancelled"],
+                "scraped_at": row["scraped_at"],
+                "delay_info": row["delay_info_status"] if row["stop_order"] is None else [],
+            }
+            trains[key] = train
+
+        if row["stop_order"] is None:
+            continue
+
+        train["delay_info"].append((row["stop_order"], {
+            "station_name": row["station_name"],
+            "arrival_time": row["arrival_time"],
+            "departure_time": row["departure_time"],
+            "delay_minutes_arrival": row["delay_minutes_arrival"],
+            "delay_minutes_departure": row["delay_minutes_departure"],
+            "distance_km_from_start_to_next": row["distance_km_from_start_to_next"],
+            "travel_time_from_start_to_next": row["travel_time_from_start_to_next"],
+            "difficulties_info": [row["difficulty_description"] or "", row["difficulty_location"] or ""],
+            "is_cancelled": row["stop_is_cancelled"],
+        }))
+
+    for train in trains.values():
+        if isinstance(train["delay_info"], list):
+            train["delay_info"] = [stop for _, stop in sorted(train["delay_info"], key=lambda s: s[0])]
+    return list(trains.values())
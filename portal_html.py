@@ -0,0 +1,384 @@
+import re
+import logging
+from html.parser import HTMLParser
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+# Wspólna logika parsowania stron portalpasazera.pl: funkcje działające na tekstach elementów są używane
+# zarówno przez ścieżkę na żywo (get_delays.get_train_details, lokatory Playwright), jak i przez parser
+# statycznego HTML poniżej (zapisane strony, scripts/benchmark_parser.py), więc obie dają ten sam wynik.
+
+NO_TRAINS_TEXTS = ("dobie brak kursujących pociągów", "brak kursujących pociągów")
+INVALID_NUMBER_TEXT = "Wpisany numer pociągu jest nieprawidłowy"
+CARRIER = "IC"
+
+_TIME_RE = re.compile(r'\b(\d{2}:\d{2})\b')
+_TRANSFER_SUFFIX_RE = re.compile(r'(?i)\s*przesiadka$')
+
+
+def parse_delay(delay_text: str) -> int:
+    """Wyciąga liczbę minut opóźnienia z tekstu"""
+    if not delay_text:
+        return 0
+    match = re.search(r'\(\+(\d+)\s*min\)', delay_text, re.IGNORECASE)
+    return int(match.group(1)) if match else 0
+
+
+def parse_distance_and_time_info(info_text: str) -> tuple:
+    """Wyciąga dystans i czas przejazdu z tekstu."""
+    if not info_text:
+        return None, None
+
+    distance_km = None
+    travel_time = None
+
+    # Wyszukiwanie dystansu (np. 12.6 km lub 12,6 km) w całym tekście
+    distance_match = re.search(r'([\d,\.]+)\s*km', info_text)
+    if distance_match:
+        distance_km = float(distance_match.group(1).replace(',', '.'))
+
+    # Wyszukiwanie czasu przejazdu (np. 12h:14min) w całym tekście
+    time_match = re.search(r'(\d+h:\d+min)', info_text)
+    if time_match:
+        travel_time = time_match.group(1)
+
+    return distance_km, travel_time
+
+
+def parse_difficulties(difficulties_text: str) -> tuple:
+    """Wyciąga informacje o utrudnieniach i stacji z tekstu."""
+    if not difficulties_text:
+        return None, None
+    parts = difficulties_text.split('\n')
+    return parts[1].strip(), parts[2].strip() if len(parts) > 1 else None
+
+
+def parse_difficulty_attribute(data_obj_1_value: Optional[str]) -> Tuple[str, str]:
+    """Powód utrudnienia i stacja z atrybutu data-obj-1 przycisku utrudnień (pola rozdzielone '$' i '#')."""
+    station_diff, difficulties_reason = "", ""
+    if data_obj_1_value:
+        parts = data_obj_1_value.split('$')
+        if len(parts) > 0:
+            first_part_elements = parts[0].split('###')
+            if len(first_part_elements) > 1:
+                station_diff = first_part_elements[1].lstrip('#').strip()
+        if len(parts) > 2:
+            difficulties_reason = parts[2]
+            if '#' in difficulties_reason:
+                reason_parts = difficulties_reason.split('#', 1)
+                difficulties_reason = reason_parts[0].strip()
+                if len(reason_parts) > 1 and reason_parts[1].strip():
+                    station_diff = reason_parts[1].strip()
+    return difficulties_reason, station_diff
+
+
+def _parse_time_and_delay(time_text: Optional[str]) -> Tuple[Optional[str], int]:
+    if not time_text:
+        return None, 0
+    time_match = _TIME_RE.search(time_text)
+    return (time_match.group(1) if time_match else None), parse_delay(time_text)
+
+
+def parse_stop(station_text: str, hidden_text: Optional[str], arrival_text: Optional[str],
+               departure_text: Optional[str], info_text: Optional[str], difficulties_attr: Optional[str]) -> dict:
+    """
+    Rekord przystanku z tekstów elementów pozycji osi czasu (timeline__item):
+    nagłówka stacji, ukrytego opisu (odwołanie), czasów przyjazdu i odjazdu, dystansu oraz atrybutu utrudnień.
+    Brakujący element przekazujemy jako None.
+    """
+    raw_station_name = station_text.split(":", 1)[-1].strip()
+    station_name = _TRANSFER_SUFFIX_RE.sub('', raw_station_name).strip()
+    is_cancelled = "odwołan" in hidden_text.lower() if hidden_text is not None else False
+    arrival_time, delay_minutes_arrival = _parse_time_and_delay(arrival_text)
+    departure_time, delay_minutes_departure = _parse_time_and_delay(departure_text)
+    distance_km, travel_time_to_next = parse_distance_and_time_info(info_text or "")
+    difficulties_reason, station_diff = parse_difficulty_attribute(difficulties_attr)
+    return {
+        "station_name": station_name, "arrival_time": arrival_time, "departure_time": departure_time,
+        "delay_minutes_arrival": delay_minutes_arrival, "delay_minutes_departure": delay_minutes_departure,
+        "distance_km_from_start_to_next": distance_km, "travel_time_from_start_to_next": travel_time_to_next,
+        "difficulties_info": [difficulties_reason, station_diff],
+        "is_cancelled": is_cancelled
+    }
+
+
+def merge_duplicate_stations(route_details: List[dict]) -> List[dict]:
+    """Usunięcie duplikatów stacji (np. przy częściowo odwołanych pociągach) — scala kolejne wystąpienia w pierwsze."""
+    merged_route_details = []
+    station_index_map = {}
+
+    for stop in route_details:
+        name = stop["station_name"]
+        if name not in station_index_map:
+            station_index_map[name] = len(merged_route_details)
+            merged_route_details.append(stop)
+        else:
+            existing_stop = merged_route_details[station_index_map[name]]
+
+            # Scalanie czasów i opóźnień
+            if stop.get("arrival_time") and not existing_stop.get("arrival_time"):
+                existing_stop["arrival_time"] = stop["arrival_time"]
+                existing_stop["delay_minutes_arrival"] = stop.get("delay_minutes_arrival", 0)
+
+            if stop.get("departure_time") and not existing_stop.get("departure_time"):
+                existing_stop["departure_time"] = stop["departure_time"]
+                existing_stop["delay_minutes_departure"] = stop.get("delay_minutes_departure", 0)
+
+            # Stacja nie jest odwołana, jeśli choć jedno jej wystąpienie nie było odwołane
+            existing_stop["is_cancelled"] = existing_stop["is_cancelled"] and stop["is_cancelled"]
+
+            # Scalanie informacji o utrudnieniach
+            for idx in range(len(existing_stop["difficulties_info"])):
+                if idx < len(stop["difficulties_info"]):
+                    if stop["difficulties_info"][idx] and not existing_stop["difficulties_info"][idx]:
+                        existing_stop["difficulties_info"][idx] = stop["difficulties_info"][idx]
+
+            # Scalanie odległości i czasu przejazdu do następnej stacji
+            if stop.get("distance_km_from_start_to_next") is not None and existing_stop.get("distance_km_from_start_to_next") is None:
+                existing_stop["distance_km_from_start_to_next"] = stop["distance_km_from_start_to_next"]
+            if stop.get("travel_time_from_start_to_next") is not None and existing_stop.get("travel_time_from_start_to_next") is None:
+                existing_stop["travel_time_from_start_to_next"] = stop["travel_time_from_start_to_next"]
+
+    return merged_route_details
+
+
+def is_matching_train(found_numbers: List[str], train_number: str) -> bool:
+    """Czy któryś z numerów w wierszu wyników odpowiada szukanemu (±1 — numer zmienia się na granicy województw)."""
+    return any(abs(int(num) - int(train_number)) <= 1 for num in found_numbers)
+
+
+# --- Statyczny HTML ---------------------------------------------------------------------------------------
+
+_VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param", "source",
+              "track", "wbr"}
+_HIDDEN_TAGS = {"script", "style", "template", "noscript", "head"}
+_BLOCK_TAGS = {"address", "article", "aside", "blockquote", "dd", "div", "dl", "dt", "fieldset", "figure",
+               "footer", "form", "h1", "h2", "h3", "h4", "h5", "h6", "header", "hr", "li", "main", "nav", "ol",
+               "p", "section", "table", "tr", "ul"}
+_WHITESPACE_RE = re.compile(r'\s+')
+_DISPLAY_NONE_RE = re.compile(r'display\s*:\s*none', re.IGNORECASE)
+
+
+class Element:
+    """Węzeł drzewa HTML: tag, atrybuty, klasy i dzieci (elementy albo teksty)."""
+
+    __slots__ = ("tag", "attrs", "classes", "children", "parent")
+
+    def __init__(self, tag: str, attrs: Dict[str, str], parent: Optional["Element"] = None):
+        self.tag = tag
+        self.attrs = attrs
+        self.classes = frozenset(attrs.get("class", "").split())
+        self.children: List[Union["Element", str]] = []
+        self.parent = parent
+
+    def iter(self) -> Iterator["Element"]:
+        """Elementy potomne w kolejności dokumentu (bez samego elementu)."""
+        stack = [child for child in reversed(self.children) if isinstance(child, Element)]
+        while stack:
+            element = stack.pop()
+            yield element
+            stack.extend(child for child in reversed(element.children) if isinstance(child, Element))
+
+    def find_all(self, tag: str = None, cls: str = None, predicate: Callable[["Element"], bool] = None) -> List["Element"]:
+        return [e for e in self.iter()
+                if (tag is None or e.tag == tag) and (cls is None or cls in e.classes)
+                and (predicate is None or predicate(e))]
+
+    def find(self, tag: str = None, cls: str = None, predicate: Callable[["Element"], bool] = None) -> Optional["Element"]:
+        for e in self.iter():
+            if (tag is None or e.tag == tag) and (cls is None or cls in e.classes) and (predicate is None or predicate(e)):
+                return e
+        return None
+
+    def has_ancestor(self, tag: str, cls: str) -> bool:
+        element = self.parent
+        while element is not None:
+            if element.tag == tag and cls in element.classes:
+                return True
+            element = element.parent
+        return False
+
+    def child_elements(self) -> List["Element"]:
+        return [child for child in self.children if isinstance(child, Element)]
+
+    def text_content(self) -> str:
+        """Odpowiednik DOM textContent: cały tekst potomków, bez normalizacji."""
+        parts = []
+        stack = list(reversed(self.children))
+        while stack:
+            node = stack.pop()
+            if isinstance(node, str):
+                parts.append(node)
+            else:
+                stack.extend(reversed(node.children))
+        return "".join(parts)
+
+    def inner_text(self) -> str:
+        """
+        Przybliżenie innerText przeglądarki: pomija elementy niewyświetlane, scala białe znaki,
+        a elementy blokowe i <br> rozdziela znakiem nowej linii.
+        """
+        parts: List[str] = []
+        self._collect_text(parts)
+        lines = (_WHITESPACE_RE.sub(" ", line).strip() for line in "".join(parts).split("\n"))
+        return "\n".join(line for line in lines if line)
+
+    def _collect_text(self, parts: List[str]):
+        for node in self.children:
+            if isinstance(node, str):
+                parts.append(node.replace("\n", " "))
+            elif not node.is_hidden():
+                if node.tag == "br":
+                    parts.append("\n")
+                elif node.tag in _BLOCK_TAGS:
+                    parts.append("\n")
+                    node._collect_text(parts)
+                    parts.append("\n")
+                else:
+                    node._collect_text(parts)
+
+    def is_hidden(self) -> bool:
+        return (self.tag in _HIDDEN_TAGS or "hidden" in self.attrs
+                or bool(_DISPLAY_NONE_RE.search(self.attrs.get("style", ""))))
+
+    def is_visible(self) -> bool:
+        """Element i jego przodkowie nie są ukryci (atrybut hidden, display:none)."""
+        element = self
+        while element is not None:
+            if element.is_hidden():
+                return False
+            element = element.parent
+        return True
+
+    def has_text(self, text: str) -> bool:
+        """Odpowiednik :has-text() z Playwright: podciąg bez rozróżniania wielkości liter, po scaleniu białych znaków."""
+        return text.lower() in _WHITESPACE_RE.sub(" ", self.text_content()).lower()
+
+
+class _TreeBuilder(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = Element("#document", {})
+        self.current = self.root
+
+    def handle_starttag(self, tag, attrs):
+        element = Element(tag, {name: value or "" for name, value in attrs}, self.current)
+        self.current.children.append(element)
+        if tag not in _VOID_TAGS:
+            self.current = element
+
+    def handle_startendtag(self, tag, attrs):
+        self.current.children.append(Element(tag, {name: value or "" for name, value in attrs}, self.current))
+
+    def handle_endtag(self, tag):
+        # Zamykamy do najbliższego otwartego elementu o tym tagu; niedopasowany znacznik końcowy ignorujemy
+        element = self.current
+        while element is not self.root and element.tag != tag:
+            element = element.parent
+        if element is not self.root:
+            self.current = element.parent
+
+    def handle_data(self, data):
+        self.current.children.append(data)
+
+
+def parse_html(html: str) -> Element:
+    """Buduje drzewo elementów z zapisanej strony (html.parser z biblioteki standardowej)."""
+    builder = _TreeBuilder()
+    builder.feed(html)
+    builder.close()
+    return builder.root
+
+
+def _labelled_value(row: Element, label: str) -> Optional[Element]:
+    """div:has(> span.item-label:has-text(label)) > strong.item-value — pierwsze dopasowanie w wierszu."""
+    for div in row.find_all("div"):
+        children = div.child_elements()
+        if any(c.tag == "span" and "item-label" in c.classes and c.has_text(label) for c in children):
+            for c in children:
+                if c.tag == "strong" and "item-value" in c.classes:
+                    return c
+    return None
+
+
+def find_train_row(document: Element, train_number: str, logger: logging.Logger) -> Union[Element, str]:
+    """
+    Wiersz wyników wyszukiwania z pasującym pociągiem IC albo status jak w get_train_details:
+    "N/A" (brak kursujących pociągów, błędny numer, brak pasującego wiersza) lub "page_load_timeout"
+    (strona nie zawiera ani wyników, ani komunikatu — na żywo skończyłoby się to przekroczeniem czasu).
+    """
+    no_train_msg = document.find("h3", predicate=lambda e: any(e.has_text(t) for t in NO_TRAINS_TEXTS) and e.is_visible())
+    invalid_nr_msg = document.find("div", "param-error", lambda e: e.has_text(INVALID_NUMBER_TEXT) and e.is_visible())
+    if document.find("div", "catalog-table") is None and no_train_msg is None and invalid_nr_msg is None:
+        logger.warning(f"Strona nie zawiera wyników ani komunikatu o błędzie dla pociągu {train_number}.")
+        return "page_load_timeout"
+    if no_train_msg is not None:
+        logger.warning(
+            f"Nie znaleziono pociągu o numerze {train_number}. Komunikat strony: '{no_train_msg.inner_text().strip()}'")
+        return "N/A"
+    if invalid_nr_msg is not None:
+        logger.warning(f"Dla numeru {train_number} znaleziono błąd: '{INVALID_NUMBER_TEXT}'")
+        return "N/A"
+
+    for i, row in enumerate(document.find_all("div", "catalog-table__row")):
+        carrier_element = _labelled_value(row, "Przewoźnik")
+        numbers_container = _labelled_value(row, "Nr pociągu")
+        if carrier_element is None or numbers_container is None:
+            logger.warning(f"Wiersz {i + 1} ma niekompletną strukturę, pomijam.")
+            continue
+
+        if carrier_element.inner_text().strip() == CARRIER:
+            found_numbers_str = [span.inner_text() for span in numbers_container.find_all("span")]
+            if not found_numbers_str:
+                found_numbers_str = [numbers_container.inner_text().strip()]
+            try:
+                if is_matching_train(found_numbers_str, train_number):
+                    return row
+            except (ValueError, TypeError):
+                logger.warning(f"W wierszu znaleziono nieprawidłowy format numeru pociągu: {found_numbers_str}")
+                continue
+
+    logger.warning(f"Przeanalizowano wszystkie wiersze, ale nie znaleziono pasującego pociągu IC dla numeru {train_number}.")
+    return "N/A"
+
+
+def _first_text(item: Element, tag: str, cls: str, inner: bool = True) -> Optional[str]:
+    element = item.find(tag, cls)
+    if element is None:
+        return None
+    return element.inner_text() if inner else element.text_content()
+
+
+def parse_timeline(document: Element) -> List[dict]:
+    """Przystanki z osi czasu trasy (div.timeline--connection), z pominięciem pozycji objazdu i po scaleniu duplikatów."""
+    items = document.find_all("div", "timeline__item", lambda e: "timeline__item-detour" not in e.classes
+                              and e.has_ancestor("div", "timeline--connection"))
+
+    route_details = []
+    for item in items:
+        difficulties_btn = item.find("button", predicate=lambda e: e.attrs.get("data-window-type") == "difficulties")
+        route_details.append(parse_stop(
+            _first_text(item, "h3", "timeline__content-station"),
+            _first_text(item, "span", "visuallyhidden"),
+            _first_text(item, "span", "timeline__numbers-time__stop", inner=False),
+            _first_text(item, "span", "timeline__numbers-time__start", inner=False),
+            _first_text(item, "p", "timeline__numbers-km"),
+            difficulties_btn.attrs.get("data-obj-1") if difficulties_btn is not None else None,
+        ))
+    return merge_duplicate_stations(route_details)
+
+
+def parse_train_pages(search_html: str, timeline_html: Optional[str], train_number: str,
+                      logger: logging.Logger) -> Union[List[dict], str]:
+    """
+    Wynik get_train_details odtworzony z zapisanych stron: wyników wyszukiwania i (po kliknięciu w szczegóły)
+    osi czasu trasy. Brak strony z trasą albo div.timeline na niej daje "not_found", jak na żywo.
+    """
+    row = find_train_row(parse_html(search_html), train_number, logger)
+    if isinstance(row, str):
+        return row
+    if timeline_html is None:
+        return "not_found"
+    document = parse_html(timeline_html)
+    if document.find("div", "timeline") is None:
+        return "not_found"
+    return parse_timeline(document)
@@ -3,8 +3,14 @@ import json
 import logging
 import urllib.request
 import re
+import time
+from datetime import date, datetime, time as dt_time, timedelta
+from zoneinfo import ZoneInfo
+from concurrent.futures import ThreadPoolExecutor
 from supabase import create_client, Client
-from typing import Dict, List, Any, Tuple, Set
+from typing import Dict, List, Any, Tuple, Set, Iterable, Optional
+
+from delay_stats import refresh_delay_stats
 
 def load_station_aliases() -> Dict[str, str]:
     aliases_path = os.path.join(os.path.dirname(__file__), 'docs', 'misc', 'station_aliases.json')
@@ -380,42 +386,152 @@ def normalize_distance(d) -> float:
     except (ValueError, TypeError):
         return 0.0
 
-def save_data(data_with_delays: list, logger: logging.Logger, update_occupancy: bool = False, overwrite: bool = False):
+# Zapas po oszacowanym rzeczywistym przyjeździe, zanim trasę uznamy za ostateczną (minuty)
+FINAL_MARGIN_MINUTES = 15
+
+
+def _is_run_final(train_data: dict) -> bool:
+    """
+    Czy pobrana trasa jest ostateczna: pociąg pobrano (train_data["scraped_at"], z get_delays) po rzeczywistym
+    przyjeździe na stację końcową. Portal podaje 0 min dla stacji, do których pociąg jeszcze nie dojechał,
+    więc opóźnienie na stacji końcowej szacujemy z dołu największym opóźnieniem na trasie i dodajemy
+    FINAL_MARGIN_MINUTES. Godziny na trasie nie mają daty — każdy spadek godziny względem poprzedniej
+    oznacza kolejną dobę. Bez czasu pobrania (np. stare kopie zapasowe) przejazd nie jest uznawany za ostateczny.
+    """
+    delay_info = train_data.get("delay_info")
+    scraped_at = train_data.get("scraped_at")
+    if not isinstance(delay_info, list) or not delay_info or not scraped_at or not train_data.get("date"):
+        return False
+
+    try:
+        if not isinstance(scraped_at, datetime):
+            scraped_at = datetime.fromisoformat(str(scraped_at))
+        if scraped_at.tzinfo is None:
+            scraped_at = scraped_at.replace(tzinfo=ZoneInfo("Europe/Warsaw"))
+
+        day_offset, previous, arrival = 0, None, None
+        for stop in delay_info:
+            for key in ("arrival_time", "departure_time"):
+                t = normalize_time(stop.get(key))
+                if not t:
+                    continue
+                current = dt_time.fromisoformat(t)
+                if previous is not None and current < previous:
+                    day_offset += 1
+                previous = current
+                if key == "arrival_time":
+                    arrival = (current, day_offset)
+        if arrival is None:
+            return False
+
+        arrival_time, arrival_day = arrival
+        arrived_at = datetime.combine(date.fromisoformat(train_data["date"]) + timedelta(days=arrival_day), arrival_time,
+                                      tzinfo=ZoneInfo("Europe/Warsaw"))
+        final_delay = max((stop.get(key) or 0 for stop in delay_info
+                           for key in ("delay_minutes_arrival", "delay_minutes_departure")), default=0)
+        arrived_at += timedelta(minutes=max(final_delay, 0) + FINAL_MARGIN_MINUTES)
+        return scraped_at >= arrived_at
+    except (ValueError, TypeError):
+        return False
+
+
+def _load_dictionary_caches(supabase: Client, logger: logging.Logger) -> Tuple[Dict, Dict, Dict, Dict, Dict]:
+    """
+    Wczytuje tabele słownikowe (stacje, kategorie, frekwencje, utrudnienia, usługi) do cache'a.
+    Zwraca krotkę: (stations, categories, occupancies, difficulties, services).
+    """
+    logger.info("Wczytywanie istniejących danych słownikowych do cache'a...")
+    stations_cache = {s['name']: s['id'] for s in supabase.table('stations').select('id, name').execute().data}
+    categories_cache = {c['category_code']: c['id'] for c in
+                        supabase.table('train_categories').select('id, category_code').execute().data}
+    occupancies_cache = {o['status_description']: o['id'] for o in
+                         supabase.table('occupancies').select('id, status_description').execute().data}
+    difficulties_cache = {d['description']: d['id'] for d in
+                          supabase.table('difficulties').select('id, description').execute().data}
+
+    # Cache dla usług (pociągów) - kluczem jest krotka cech
+    services_data = supabase.table('train_services').select('id, number, name, category_id, is_domestic, start_station_id, end_station_id').execute().data
+    services_cache = {
+        (s['number'], s['name'], s['category_id'], s['is_domestic'], s['start_station_id'], s['end_station_id']): s['id']
+        for s in services_data
+    }
+
+    logger.info(
+        f"Wczytano: {len(stations_cache)} stacji, {len(categories_cache)} kategorii, {len(services_cache)} usług (pociągów).")
+    return stations_cache, categories_cache, occupancies_cache, difficulties_cache, services_cache
+
+
+def _ensure_date_partitions(supabase: Client, logger: logging.Logger, months_ahead: int = 2,
+                            date_from: Optional[str] = None, date_to: Optional[str] = None):
+    """
+    Tworzy z wyprzedzeniem miesięczne partycje train_runs/run_stops (sql/partition_by_date.sql),
+    aby bieżące zapisy nie trafiały do partycji domyślnej. date_from/date_to (YYYY-MM-DD) poszerzają zakres
+    o zapisywane dni — odtwarzanie archiwum pisze daty historyczne, a wiersze w partycji domyślnej
+    blokują później utworzenie partycji dla ich miesiąca.
+    """
+    today = date.today()
+    p_from = today.replace(day=1)
+    p_to = today + timedelta(days=31 * months_ahead)
+    if date_from:
+        p_from = min(p_from, date.fromisoformat(date_from).replace(day=1))
+    if date_to:
+        p_to = max(p_to, date.fromisoformat(date_to))
+    try:
+        supabase.rpc("create_date_partitions", {
+            "p_from": p_from.isoformat(),
+            "p_to": p_to.isoformat()
+        }).execute()
+    except Exception as e:
+        logger.warning(f"Nie udało się utworzyć partycji dat: {e}")
+
+
+def _format_train_name(train_name_raw: str) -> str:
+    """Obsługa nazwy pociągu (overrides i formatowanie)."""
+    if train_name_raw in TRAIN_NAME_OVERRIDES:
+        return TRAIN_NAME_OVERRIDES[train_name_raw]
+    if "-" in train_name_raw:
+        # Jeśli nazwa zawiera '-', traktujemy ją jako techniczny placeholder relacji
+        # Zostawiamy FULL CAPS, aby frontend mógł to odfiltrować
+        return train_name_raw
+    # Pozostałe nazwy własne formatujemy do Title Case (np. Albatros)
+    return train_name_raw.title()
+
+
+def _create_client_from_env(logger: logging.Logger) -> Optional[Client]:
+    url: str = os.environ.get("SUPABASE_URL")
+    key: str = os.environ.get("SUPABASE_SERVICE_KEY")
+
+    if not url or not key:
+        logger.critical("Brak zmiennych środowiskowych SUPABASE_URL lub SUPABASE_SERVICE_KEY. Przerwano zapis.")
+        return None
+    return create_client(url, key)
+
+
+def save_data(data_with_delays: Iterable[dict], logger: logging.Logger, update_occupancy: bool = False, overwrite: bool = False,
+              supabase: Client = None, caches: Optional[Tuple[Dict, Dict, Dict, Dict, Dict]] = None,
+              touched_dates: Optional[Set[str]] = None):
     """
     Zapisuje przetworzone dane pociągów do bazy danych PostgreSQL (Supabase),
     uwzględniając znormalizowany schemat i obsługę błędów.
+    data_with_delays może być listą lub generatorem (np. iter_json_records) — rekordy są przetwarzane pojedynczo.
+    Bez podanego klienta `supabase` łączy się na podstawie SUPABASE_URL i SUPABASE_SERVICE_KEY.
+    Wołający, który zapisuje wiele paczek (worker kolejki), podaje `caches` z _load_dictionary_caches
+    (partycje tworzy sam) i zbiór `touched_dates` — zapisane dni trafiają do niego, a przeliczenie
+    statystyk opóźnień wykonuje wołający raz, po ostatniej paczce.
     """
     logger.info("Rozpoczęto proces zapisywania danych do bazy danych.")
 
     try:
-        url: str = os.environ.get("SUPABASE_URL")
-        key: str = os.environ.get("SUPABASE_SERVICE_KEY")
-
-        if not url or not key:
-            logger.critical("Brak zmiennych środowiskowych SUPABASE_URL lub SUPABASE_SERVICE_KEY. Przerwano zapis.")
-            return
-
-        supabase: Client = create_client(url, key)
-        logger.info("Pomyślnie połączono z bazą danych.")
-
-        logger.info("Wczytywanie istniejących danych słownikowych do cache'a...")
-        stations_cache = {s['name']: s['id'] for s in supabase.table('stations').select('id, name').execute().data}
-        categories_cache = {c['category_code']: c['id'] for c in
-                            supabase.table('train_categories').select('id, category_code').execute().data}
-        occupancies_cache = {o['status_description']: o['id'] for o in
-                             supabase.table('occupancies').select('id, status_description').execute().data}
-        difficulties_cache = {d['description']: d['id'] for d in
-                              supabase.table('difficulties').select('id, description').execute().data}
-
-        # Cache dla usług (pociągów) - kluczem jest krotka cech
-        services_data = supabase.table('train_services').select('id, number, name, category_id, is_domestic, start_station_id, end_station_id').execute().data
-        services_cache = {
-            (s['number'], s['name'], s['category_id'], s['is_domestic'], s['start_station_id'], s['end_station_id']): s['id']
-            for s in services_data
-        }
+        if supabase is None:
+            supabase = _create_client_from_env(logger)
+            if supabase is None:
+                return
+            logger.info("Pomyślnie połączono z bazą danych.")
 
-        logger.info(
-            f"Wczytano: {len(stations_cache)} stacji, {len(categories_cache)} kategorii, {len(services_cache)} usług (pociągów).")
+        if caches is None:
+            _ensure_date_partitions(supabase, logger)
+            caches = _load_dictionary_caches(supabase, logger)
+        stations_cache, categories_cache, occupancies_cache, difficulties_cache, services_cache = caches
 
     except Exception as e:
         logger.critical(f"Krytyczny błąd podczas inicjalizacji połączenia lub cache'a: {e}")
@@ -425,6 +541,9 @@ def save_data(data_with_delays: list, logger: logging.Logger, update_occupancy:
     stops_inserted = 0
     difficulties_links_inserted = 0
     new_stations: Set[str] = set()  # stacje odkryte po raz pierwszy w tej sesji
+    refresh_stats = touched_dates is None
+    if touched_dates is None:
+        touched_dates = set()  # dni, dla których trzeba przeliczyć statystyki opóźnień
 
     for train_data in data_with_delays:
         train_number = train_data.get("number")
@@ -453,17 +572,7 @@ def save_data(data_with_delays: list, logger: logging.Logger, update_occupancy:
                 runs_with_errors += 1
                 continue
 
-            # Obsługa nazwy pociągu (overrides i formatowanie)
-            train_name_raw = train_data.get("name", "").strip()
-            if train_name_raw in TRAIN_NAME_OVERRIDES:
-                train_name = TRAIN_NAME_OVERRIDES[train_name_raw]
-            elif "-" in train_name_raw:
-                # Jeśli nazwa zawiera '-', traktujemy ją jako techniczny placeholder relacji
-                # Zostawiamy FULL CAPS, aby frontend mógł to odfiltrować
-                train_name = train_name_raw
-            else:
-                # Pozostałe nazwy własne formatujemy do Title Case (np. Albatros)
-                train_name = train_name_raw.title()
+            train_name = _format_train_name(train_data.get("name", "").strip())
 
             # Pobranie/Utworzenie service_id
             service_data = {
@@ -497,6 +606,10 @@ def save_data(data_with_delays: list, logger: logging.Logger, update_occupancy:
                 "occupancy_id": occupancy_id,
                 "is_cancelled": train_data.get("is_cancelled", False)
             }
+            # Flaga ostateczności jest tylko podnoszona — zapis bez trasy (np. nieudane łatanie) jej nie zdejmuje
+            is_final = _is_run_final(train_data)
+            if is_final:
+                run_to_insert["is_final"] = True
 
             response = supabase.table("train_runs").upsert(
                 run_to_insert,
@@ -517,7 +630,9 @@ def save_data(data_with_delays: list, logger: logging.Logger, update_occupancy:
                 continue
 
             # Sprawdzamy, czy ten przejazd ma już przypisane przystanki
-            existing_stops_res = supabase.table("run_stops").select("*").eq("run_id", inserted_run_id).order("stop_order").execute()
+            run_date = train_data.get("date")
+            touched_dates.add(run_date)
+            existing_stops_res = supabase.table("run_stops").select("*").eq("run_id", inserted_run_id).eq("date", run_date).order("stop_order").execute()
             existing_stops = existing_stops_res.data
 
             delay_info = train_data.get("delay_info")
@@ -569,7 +684,7 @@ def save_data(data_with_delays: list, logger: logging.Logger, update_occupancy:
                     existing_stop_ids = [s['id'] for s in existing_stops]
                     existing_diffs = []
                     if existing_stop_ids:
-                        existing_diffs = supabase.table("run_stop_difficulties").select("stop_id, difficulty_id, location").in_("stop_id", existing_stop_ids).execute().data
+                        existing_diffs = supabase.table("run_stop_difficulties").select("stop_id, difficulty_id, location").in_("stop_id", existing_stop_ids).eq("date", run_date).execute().data
                     
                     db_diffs_by_stop = {}
                     for d in existing_diffs:
@@ -647,14 +762,15 @@ def save_data(data_with_delays: list, logger: logging.Logger, update_occupancy:
                     logger.info(f"Pociąg nr {train_number} z dnia {train_data.get('date')}: Wykryto różnice. Nadpisywanie przystanków...")
                     existing_stop_ids = [s['id'] for s in existing_stops]
                     if existing_stop_ids:
-                        supabase.table("run_stop_difficulties").delete().in_("stop_id", existing_stop_ids).execute()
-                    supabase.table("run_stops").delete().eq("run_id", inserted_run_id).execute()
+                        supabase.table("run_stop_difficulties").delete().in_("stop_id", existing_stop_ids).eq("date", run_date).execute()
+                    supabase.table("run_stops").delete().eq("run_id", inserted_run_id).eq("date", run_date).execute()
 
                     # Aktualizacja właściwości przejazdu
                     supabase.table("train_runs").update({
                         "is_cancelled": train_data.get("is_cancelled", False),
-                        "occupancy_id": occupancy_id
-                    }).eq("id", inserted_run_id).execute()
+                        "occupancy_id": occupancy_id,
+                        "is_final": is_final
+                    }).eq("id", inserted_run_id).eq("date", run_date).execute()
                 else:
                     if update_occupancy:
                         logger.info(f"Pociąg nr {train_number} z dnia {train_data.get('date')} jest nowy lub brakowało przystanków. Wyszukiwanie/tworzenie...")
@@ -677,6 +793,7 @@ def save_data(data_with_delays: list, logger: logging.Logger, update_occupancy:
 
                 stops_to_insert.append({
                     "run_id": inserted_run_id,
+                    "date": run_date,
                     "station_id": station_id,
                     "stop_order": i + 1,
                     "scheduled_arrival": stop_data.get("arrival_time"),
@@ -694,6 +811,10 @@ def save_data(data_with_delays: list, logger: logging.Logger, update_occupancy:
             inserted_stops = stops_response.data
             stops_inserted += len(inserted_stops)
 
+            # Istniejący przejazd bez trasy: upsert z ignore_duplicates go nie zaktualizował
+            if is_final and not response.data:
+                supabase.table("train_runs").update({"is_final": True}).eq("id", inserted_run_id).eq("date", run_date).execute()
+
             difficulties_to_insert = []
             for i, stop_data in enumerate(delay_info):
                 if 'difficulties_info' not in stop_data or not inserted_stops:
@@ -712,6 +833,7 @@ def save_data(data_with_delays: list, logger: logging.Logger, update_occupancy:
                     if difficulty_id:
                         difficulties_to_insert.append({
                             "stop_id": inserted_stops[i]['id'],
+                            "date": run_date,
                             "difficulty_id": difficulty_id,
                             "location": location
                         })
@@ -735,11 +857,299 @@ def save_data(data_with_delays: list, logger: logging.Logger, update_occupancy:
         logger.warning(f"NOWE STACJE ODKRYTE ({len(new_stations)}): {sorted(new_stations)}")
     logger.info("=" * 30)
 
+    if refresh_stats:
+        refresh_delay_stats(supabase, touched_dates, logger)
+
     # Powiadomienie GitHub Issue jeśli odkryto nowe stacje
     if new_stations:
         _append_to_stations_json(sorted(new_stations), logger)
         _create_github_issue(sorted(new_stations), logger)
 
+def _prepare_bulk_run(supabase: Client, train_data: dict, caches: Tuple[Dict, Dict, Dict, Dict, Dict],
+                      logger: logging.Logger, new_stations: Set[str]) -> Dict[str, Any]:
+    """
+    Rozwiązuje wszystkie ID słownikowe dla pojedynczego przejazdu (kategoria, stacje, usługa, utrudnienia)
+    i zwraca wiersze gotowe do zbiorczego zapisu. Zwraca None, jeśli przejazdu nie da się zapisać.
+    """
+    stations_cache, categories_cache, occupancies_cache, difficulties_cache, services_cache = caches
+    train_number = train_data.get("number")
+
+    category_id = _get_or_create_id(supabase, 'train_categories', 'category_code', train_data.get("category"),
+                                    categories_cache, logger, None)
+    start_station_id = _get_or_create_id(supabase, 'stations', 'name', train_data.get("from"), stations_cache,
+                                         logger, new_stations)
+    end_station_id = _get_or_create_id(supabase, 'stations', 'name', train_data.get("to"), stations_cache,
+                                       logger, new_stations)
+    occupancy_id = None
+    if train_data.get("occupancy"):
+        occupancy_id = _get_or_create_id(supabase, 'occupancies', 'status_description', train_data.get("occupancy"),
+                                         occupancies_cache, logger, None)
+
+    if not all([category_id, start_station_id, end_station_id]):
+        logger.error(
+            f"Pociąg nr {train_number}: Nie udało się uzyskać ID dla jednej z kluczowych relacji (kategoria/stacje). Pomijanie.")
+        return None
+
+    service_id = _get_or_create_service_id(supabase, {
+        "number": train_number,
+        "name": _format_train_name(train_data.get("name", "").strip()),
+        "category_id": category_id,
+        "is_domestic": train_data.get("domestic") == "Krajowy",
+        "start_station_id": start_station_id,
+        "end_station_id": end_station_id
+    }, services_cache, logger)
+    if not service_id:
+        logger.error(f"Pociąg nr {train_number}: Nie udało się uzyskać service_id. Pomijanie.")
+        return None
+
+    stops, difficulties = [], []
+    lagged_distance = 0.0
+    for i, stop_data in enumerate(train_data.get("delay_info") or []):
+        station_id = _get_or_create_id(supabase, 'stations', 'name', stop_data.get("station_name"),
+                                       stations_cache, logger, new_stations)
+        if not station_id:
+            logger.warning(
+                f"Pociąg nr {train_number}: Nie można znaleźć/utworzyć stacji '{stop_data.get('station_name')}'. Pomijanie przystanku.")
+            continue
+
+        current_distance = lagged_distance
+        next_segment = stop_data.get("distance_km_from_start_to_next")
+        if isinstance(next_segment, (int, float)):
+            lagged_distance = next_segment
+
+        stops.append({
+            "station_id": station_id,
+            "stop_order": i + 1,
+            "scheduled_arrival": stop_data.get("arrival_time"),
+            "scheduled_departure": stop_data.get("departure_time"),
+            "delay_arrival_min": stop_data.get("delay_minutes_arrival"),
+            "delay_departure_min": stop_data.get("delay_minutes_departure"),
+            "distance_from_start_km": current_distance,
+            "is_cancelled": stop_data.get("is_cancelled", False)
+        })
+
+        description, location = _parse_difficulty(stop_data.get("difficulties_info"))
+        if description:
+            difficulty_id = _get_or_create_id(supabase, 'difficulties', 'description', description,
+                                              difficulties_cache, logger)
+            if difficulty_id:
+                # Indeks przystanku w liście stops — po wstawieniu zamieniany na stop_id
+                difficulties.append({"stop_index": len(stops) - 1, "difficulty_id": difficulty_id, "location": location})
+
+    return {
+        "number": train_number,
+        "run": {
+            "service_id": service_id,
+            "date": train_data.get("date"),
+            "occupancy_id": occupancy_id,
+            "is_cancelled": train_data.get("is_cancelled", False),
+            "is_final": _is_run_final(train_data)
+        },
+        "stops": stops,
+        "difficulties": difficulties,
+    }
+
+
+def _write_bulk_batch(supabase: Client, batch: List[Dict[str, Any]], overwrite: bool) -> Tuple[int, int, int, int]:
+    """
+    Zapisuje paczkę przygotowanych przejazdów stałą liczbą zapytań (niezależną od rozmiaru paczki):
+    przejazdy, przystanki i utrudnienia trafiają do bazy zbiorczymi insertami/upsertami.
+    Zwraca krotkę: (zapisane przejazdy, pominięte przejazdy, wstawione przystanki, wstawione utrudnienia).
+    """
+    service_ids = list({p["run"]["service_id"] for p in batch})
+    dates = list({p["run"]["date"] for p in batch})
+
+    # 1. Istniejące przejazdy — zachowujemy frekwencję, jeśli archiwum jej nie zawiera, i flagę ostateczności
+    existing_runs = supabase.table("train_runs").select("id, service_id, date, occupancy_id, is_final")\
+        .in_("service_id", service_ids).in_("date", dates).execute().data
+    # Filtry in_() dają iloczyn usług i dat — zostają tylko przejazdy z tej paczki, żeby nie ruszać cudzych tras
+    batch_keys = {(p["run"]["service_id"], p["run"]["date"]) for p in batch}
+    existing_by_key = {(r["service_id"], r["date"]): r for r in existing_runs if (r["service_id"], r["date"]) in batch_keys}
+
+    runs_to_upsert = []
+    for p in batch:
+        existing = existing_by_key.get((p["run"]["service_id"], p["run"]["date"]))
+        if existing and p["run"]["occupancy_id"] is None:
+            p["run"]["occupancy_id"] = existing.get("occupancy_id")
+        # Jak w save_data flaga jest tylko podnoszona: starszy lub niepełny zrzut nie otwiera zamkniętego przejazdu.
+        # Upsert paczki wysyła te same kolumny dla każdego wiersza, więc wartość z bazy przepisujemy zamiast ją pomijać
+        if existing and existing.get("is_final"):
+            p["run"]["is_final"] = True
+        runs_to_upsert.append(p["run"])
+
+    upserted = supabase.table("train_runs").upsert(
+        runs_to_upsert,
+        on_conflict="service_id,date",
+        ignore_duplicates=not overwrite
+    ).execute().data
+    run_ids = {key: r["id"] for key, r in existing_by_key.items()}
+    run_ids.update({(r["service_id"], r["date"]): r["id"] for r in upserted if (r["service_id"], r["date"]) in batch_keys})
+
+    # 2. Przejazdy, które mają już przystanki (wystarczy pierwszy przystanek każdego przejazdu)
+    all_run_ids = list(run_ids.values())
+    runs_with_stops = {
+        r["run_id"] for r in
+        supabase.table("run_stops").select("run_id").in_("run_id", all_run_ids).in_("date", dates).eq("stop_order", 1).execute().data
+    } if all_run_ids else set()
+
+    # Nadpisywane są tylko trasy, które zaraz zostaną wstawione od nowa (przejazd z paczki z niepustą trasą)
+    runs_to_replace = [run_ids[(p["run"]["service_id"], p["run"]["date"])] for p in batch
+                       if p["stops"] and run_ids.get((p["run"]["service_id"], p["run"]["date"])) in runs_with_stops]
+    if overwrite and runs_to_replace:
+        old_stop_ids = [s["id"] for s in
+                        supabase.table("run_stops").select("id").in_("run_id", runs_to_replace).in_("date", dates).execute().data]
+        if old_stop_ids:
+            supabase.table("run_stop_difficulties").delete().in_("stop_id", old_stop_ids).in_("date", dates).execute()
+        supabase.table("run_stops").delete().in_("run_id", runs_to_replace).in_("date", dates).execute()
+
+    # 3. Zbiorczy insert przystanków i utrudnień
+    stops_to_insert, stop_owners = [], []
+    runs_written, runs_skipped = 0, 0
+    for p in batch:
+        run_id = run_ids.get((p["run"]["service_id"], p["run"]["date"]))
+        if not run_id or not p["stops"] or (run_id in runs_with_stops and not overwrite):
+            runs_skipped += 1
+            continue
+        runs_written += 1
+        stop_owners.append((p, len(stops_to_insert)))
+        stops_to_insert.extend({**stop, "run_id": run_id, "date": p["run"]["date"]} for stop in p["stops"])
+
+    if not stops_to_insert:
+        return runs_written, runs_skipped, 0, 0
+
+    inserted_stops = supabase.table("run_stops").insert(stops_to_insert).execute().data
+
+    difficulties_to_insert = []
+    for p, offset in stop_owners:
+        for diff in p["difficulties"]:
+            difficulties_to_insert.append({
+                "stop_id": inserted_stops[offset + diff["stop_index"]]["id"],
+                "date": p["run"]["date"],
+                "difficulty_id": diff["difficulty_id"],
+                "location": diff["location"]
+            })
+    if difficulties_to_insert:
+        supabase.table("run_stop_difficulties").insert(difficulties_to_insert).execute()
+
+    return runs_written, runs_skipped, len(inserted_stops), len(difficulties_to_insert)
+
+
+def save_data_bulk(trains: Iterable[dict], logger: logging.Logger, overwrite: bool = False,
+                   batch_size: int = 100, workers: int = 4, total: Optional[int] = None, supabase: Client = None,
+                   date_from: Optional[str] = None, date_to: Optional[str] = None):
+    """
+    Zbiorczy wariant save_data przeznaczony do odtwarzania bazy z archiwum.
+    Słowniki są rozwiązywane sekwencyjnie (współdzielony cache), a zapis przejazdów, przystanków
+    i utrudnień odbywa się paczkami po batch_size przejazdów, równolegle w `workers` wątkach.
+    W przeciwieństwie do save_data nie porównuje danych z bazą — przy overwrite trasa jest zawsze nadpisywana.
+    Partycje są tworzone dla zakresu date_from–date_to; dla listy pociągów zakres jest wyznaczany z ich dat.
+    """
+    if isinstance(trains, list) and not (date_from and date_to):
+        dates = [t["date"] for t in trains if t.get("date")]
+        date_from, date_to = date_from or min(dates, default=None), date_to or max(dates, default=None)
+    logger.info(f"Rozpoczęto zbiorczy zapis danych (batch_size={batch_size}, workers={workers}, overwrite={overwrite}).")
+
+    try:
+        if supabase is None:
+            supabase = _create_client_from_env(logger)
+            if supabase is None:
+                return
+        _ensure_date_partitions(supabase, logger, date_from=date_from, date_to=date_to)
+        caches = _load_dictionary_caches(supabase, logger)
+    except Exception as e:
+        logger.critical(f"Krytyczny błąd podczas inicjalizacji połączenia lub cache'a: {e}")
+        return
+
+    new_stations: Set[str] = set()
+    touched_dates: Set[str] = set()
+    runs_written, runs_skipped, runs_with_errors = 0, 0, 0
+    stops_inserted, difficulties_links_inserted = 0, 0
+    processed = 0
+    started_at = time.monotonic()
+
+    def report_progress():
+        elapsed = time.monotonic() - started_at
+        rate = processed / elapsed if elapsed > 0 else 0.0
+        progress = f"{processed}/{total} ({processed / total:.0%})" if total else f"{processed}"
+        logger.info(f"Postęp: {progress} przejazdów, {rate:.1f} przejazdów/s, wstawione przystanki: {stops_inserted}.")
+
+    def collect(future, batch_len):
+        nonlocal runs_written, runs_skipped, runs_with_errors, stops_inserted, difficulties_links_inserted, processed
+        try:
+            written, skipped, stops, diffs = future.result()
+            runs_written += written
+            runs_skipped += skipped
+            stops_inserted += stops
+            difficulties_links_inserted += diffs
+        except Exception as e:
+            logger.error(f"Krytyczny błąd podczas zapisu paczki {batch_len} przejazdów: {e}", exc_info=True)
+            runs_with_errors += batch_len
+        processed += batch_len
+        report_progress()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = []
+        batch = []
+
+        def submit(batch_to_write):
+            pending.append((executor.submit(_write_bulk_batch, supabase, batch_to_write, overwrite), len(batch_to_write)))
+            # Ograniczamy liczbę paczek w locie, aby nie trzymać w pamięci całego archiwum
+            while len(pending) >= workers * 2:
+                collect(*pending.pop(0))
+
+        for train_data in trains:
+            train_number = train_data.get("number")
+            if train_data.get("name", "").startswith("ZKA"):
+                runs_skipped += 1
+                processed += 1
+                continue
+            if not isinstance(train_data.get("delay_info"), list):
+                logger.warning(
+                    f"Pociąg nr {train_number}: Brak szczegółowych danych o trasie (delay_info = '{train_data.get('delay_info')}'). Pomijanie.")
+                runs_skipped += 1
+                processed += 1
+                continue
+
+            try:
+                prepared = _prepare_bulk_run(supabase, train_data, caches, logger, new_stations)
+            except Exception as e:
+                logger.error(f"Krytyczny błąd podczas przygotowania danych dla pociągu nr {train_number}: {e}", exc_info=True)
+                prepared = None
+            if prepared is None:
+                runs_with_errors += 1
+                processed += 1
+                continue
+
+            batch.append(prepared)
+            touched_dates.add(prepared["run"]["date"])
+            if len(batch) >= batch_size:
+                submit(batch)
+                batch = []
+
+        if batch:
+            submit(batch)
+        for future, batch_len in pending:
+            collect(future, batch_len)
+
+    logger.info("=" * 30)
+    logger.info("PODSUMOWANIE ZBIORCZEGO ZAPISU DO BAZY DANYCH")
+    logger.info(f"Zapisane przejazdy: {runs_written}")
+    logger.info(f"Pominięte przejazdy (istniejące, bez trasy lub ZKA): {runs_skipped}")
+    logger.info(f"Przejazdy z błędami: {runs_with_errors}")
+    logger.info(f"Wstawione przystanki: {stops_inserted}")
+    logger.info(f"Dodane powiązania utrudnień: {difficulties_links_inserted}")
+    logger.info(f"Czas zapisu: {time.monotonic() - started_at:.1f}s")
+    if new_stations:
+        logger.warning(f"NOWE STACJE ODKRYTE ({len(new_stations)}): {sorted(new_stations)}")
+    logger.info("=" * 30)
+
+    refresh_delay_stats(supabase, touched_dates, logger)
+
+    if new_stations:
+        _append_to_stations_json(sorted(new_stations), logger)
+        _create_github_issue(sorted(new_stations), logger)
+
+
 def _append_to_stations_json(new_stations: list, logger: logging.Logger):
     """
     Dopisuje nowo odkryte stacje krajowe na koniec misc/stations.json.
@@ -0,0 +1,115 @@
+import os
+import socket
+import logging
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Optional
+from zoneinfo import ZoneInfo
+
+from supabase import Client
+
+# Kolejka pobierania opóźnień w Postgresie (sql/scrape_queue.sql): get_train_data.py dodaje pociągi dnia,
+# a workery (scripts/scrape_worker.py, dowolnie wiele maszyn) pobierają je paczkami z dzierżawą.
+
+# Wyniki get_delays, po których warto spróbować ponownie (jak w process_single_train);
+# "N/A" (pociągu nie ma w portalu) kończy zadanie
+RETRYABLE_RESULTS = (
+    "page_load_timeout", "parsing_error", "not_found", "scraping_timeout", "unknown_error",
+    "playwright_connection_error",
+)
+LEASE_EXPIRED = "lease_expired"
+# Stany zadań (scrape_queue_status), przy których pociąg dnia nie trafił jeszcze do bazy
+OPEN_STATUSES = ("pending", "scheduled", "leased")
+
+DEFAULT_BATCH_SIZE = int(os.environ.get("SCRAPE_BATCH_SIZE", "10"))
+# Dzierżawa musi wystarczyć na całą paczkę (do 3 prób na pociąg w process_single_train)
+DEFAULT_LEASE_SECONDS = int(os.environ.get("SCRAPE_LEASE_SECONDS", "900"))
+ENQUEUE_CHUNK_SIZE = 500
+
+# Pociąg jest pobierany tyle minut po planowym przyjeździe na stację końcową (zapas na typowe opóźnienie)
+SCRAPE_AFTER_ARRIVAL_MINUTES = int(os.environ.get("SCRAPE_AFTER_ARRIVAL_MINUTES", "30"))
+# Pociągi bez przejazdu z trasą w bazie (nowe połączenia) — pora dotychczasowego wieczornego scrapowania
+DEFAULT_SCRAPE_TIME = time(21, 0)
+WARSAW_TZ = ZoneInfo("Europe/Warsaw")
+
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def plan_scrape_times(supabase: Client, trains: List[dict], target_date: date, logger: logging.Logger) -> Dict[str, datetime]:
+    """
+    Czas pobrania każdego pociągu dnia: planowy przyjazd na stację końcową (z ostatniego przejazdu w bazie,
+    funkcja scheduled_final_arrivals) plus SCRAPE_AFTER_ARRIVAL_MINUTES. Pociąg dojeżdżający po północy
+    jest pobierany następnego dnia. Pociągi bez historii dostają DEFAULT_SCRAPE_TIME.
+    """
+    numbers = sorted({t["number"] for t in trains if t.get("number")})
+    response = supabase.rpc("scheduled_final_arrivals", {
+        "p_date": target_date.isoformat(),
+        "p_numbers": numbers,
+    }).execute()
+
+    after_arrival = timedelta(minutes=SCRAPE_AFTER_ARRIVAL_MINUTES)
+    planned = {}
+    for row in response.data or []:
+        arrival = time.fromisoformat(row["scheduled_arrival"])
+        departure = time.fromisoformat(row["scheduled_departure"]) if row.get("scheduled_departure") else None
+        arrival_day = target_date + timedelta(days=1) if departure and arrival < departure else target_date
+        planned[row["number"]] = datetime.combine(arrival_day, arrival, tzinfo=WARSAW_TZ) + after_arrival
+
+    default_time = datetime.combine(target_date, DEFAULT_SCRAPE_TIME, tzinfo=WARSAW_TZ)
+    missing = [n for n in numbers if n not in planned]
+    if missing:
+        logger.info(f"Brak planowego przyjazdu w bazie dla {len(missing)} pociągów — pobranie o {DEFAULT_SCRAPE_TIME:%H:%M}: "
+                    f"{', '.join(missing[:20])}{' ...' if len(missing) > 20 else ''}")
+    if planned:
+        logger.info(f"Pobieranie {len(planned)} pociągów po przyjeździe, od {min(planned.values()):%d.%m %H:%M} "
+                    f"do {max(planned.values()):%d.%m %H:%M}.")
+    return {n: planned.get(n, default_time) for n in numbers}
+
+
+def enqueue_trains(supabase: Client, trains: List[dict], logger: logging.Logger,
+                   not_before: Optional[Dict[str, datetime]] = None) -> int:
+    """
+    Dodaje pociągi do kolejki (paczkami po ENQUEUE_CHUNK_SIZE); `not_before` (numer -> czas, zob. plan_scrape_times)
+    odkłada pobranie pociągu, bez niego zadania są do wzięcia od razu. Zwraca liczbę dodanych lub odświeżonych zadań.
+    """
+    not_before = not_before or {}
+    tasks = [{"train": t, "not_before": not_before[t["number"]].isoformat() if t.get("number") in not_before else None}
+             for t in trains]
+    enqueued = 0
+    for start in range(0, len(tasks), ENQUEUE_CHUNK_SIZE):
+        chunk = tasks[start:start + ENQUEUE_CHUNK_SIZE]
+        enqueued += supabase.rpc("enqueue_scrape_tasks", {"p_tasks": chunk}).execute().data or 0
+    logger.info(f"Dodano do kolejki {enqueued} z {len(trains)} pociągów.")
+    return enqueued
+
+
+def claim_tasks(supabase: Client, worker: str, batch_size: int = DEFAULT_BATCH_SIZE,
+                lease_seconds: int = DEFAULT_LEASE_SECONDS) -> List[dict]:
+    """Dzierżawi do `batch_size` zadań (oczekujących lub z wygasłą dzierżawą)."""
+    response = supabase.rpc("claim_scrape_tasks", {
+        "p_worker": worker,
+        "p_limit": batch_size,
+        "p_lease_seconds": lease_seconds,
+    }).execute()
+    return response.data or []
+
+
+def complete_task(supabase: Client, task_id: int, worker: str) -> bool:
+    """Oznacza zadanie jako wykonane; False, jeśli dzierżawa wygasła i przejął ją inny worker."""
+    return bool(supabase.rpc("complete_scrape_task", {"p_id": task_id, "p_worker": worker}).execute().data)
+
+
+def fail_task(supabase: Client, task_id: int, worker: str, error: str) -> Optional[str]:
+    """Zwraca zadanie do puli ("pending") albo, po wyczerpaniu prób, kończy je ("failed"); None przy utracie dzierżawy."""
+    return supabase.rpc("fail_scrape_task", {"p_id": task_id, "p_worker": worker, "p_error": error}).execute().data
+
+
+def queue_status(supabase: Client, date_str: Optional[str] = None) -> Dict[str, int]:
+    """
+    Liczba zadań dnia w każdym stanie; bez daty — otwarte zadania ze wszystkich dni.
+    Oczekujące na swój czas (not_before w przyszłości) są liczone jako "scheduled".
+    """
+    response = supabase.rpc("scrape_queue_status", {"p_date": date_str}).execute()
+    return {row["status"]: row["tasks"] for row in response.data or []}
+
@@ -0,0 +1,425 @@
+import os
+import re
+import sys
+import json
+import math
+import time
+import random
+import signal
+import asyncio
+import argparse
+import logging
+import subprocess
+from collections import Counter, defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote, unquote, urlencode
+
+import httpx
+from dotenv import load_dotenv
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+
+from scripts.warm_api_cache import FRONTEND_TRAIN_FIELDS
+from static_snapshots import STATION_SCHEDULES_SNAPSHOT, TRAIN_RUNS_SNAPSHOT, snapshot_path
+
+# Test obciążeniowy API na lokalnej bazie z danymi z sql/seed_benchmark.sql.
+# Dla każdej konfiguracji workerów (gunicorn + UvicornWorker, jak na produkcji) mierzymy przepustowość
+# i percentyle czasu odpowiedzi czterech głównych endpointów w dwóch trybach:
+#   uncached — nagłówek Cache-Control: no-store omija cache fastapi-cache, każde żądanie trafia do bazy,
+#   cached   — mały zbiór "gorących" adresów, rozgrzany przed pomiarem.
+# Wyniki trafiają do benchmarks/api/<czas>_<wersja>.json; --compare porównuje je z poprzednim pomiarem.
+
+ENDPOINTS = ("/stations", "/train-runs", "/stations/{name}/schedule", "/train-runs/{train_id}")
+MODES = ("uncached", "cached")
+# Udział endpointów w ruchu, gdy nie podano logu dostępowego API (--access-log)
+DEFAULT_MIX = {
+    "/stations": 0.05,
+    "/train-runs": 0.45,
+    "/stations/{name}/schedule": 0.30,
+    "/train-runs/{train_id}": 0.20,
+}
+DEFAULT_RESULTS_DIR = os.path.join(ROOT_DIR, "benchmarks", "api")
+# Wartości domyślne jak w sql/seed_benchmark.sql
+DEFAULT_DATE_FROM = "2025-10-01"
+DEFAULT_DAYS = 30
+
+# Linie middleware log_requests w api/main.py: "[REQ#12] GET /train-runs | uptime=..." oraz
+# "[REQ#1] FIRST request after startup! Uptime: 0.3s | GET /stations"; ścieżka jest zdekodowana (nazwy stacji ze spacjami)
+_ACCESS_LOG_RE = re.compile(r"\[REQ#\d+\].*?\bGET (/[^|]*?)\s*(?:\||$)")
+_TRAIN_DETAIL_RE = re.compile(r"^/train-runs/[^/]+$")
+_SCHEDULE_RE = re.compile(r"^/stations/([^/]+)/schedule$")
+
+
+def endpoint_of(path: str) -> Optional[str]:
+    """Szablon endpointu dla ścieżki żądania albo None dla pozostałych endpointów."""
+    if path in ("/stations", "/train-runs"):
+        return path
+    if _SCHEDULE_RE.match(path):
+        return "/stations/{name}/schedule"
+    if _TRAIN_DETAIL_RE.match(path):
+        return "/train-runs/{train_id}"
+    return None
+
+
+def mix_from_access_logs(paths: List[str], logger: logging.Logger) -> Tuple[Dict[str, float], Counter]:
+    """
+    Udział endpointów i popularność stacji (tablice) na podstawie logów API (linie [REQ#n] z log_requests).
+    Nazwy stacji z logu służą tylko do ważenia — stacje spoza danych testowych są pomijane przy losowaniu.
+    """
+    counts: Counter = Counter()
+    stations: Counter = Counter()
+    for path in paths:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            for line in f:
+                match = _ACCESS_LOG_RE.search(line)
+                if not match:
+                    continue
+                endpoint = endpoint_of(match.group(1))
+                if endpoint is None:
+                    continue
+                counts[endpoint] += 1
+                schedule = _SCHEDULE_RE.match(match.group(1))
+                if schedule:
+                    stations[unquote(schedule.group(1)).lower()] += 1
+    total = sum(counts.values())
+    if not total:
+        raise ValueError(f"Brak żądań GET do mierzonych endpointów w logach: {', '.join(paths)}.")
+    logger.info(f"Udział endpointów z {total} żądań w logach: "
+                + ", ".join(f"{e} {counts[e] / total:.0%}" for e in ENDPOINTS))
+    return {e: counts[e] / total for e in ENDPOINTS if counts[e]}, stations
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Percentyl metodą najbliższej rangi (q w zakresie 0-100)."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarise(latencies: List[float], errors: int, elapsed: float) -> dict:
+    values = sorted(latencies)
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "rps": round(len(values) / elapsed, 1) if elapsed else 0.0,
+        "mean_ms": round(sum(values) / len(values) * 1000, 2) if values else 0.0,
+        "p50_ms": round(percentile(values, 50) * 1000, 2),
+        "p90_ms": round(percentile(values, 90) * 1000, 2),
+        "p99_ms": round(percentile(values, 99) * 1000, 2),
+        "max_ms": round(values[-1] * 1000, 2) if values else 0.0,
+    }
+
+
+def seeded_dates(date_from: str, days: int) -> List[str]:
+    start = date.fromisoformat(date_from)
+    return [(start + timedelta(days=i)).isoformat() for i in range(days)]
+
+
+def warn_about_snapshots(dates: List[str], logger: logging.Logger):
+    # Dla dni ze statycznym snapshotem API nie pyta bazy, więc pomiar "uncached" byłby zaniżony
+    exported = [d for d in dates if os.path.exists(snapshot_path(d, TRAIN_RUNS_SNAPSHOT))
+                or os.path.exists(snapshot_path(d, STATION_SCHEDULES_SNAPSHOT))]
+    if exported:
+        logger.warning(f"Dni ze snapshotem w docs/snapshots ({', '.join(exported)}) są obsługiwane bez bazy — "
+                       f"wybierz inne daty seeda albo usuń snapshoty.")
+
+
+class RequestPicker:
+    """Losuje kolejne żądania wg udziału endpointów; stacje ważone popularnością, jak ruch z frontendu."""
+
+    def __init__(self, targets: dict, mix: Dict[str, float], mode: str, hot_size: int,
+                 station_counts: Optional[Counter] = None):
+        self.endpoints = list(mix)
+        self.weights = [mix[e] for e in self.endpoints]
+        if mode == "cached":
+            # Gorący zbiór: ostatni dzień, najpopularniejsze stacje i pierwsze pociągi tego dnia
+            self.dates = targets["dates"][-1:]
+            self.stations = targets["stations"][:hot_size]
+            self.train_ids = [i for i in targets["train_ids"] if i.startswith(self.dates[0].replace("-", ""))][:hot_size]
+        else:
+            self.dates = targets["dates"]
+            self.stations = targets["stations"]
+            self.train_ids = targets["train_ids"]
+        # /stations zwraca stacje od największej liczby pasażerów; bez logu ważymy rozkładem Zipfa
+        if station_counts:
+            self.station_weights = [station_counts.get(s.lower(), 0) + 1 for s in self.stations]
+        else:
+            self.station_weights = [1 / rank for rank in range(1, len(self.stations) + 1)]
+
+    def urls(self) -> List[Tuple[str, str]]:
+        """Wszystkie adresy zbioru (do rozgrzania cache przed pomiarem trybu cached)."""
+        urls = [("/stations", "/stations")]
+        for d in self.dates:
+            urls.append(("/train-runs", f"/train-runs?{urlencode({'date': d})}"))
+            urls.append(("/train-runs", f"/train-runs?{urlencode({'date': d, 'fields': FRONTEND_TRAIN_FIELDS})}"))
+            urls.extend(("/stations/{name}/schedule", f"/stations/{quote(s)}/schedule?{urlencode({'date': d})}")
+                        for s in self.stations)
+        urls.extend(("/train-runs/{train_id}", f"/train-runs/{i}") for i in self.train_ids)
+        return urls
+
+    def pick(self, rng: random.Random) -> Tuple[str, str]:
+        endpoint = rng.choices(self.endpoints, self.weights)[0]
+        if endpoint == "/stations":
+            return endpoint, "/stations"
+        if endpoint == "/train-runs":
+            params = {"date": rng.choice(self.dates)}
+            # Frontend pyta z projekcją pól, skrypty i integracje zwykle bez niej
+            if rng.random() < 0.5:
+                params["fields"] = FRONTEND_TRAIN_FIELDS
+            return endpoint, f"/train-runs?{urlencode(params)}"
+        if endpoint == "/stations/{name}/schedule":
+            station = rng.choices(self.stations, self.station_weights)[0]
+            return endpoint, f"/stations/{quote(station)}/schedule?{urlencode({'date': rng.choice(self.dates)})}"
+        return endpoint, f"/train-runs/{rng.choice(self.train_ids)}"
+
+
+async def discover_targets(base_url: str, dates: List[str], logger: logging.Logger) -> dict:
+    """Stacje i identyfikatory przejazdów z danych testowych, pobrane przez samo API."""
+    headers = {"Cache-Control": "no-store"}
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        stations = (await client.get("/stations", headers=headers)).raise_for_status().json()
+        train_ids = []
+        for d in dates:
+            response = await client.get("/train-runs", params={"date": d, "fields": "id"}, headers=headers)
+            train_ids.extend(row["id"] for row in response.raise_for_status().json())
+    if not stations or not train_ids:
+        raise RuntimeError(f"Brak danych testowych w API dla dni {dates[0]}..{dates[-1]} — uruchom sql/seed_benchmark.sql.")
+    logger.info(f"Dane testowe: {len(stations)} stacji, {len(train_ids)} przejazdów w {len(dates)} dniach.")
+    return {"stations": stations, "train_ids": train_ids, "dates": dates}
+
+
+async def run_load(base_url: str, picker: RequestPicker, mode: str, concurrency: int, duration_s: float,
+                   seed: int, logger: logging.Logger) -> dict:
+    """Zamknięta pętla: `concurrency` klientów wysyła kolejne żądanie zaraz po odpowiedzi, przez `duration_s` sekund."""
+    headers = {"x-custom-client": "spoznienia-benchmark"}
+    if mode == "uncached":
+        headers["Cache-Control"] = "no-store"
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    errors: Counter = Counter()
+    statuses: Counter = Counter()
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, headers=headers, timeout=60, limits=limits) as client:
+        if mode == "cached":
+            warm_urls = picker.urls()
+            for _, url in warm_urls:
+                await client.get(url)
+            logger.info(f"Rozgrzano {len(warm_urls)} adresów.")
+
+        deadline = time.perf_counter() + duration_s
+
+        async def user(user_no: int):
+            rng = random.Random(seed * 1000 + user_no)
+            while time.perf_counter() < deadline:
+                endpoint, url = picker.pick(rng)
+                started_at = time.perf_counter()
+                try:
+                    response = await client.get(url)
+                    status = response.status_code
+                except httpx.HTTPError as e:
+                    status = type(e).__name__
+                latencies[endpoint].append(time.perf_counter() - started_at)
+                statuses[status] += 1
+                if status != 200:
+                    errors[endpoint] += 1
+
+        started_at = time.perf_counter()
+        await asyncio.gather(*(user(i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - started_at
+
+    if statuses.get(429):
+        logger.warning(f"{statuses[429]} odpowiedzi 429 — uruchom API z RATELIMIT_ENABLED=false.")
+    all_latencies = [v for values in latencies.values() for v in values]
+    result = {
+        "seconds": round(elapsed, 1),
+        "statuses": {str(k): v for k, v in statuses.items()},
+        "total": summarise(all_latencies, sum(errors.values()), elapsed),
+        "endpoints": {e: summarise(latencies[e], errors[e], elapsed) for e in ENDPOINTS if e in latencies},
+    }
+    return result
+
+
+def start_server(workers: int, port: int, logger: logging.Logger, timeout_s: float = 60) -> subprocess.Popen:
+    """Uruchamia API przez gunicorn z UvicornWorker i czeka, aż odpowie. Limit żądań (slowapi) jest wyłączony."""
+    command = [sys.executable, "-m", "gunicorn", "api.main:app", "-k", "uvicorn.workers.UvicornWorker",
+               "-w", str(workers), "-b", f"127.0.0.1:{port}", "--log-level", "warning"]
+    env = dict(os.environ, RATELIMIT_ENABLED="false")
+    process = subprocess.Popen(command, cwd=ROOT_DIR, env=env, stdout=subprocess.DEVNULL)
+    deadline = time.time() + timeout_s
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicorn zakończył się z kodem {process.returncode}.")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/openapi.json", timeout=2).status_code == 200:
+                logger.info(f"API uruchomione: {workers} worker(y) na porcie {port}.")
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    stop_server(process)
+    raise RuntimeError(f"API nie odpowiedziało w ciągu {timeout_s:.0f}s.")
+
+
+def stop_server(process: subprocess.Popen):
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def git_version() -> str:
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], cwd=ROOT_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def save_results(results: dict, results_dir: str) -> str:
+    os.makedirs(results_dir, exist_ok=True)
+    created_at = datetime.fromisoformat(results["created_at"])
+    path = os.path.join(results_dir, f"{created_at:%Y%m%d-%H%M%S}_{results['version']}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    return path
+
+
+def latest_results(results_dir: str) -> Optional[str]:
+    if not os.path.isdir(results_dir):
+        return None
+    paths = sorted(n for n in os.listdir(results_dir) if n.endswith(".json"))
+    return os.path.join(results_dir, paths[-1]) if paths else None
+
+
+def compare_results(previous: dict, current: dict, threshold: float, logger: logging.Logger) -> int:
+    """
+    Porównuje pomiary dla tych samych (workery, tryb, endpoint). Regresja: p50 lub p99 wyższe albo
+    przepustowość niższa o więcej niż `threshold` (ułamek). Zwraca liczbę regresji.
+    """
+    previous_runs = {(r["workers"], r["mode"]): r for r in previous["runs"]}
+    regressions = 0
+    for run in current["runs"]:
+        before = previous_runs.get((run["workers"], run["mode"]))
+        if before is None:
+            continue
+        for endpoint, now in run["endpoints"].items():
+            then = before["endpoints"].get(endpoint)
+            if not then or not then["requests"]:
+                continue
+            changes = {
+                "p50": now["p50_ms"] / then["p50_ms"] - 1 if then["p50_ms"] else 0.0,
+                "p99": now["p99_ms"] / then["p99_ms"] - 1 if then["p99_ms"] else 0.0,
+                "rps": now["rps"] / then["rps"] - 1 if then["rps"] else 0.0,
+            }
+            worse = changes["p50"] > threshold or changes["p99"] > threshold or changes["rps"] < -threshold
+            message = (f"workers={run['workers']} {run['mode']} {endpoint}: "
+                       f"p50 {then['p50_ms']} -> {now['p50_ms']} ms ({changes['p50']:+.0%}), "
+                       f"p99 {then['p99_ms']} -> {now['p99_ms']} ms ({changes['p99']:+.0%}), "
+                       f"{then['rps']} -> {now['rps']} req/s ({changes['rps']:+.0%})")
+            if worse:
+                regressions += 1
+                logger.error(f"Regresja: {message}")
+            else:
+                logger.info(message)
+    return regressions
+
+
+def log_run(run: dict, logger: logging.Logger):
+    total = run["total"]
+    logger.info(f"workers={run['workers']} {run['mode']}: {total['rps']} req/s, p50 {total['p50_ms']} ms, "
+                f"p90 {total['p90_ms']} ms, p99 {total['p99_ms']} ms, błędy {total['errors']}.")
+    for endpoint, stats in run["endpoints"].items():
+        logger.info(f"  {endpoint}: {stats['requests']} żądań, {stats['rps']} req/s, p50 {stats['p50_ms']} ms, "
+                    f"p90 {stats['p90_ms']} ms, p99 {stats['p99_ms']} ms, błędy {stats['errors']}")
+
+
+def run_benchmark(args, logger: logging.Logger) -> dict:
+    dates = seeded_dates(args.date_from, args.days)
+    warn_about_snapshots(dates, logger)
+    mix, station_counts = (mix_from_access_logs(args.access_log, logger) if args.access_log
+                           else (DEFAULT_MIX, None))
+    modes = [m.strip() for m in args.modes.split(",")]
+    worker_counts = [None] if args.url else [int(w) for w in args.workers.split(",")]
+
+    runs = []
+    for workers in worker_counts:
+        process = None if args.url else start_server(workers, args.port, logger)
+        base_url = args.url.rstrip("/") if args.url else f"http://127.0.0.1:{args.port}"
+        try:
+            targets = asyncio.run(discover_targets(base_url, dates, logger))
+            for mode in modes:
+                picker = RequestPicker(targets, mix, mode, args.hot_size, station_counts)
+                result = asyncio.run(run_load(base_url, picker, mode, args.concurrency, args.duration, args.seed, logger))
+                run = {"workers": workers, "mode": mode, **result}
+                log_run(run, logger)
+                runs.append(run)
+        finally:
+            if process is not None:
+                stop_server(process)
+
+    return {
+        "version": git_version(),
+        "created_at": datetime.now(timezone.utc).replace(microsecond=0).isoformat(),
+        "settings": {
+            "url": args.url,
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "date_from": args.date_from,
+            "days": args.days,
+            "hot_size": args.hot_size,
+            "seed": args.seed,
+            "mix": {e: round(w, 4) for e, w in mix.items()},
+            "mix_source": "access_log" if args.access_log else "default",
+            "redis": bool(os.environ.get("REDIS_URL")),
+        },
+        "runs": runs,
+    }
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Test obciążeniowy API na lokalnej bazie z danymi z sql/seed_benchmark.sql.")
+    parser.add_argument("--url", help="Adres działającego API (z RATELIMIT_ENABLED=false); domyślnie API jest "
+                                      "uruchamiane przez gunicorn dla każdej wartości --workers")
+    parser.add_argument("--workers", default="1,2,4", help="Liczby workerów gunicorna, po przecinku (domyślnie: 1,2,4)")
+    parser.add_argument("--port", type=int, default=8765, help="Port uruchamianego API")
+    parser.add_argument("--modes", default=",".join(MODES), help="Tryby pomiaru: uncached, cached")
+    parser.add_argument("--concurrency", type=int, default=32, help="Liczba równoczesnych klientów")
+    parser.add_argument("--duration", type=float, default=20, help="Czas pomiaru każdego trybu w sekundach")
+    parser.add_argument("--date-from", default=DEFAULT_DATE_FROM, help="Pierwszy dzień danych testowych")
+    parser.add_argument("--days", type=int, default=DEFAULT_DAYS, help="Liczba dni danych testowych")
+    parser.add_argument("--hot-size", type=int, default=20, help="Liczba stacji i pociągów w gorącym zbiorze trybu cached")
+    parser.add_argument("--access-log", nargs="+", help="Logi API (linie [REQ#n]), z których liczony jest udział endpointów")
+    parser.add_argument("--seed", type=int, default=0, help="Ziarno losowania żądań")
+    parser.add_argument("--results-dir", default=DEFAULT_RESULTS_DIR, help="Katalog zapisanych wyników")
+    parser.add_argument("--compare", nargs="?", const="latest",
+                        help="Porównaj z plikiem wyników (bez argumentu: z ostatnim zapisanym)")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="Dopuszczalne pogorszenie p50/p99/przepustowości przy --compare (ułamek)")
+    parser.add_argument("--no-save", action="store_true", help="Nie zapisuj wyników")
+    args = parser.parse_args()
+
+    logger = logging.getLogger("benchmark_api")
+    logger.setLevel(logging.INFO)
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    logger.addHandler(stream_handler)
+
+    baseline_path = latest_results(args.results_dir) if args.compare == "latest" else args.compare
+    results = run_benchmark(args, logger)
+    if not args.no_save:
+        logger.info(f"Wyniki zapisane w {save_results(results, args.results_dir)}.")
+
+    if args.compare:
+        if not baseline_path:
+            logger.warning(f"Brak wcześniejszych wyników w {args.results_dir} do porównania.")
+        else:
+            with open(baseline_path, encoding="utf-8") as f:
+                baseline = json.load(f)
+            logger.info(f"Porównanie z {baseline_path} (wersja {baseline['version']}).")
+            if compare_results(baseline, results, args.max_regression, logger):
+                sys.exit(1)
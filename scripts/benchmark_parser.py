@@ -0,0 +1,108 @@
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+from typing import List
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from portal_html import parse_train_pages
+
+DEFAULT_CORPUS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fixtures", "portal")
+
+
+def load_corpus(corpus_dir: str, logger: logging.Logger) -> List[dict]:
+    """
+    Przypadki korpusu: <nazwa>.expected.json z wynikiem get_train_details oraz strony <nazwa>.search.html
+    i (opcjonalnie) <nazwa>.timeline.html. Przypadki bez strony wyników (np. przekroczenie czasu na żywo) pomijamy.
+    """
+    cases = []
+    for name in sorted(os.listdir(corpus_dir)):
+        if not name.endswith(".expected.json"):
+            continue
+        base = os.path.join(corpus_dir, name[:-len(".expected.json")])
+        if not os.path.exists(base + ".search.html"):
+            logger.info(f"Pominięto {name}: brak strony wyników wyszukiwania.")
+            continue
+        with open(base + ".expected.json", encoding="utf-8") as f:
+            case = json.load(f)
+        with open(base + ".search.html", encoding="utf-8") as f:
+            case["search_html"] = f.read()
+        case["timeline_html"] = None
+        if os.path.exists(base + ".timeline.html"):
+            with open(base + ".timeline.html", encoding="utf-8") as f:
+                case["timeline_html"] = f.read()
+        case["name"] = os.path.basename(base)
+        cases.append(case)
+    return cases
+
+
+def check_corpus(cases: List[dict], logger: logging.Logger) -> int:
+    """Porównuje wynik parsera statycznego HTML z wynikiem ścieżki na żywo; zwraca liczbę rozbieżności."""
+    mismatches = 0
+    for case in cases:
+        result = parse_train_pages(case["search_html"], case["timeline_html"], case["train_number"], logger)
+        if result != case["expected"]:
+            mismatches += 1
+            logger.error(f"Rozbieżność dla {case['name']}:\n"
+                         f"  oczekiwano: {json.dumps(case['expected'], ensure_ascii=False)}\n"
+                         f"  otrzymano:  {json.dumps(result, ensure_ascii=False)}")
+    return mismatches
+
+
+def benchmark(cases: List[dict], repeat: int, logger: logging.Logger) -> dict:
+    """Parsuje cały korpus `repeat` razy i zwraca przepustowość w pociągach i przystankach na sekundę."""
+    trains, stops = 0, 0
+    started_at = time.perf_counter()
+    for _ in range(repeat):
+        for case in cases:
+            result = parse_train_pages(case["search_html"], case["timeline_html"], case["train_number"], logger)
+            trains += 1
+            if isinstance(result, list):
+                stops += len(result)
+    elapsed = time.perf_counter() - started_at
+    return {
+        "trains": trains,
+        "stops": stops,
+        "seconds": round(elapsed, 3),
+        "trains_per_second": round(trains / elapsed, 1),
+        "stops_per_second": round(stops / elapsed, 1),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sprawdzenie i pomiar wydajności parsera zapisanych stron portalpasazera.pl.")
+    parser.add_argument("corpus", nargs="?", default=DEFAULT_CORPUS_DIR,
+                        help="Katalog korpusu (domyślnie: fixtures/portal; nowe przypadki zapisuje scraper z HTML_CAPTURE_DIR)")
+    parser.add_argument("--repeat", type=int, default=200, help="Liczba przebiegów przez korpus w pomiarze")
+    parser.add_argument("--json", action="store_true", help="Wypisz wynik pomiaru jako JSON")
+    args = parser.parse_args()
+
+    logger = logging.getLogger("benchmark_parser")
+    logger.setLevel(logging.INFO)
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    logger.addHandler(stream_handler)
+
+    cases = load_corpus(args.corpus, logger)
+    if not cases:
+        logger.error(f"Brak przypadków w katalogu {args.corpus}.")
+        sys.exit(1)
+
+    mismatches = check_corpus(cases, logger)
+    if mismatches:
+        logger.error(f"Parser statycznego HTML różni się od ścieżki na żywo w {mismatches} z {len(cases)} przypadków.")
+        sys.exit(1)
+    logger.info(f"Wynik parsera zgodny z zapisanym wynikiem ścieżki na żywo dla {len(cases)} przypadków.")
+
+    # Komunikaty parsera (np. "brak kursujących pociągów") nie są potrzebne w pomiarze
+    logger.setLevel(logging.ERROR)
+    result = benchmark(cases, args.repeat, logger)
+    logger.setLevel(logging.INFO)
+    if args.json:
+        print(json.dumps(result))
+    else:
+        logger.info(f"{result['trains']} pociągów, {result['stops']} przystanków w {result['seconds']}s: "
+                    f"{result['trains_per_second']} pociągów/s, {result['stops_per_second']} przystanków/s.")
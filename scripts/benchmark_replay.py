@@ -0,0 +1,66 @@
+import os
+import sys
+import copy
+import json
+import time
+import argparse
+import logging
+from collections import Counter
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from get_delays import get_delays
+from har_replay import read_manifest
+
+
+def run_replay(har_dir: str, latency_ms: int, failure_rate: float, seed: int, logger: logging.Logger,
+               limit: int = None) -> dict:
+    """
+    Odtwarza pobieranie opóźnień dla pociągów nagranego przebiegu (HAR_MODE=record) bez sieci
+    i zwraca czas, przepustowość oraz liczbę wyników każdego rodzaju (trasa albo status błędu).
+    """
+    trains = copy.deepcopy(read_manifest(har_dir)["trains"])
+    if limit:
+        trains = trains[:limit]
+    settings = {"mode": "replay", "dir": har_dir, "latency_ms": latency_ms, "failure_rate": failure_rate, "seed": seed}
+
+    started_at = time.perf_counter()
+    results = get_delays(trains, logger, settings)
+    elapsed = time.perf_counter() - started_at
+
+    statuses = Counter("route" if isinstance(t.get("delay_info"), list) else str(t.get("delay_info")) for t in results)
+    stops = sum(len(t["delay_info"]) for t in results if isinstance(t.get("delay_info"), list))
+    return {
+        "trains": len(results),
+        "stops": stops,
+        "seconds": round(elapsed, 1),
+        "trains_per_second": round(len(results) / elapsed, 3),
+        "latency_ms": latency_ms,
+        "failure_rate": failure_rate,
+        "seed": seed,
+        "statuses": dict(statuses),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Powtarzalny pomiar pobierania opóźnień na nagranym ruchu (HAR), bez sieci.")
+    parser.add_argument("har_dir", help="Katalog nagrania (HAR_DIR przebiegu z HAR_MODE=record)")
+    parser.add_argument("--latency-ms", type=int, default=0, help="Wstrzyknięte opóźnienie każdej odpowiedzi w ms")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Odsetek przerywanych żądań (0-1)")
+    parser.add_argument("--seed", type=int, default=0, help="Ziarno losowania przerywanych żądań")
+    parser.add_argument("--limit", type=int, help="Liczba pierwszych pociągów z nagrania")
+    parser.add_argument("--json", action="store_true", help="Wypisz wynik pomiaru jako JSON")
+    args = parser.parse_args()
+
+    logger = logging.getLogger("benchmark_replay")
+    logger.setLevel(logging.INFO)
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    logger.addHandler(stream_handler)
+
+    result = run_replay(args.har_dir, args.latency_ms, args.failure_rate, args.seed, logger, args.limit)
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False))
+    else:
+        logger.info(f"{result['trains']} pociągów, {result['stops']} przystanków w {result['seconds']}s "
+                    f"({result['trains_per_second']} pociągów/s); wyniki: {result['statuses']}.")
@@ -0,0 +1,81 @@
+import os
+import sys
+import argparse
+import logging
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+from dotenv import load_dotenv
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from save_to_postgres import _create_client_from_env
+from scrape_queue import OPEN_STATUSES, queue_status
+from static_snapshots import SNAPSHOT_DIR, TRAIN_RUNS_SNAPSHOT, snapshot_path
+
+# Ostatnia godzina (UTC) następnego dnia, do której czekamy na opróżnienie kolejki dnia; potem zamykamy go mimo to
+DEFAULT_DEADLINE_UTC_HOUR = 14
+
+
+def day_ready(supabase, date_str: str, logger: logging.Logger, deadline_utc_hour: int = DEFAULT_DEADLINE_UTC_HOUR,
+              base_dir: str = SNAPSHOT_DIR) -> bool:
+    """
+    Czy dzień można zamknąć (nocne łatanie, snapshot, rozgrzanie cache): nie ma jeszcze snapshotu, a kolejka dnia
+    jest pusta — pociągi dojeżdżające po północy są pobierane dopiero po przyjeździe (scrape_queue.plan_scrape_times).
+    """
+    if os.path.exists(snapshot_path(date_str, TRAIN_RUNS_SNAPSHOT, base_dir)):
+        logger.info(f"Dzień {date_str} jest już zamknięty (snapshot istnieje).")
+        return False
+
+    open_tasks = {status: tasks for status, tasks in queue_status(supabase, date_str).items() if status in OPEN_STATUSES}
+    if not open_tasks:
+        logger.info(f"Kolejka dnia {date_str} jest pusta — dzień można zamknąć.")
+        return True
+
+    next_day = datetime.strptime(date_str, "%Y-%m-%d") + timedelta(days=1)
+    deadline = next_day.replace(hour=deadline_utc_hour, tzinfo=timezone.utc)
+    if datetime.now(timezone.utc) >= deadline:
+        logger.warning(f"Kolejka dnia {date_str} nadal ma otwarte zadania ({open_tasks}), "
+                       f"ale minął termin {deadline:%d.%m %H:%M} UTC — zamykanie dnia mimo to.")
+        return True
+
+    logger.info(f"Kolejka dnia {date_str} ma otwarte zadania ({open_tasks}). Zamknięcie dnia przy kolejnym uruchomieniu.")
+    return False
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Sprawdza, czy dzień można zamknąć: kolejka pobierania dnia jest pusta.")
+    parser.add_argument("--date", help="Data w formacie YYYY-MM-DD")
+    parser.add_argument("--yesterday", action="store_true", help="Sprawdź wczorajszą datę")
+    parser.add_argument("--force", action="store_true", help="Zamknij dzień bez sprawdzania (uruchomienie ręczne)")
+    parser.add_argument("--deadline-utc-hour", type=int, default=DEFAULT_DEADLINE_UTC_HOUR,
+                        help="Godzina UTC następnego dnia, po której dzień jest zamykany mimo otwartych zadań")
+    args = parser.parse_args()
+
+    if args.yesterday:
+        date_str = (datetime.now(ZoneInfo("Europe/Warsaw")) - timedelta(days=1)).strftime("%Y-%m-%d")
+    elif args.date:
+        date_str = args.date
+    else:
+        parser.error("Należy podać parametr --date lub --yesterday.")
+
+    logger = logging.getLogger("check_day_ready")
+    logger.setLevel(logging.INFO)
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    logger.addHandler(stream_handler)
+
+    if args.force:
+        ready = True
+    else:
+        supabase = _create_client_from_env(logger)
+        if supabase is None:
+            sys.exit(1)
+        ready = day_ready(supabase, date_str, logger, args.deadline_utc_hour)
+
+    # Wynik dla kolejnych kroków workflow (steps.<id>.outputs.ready)
+    github_output = os.environ.get("GITHUB_OUTPUT")
+    if github_output:
+        with open(github_output, "a", encoding="utf-8") as f:
+            f.write(f"ready={'true' if ready else 'false'}\n")
+    print(f"ready={'true' if ready else 'false'}")
@@ -0,0 +1,285 @@
+import os
+import sys
+import json
+import argparse
+import logging
+from datetime import date, timedelta
+from itertools import islice
+from typing import Any, Dict, List, Tuple
+
+from dotenv import load_dotenv
+from supabase import create_client
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db_roundtrips import InMemoryClient, RecordingClient, RoundTripLog
+from json_stream import iter_json_records
+from save_to_postgres import _get_or_create_id, save_data, save_data_bulk
+
+# Budżet zapytań do bazy (round-trips). Ingest: średnio na zapisany pociąg, bez stałego kosztu startu
+# (partycje, wczytanie słowników). API: na jedno żądanie bez trafienia w cache.
+# save_data: przejazd, upsert, przystanki (odczyt i zapis), utrudnienia — najwyżej 5 na pociąg;
+# ponowny zapis bez zmian kończy się po odczycie przystanków (3). save_data_bulk: 5 zapytań na paczkę 100 pociągów.
+# Podniesienie limitu powinno być świadomą decyzją w tym samym commicie co zmiana, która go wymaga.
+INGEST_BUDGETS = {
+    "save_data": 5.1,
+    "save_data (ponowny zapis)": 3.1,
+    "save_data_bulk": 0.1,
+}
+INGEST_STARTUP_BUDGET = 8
+# Predykcja: szczegóły przejazdu oraz model z tabeli delay_models (wczytywany raz na godzinę, tu przy pierwszym żądaniu)
+API_BUDGETS = {
+    "/stations": 1,
+    "/train-runs": 1,
+    "/stations/{name}/schedule": 1,
+    "/train-runs/{train_id}": 1,
+    "/train-details": 1,
+    "/train-runs/{train_id}/prediction": 2,
+}
+# Model predykcji dla bazy w pamięci: samo przesunięcie, bez wag cech
+DELAY_MODEL_ROW = {"id": 1, "trained_at": "2025-10-19T03:00:00+00:00",
+                   "model": {"intercept": 5.0, "numeric": {}, "categorical": {}}}
+
+
+def load_trains(paths: List[str], limit: int) -> List[dict]:
+    """Pociągi z plików archiwum JSON / JSON Lines (pliki z katalogów, posortowane), najwyżej `limit`."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, n) for n in names if n.endswith((".json", ".jsonl")))
+        else:
+            files.append(path)
+    records = (train for file_path in sorted(files) for train in iter_json_records(file_path))
+    return [t for t in islice(records, limit) if isinstance(t.get("delay_info"), list)]
+
+
+def seed_dictionaries(backend: InMemoryClient, trains: List[dict], logger: logging.Logger):
+    """Wypełnia słowniki bazy w pamięci jak w codziennym przebiegu, w którym stacje i kategorie już istnieją."""
+    caches: Dict[str, dict] = {"stations": {}, "train_categories": {}, "occupancies": {}}
+    quiet = logging.getLogger("check_db_budget.seed")
+    quiet.setLevel(logging.ERROR)
+    for train in trains:
+        _get_or_create_id(backend, "train_categories", "category_code", train.get("category"), caches["train_categories"], quiet)
+        if train.get("occupancy"):
+            _get_or_create_id(backend, "occupancies", "status_description", train["occupancy"], caches["occupancies"], quiet)
+        for name in [train.get("from"), train.get("to")] + [s.get("station_name") for s in train["delay_info"]]:
+            _get_or_create_id(backend, "stations", "name", name, caches["stations"], quiet)
+    logger.info(f"Słowniki bazy w pamięci: {len(caches['stations'])} stacji, {len(caches['train_categories'])} kategorii.")
+
+
+def train_detail_document(train: dict) -> dict:
+    """Dokument get_train_detail (kształt TrainDetail) zbudowany z pociągu w postaci wyjścia get_delays."""
+    route = train["delay_info"]
+    return {
+        "id": train["date"].replace("-", "") + train["number"],
+        "date": train["date"],
+        "number": train["number"],
+        "name": train.get("name"),
+        "category": train.get("category"),
+        "from_station": train.get("from"),
+        "to_station": train.get("to"),
+        "scheduled_departure": route[0]["departure_time"],
+        "scheduled_arrival": route[-1]["arrival_time"],
+        "delay_at_destination": route[-1]["delay_minutes_arrival"],
+        "is_cancelled": train.get("is_cancelled", False),
+        "stops": [{
+            "station_name": stop["station_name"],
+            "stop_order": order,
+            "arrival_time": stop["arrival_time"],
+            "departure_time": stop["departure_time"],
+            "delay_minutes_arrival": stop["delay_minutes_arrival"],
+            "delay_minutes_departure": stop["delay_minutes_departure"],
+            "distance_from_start_km": stop.get("distance_km_from_start_to_next") or 0.0,
+            "is_domestic": True,
+            "difficulties": [],
+            "is_cancelled": stop.get("is_cancelled", False),
+        } for order, stop in enumerate(route, start=1)],
+    }
+
+
+def seed_api_results(backend: InMemoryClient, trains: List[dict]):
+    """
+    Baza w pamięci nie ma widoków ani funkcji SQL: wypełnia widok przejazdów, wyniki RPC i model predykcji
+    danymi zapisanych pociągów, aby każde mierzone żądanie API przeszło pełną ścieżkę odpowiedzi (HTTP 200).
+    """
+    details = [train_detail_document(t) for t in trains]
+    for rank, station in enumerate(backend.tables.get("stations", []), start=1):
+        station["passenger_volume_rank"] = rank
+    backend.tables["view_train_summaries"] = [{k: v for k, v in d.items() if k != "stops"} for d in details]
+    backend.tables["delay_models"] = [dict(DELAY_MODEL_ROW)]
+    train = trains[0]
+    backend.rpc_results.update({
+        "get_train_detail": details[0],
+        "get_train_details": details,
+        "get_station_schedule": [{
+            "train_number": d["number"],
+            "train_category": d["category"],
+            "from_station": d["from_station"],
+            "to_station": d["to_station"],
+            "scheduled_arrival": None,
+            "scheduled_departure": d["scheduled_departure"],
+            "delay_arrival_min": None,
+            "delay_departure_min": d["stops"][0]["delay_minutes_departure"],
+            "is_delayed": bool(d["stops"][0]["delay_minutes_departure"]),
+            "train_id": d["id"],
+        } for d in details if d["from_station"] == train["from"]],
+    })
+
+
+def _shift_date(trains: List[dict], days: int) -> List[dict]:
+    shifted = []
+    for train in trains:
+        copy = dict(train)
+        copy["date"] = (date.fromisoformat(train["date"]) + timedelta(days=days)).isoformat()
+        shifted.append(copy)
+    return shifted
+
+
+def measure_ingest(trains: List[dict], backend_factory, latency_ms: float, logger: logging.Logger) -> Tuple[Dict[str, dict], Any]:
+    """
+    Zapytania na pociąg w przebiegu codziennym: pociągi zapisujemy najpierw dla dnia poprzedniego (usługi
+    i słowniki już istnieją), a mierzymy zapis kolejnego dnia, jego ponowny zapis (kolejny scrap)
+    i zapis zbiorczy (save_data_bulk). Zwraca wyniki i bazę po save_data.
+    """
+    quiet = logging.getLogger("check_db_budget.ingest")
+    quiet.setLevel(logging.CRITICAL)
+    previous_day, next_day = _shift_date(trains, -1), _shift_date(trains, 1)
+    results = {}
+
+    def per_train(name: str, log: RoundTripLog, startup: int):
+        summary = log.summary()
+        summary["startup_round_trips"] = startup
+        summary["per_train"] = round((summary["round_trips"] - startup) / len(trains), 2)
+        results[name] = summary
+        logger.info(f"{name}: {summary['round_trips']} zapytań dla {len(trains)} pociągów "
+                    f"({summary['per_train']} na pociąg, start {startup}), "
+                    f"wysłano {summary['request_bytes']} B, odebrano {summary['response_bytes']} B.")
+
+    log = RoundTripLog()
+    backend = backend_factory()
+    client = RecordingClient(backend, log, latency_ms)
+    save_data(previous_day, quiet, supabase=client)
+    log.reset()
+    save_data([], quiet, supabase=client)
+    startup = len(log)
+    log.reset()
+    save_data(trains, quiet, supabase=client)
+    per_train("save_data", log, startup)
+    log.reset()
+    save_data(trains, quiet, supabase=client)
+    per_train("save_data (ponowny zapis)", log, startup)
+
+    log.reset()
+    save_data_bulk([], quiet, supabase=client)
+    bulk_startup = len(log)
+    log.reset()
+    save_data_bulk(next_day, quiet, workers=1, supabase=client)
+    per_train("save_data_bulk", log, bulk_startup)
+    for name in INGEST_BUDGETS:
+        logger.debug(f"{name}: {results[name]['by_target']}")
+    results["startup_round_trips"] = max(startup, bulk_startup)
+    return results, backend
+
+
+def measure_api(backend, trains: List[dict], latency_ms: float, logger: logging.Logger) -> Dict[str, dict]:
+    """Zapytania do bazy na pojedyncze żądanie API (pierwsze żądanie danego adresu, bez cache)."""
+    from fastapi.testclient import TestClient
+    import api.main as api
+
+    log = RoundTripLog()
+    api.app.dependency_overrides[api.get_db] = lambda: RecordingClient(backend, log, latency_ms)
+    api.limiter.enabled = False
+    # Model predykcji jest wczytywany od nowa, jak w świeżym procesie API
+    api._delay_model.update(predictor=None, trained_at=None, loaded_at=0.0)
+
+    train = trains[0]
+    train_id = train["date"].replace("-", "") + train["number"]
+    batch_ids = ",".join(t["date"].replace("-", "") + t["number"] for t in trains[:api.MAX_BATCH_IDS])
+    paths = {
+        "/stations": "/stations",
+        "/train-runs": f"/train-runs?date={train['date']}",
+        "/stations/{name}/schedule": f"/stations/{train['from']}/schedule?date={train['date']}",
+        "/train-runs/{train_id}": f"/train-runs/{train_id}",
+        "/train-details": f"/train-details?ids={batch_ids}",
+        "/train-runs/{train_id}/prediction": f"/train-runs/{train_id}/prediction",
+    }
+    results = {}
+    with TestClient(api.app) as http:
+        for name, path in paths.items():
+            log.reset()
+            response = http.get(path)
+            summary = log.summary()
+            summary["status"] = response.status_code
+            summary["items"] = len(response.json()) if response.status_code == 200 else 0
+            results[name] = summary
+            logger.info(f"{name}: {summary['round_trips']} zapytań (HTTP {response.status_code}), "
+                        f"odebrano {summary['response_bytes']} B.")
+    api.app.dependency_overrides.clear()
+    return results
+
+
+def check_budgets(ingest: Dict[str, dict], api_results: Dict[str, dict], logger: logging.Logger) -> int:
+    exceeded = 0
+    for name, budget in INGEST_BUDGETS.items():
+        if ingest[name]["per_train"] > budget:
+            exceeded += 1
+            logger.error(f"Przekroczony budżet {name}: {ingest[name]['per_train']} zapytań na pociąg (limit {budget}).")
+    if ingest["startup_round_trips"] > INGEST_STARTUP_BUDGET:
+        exceeded += 1
+        logger.error(f"Przekroczony budżet startu zapisu: {ingest['startup_round_trips']} zapytań "
+                     f"(limit {INGEST_STARTUP_BUDGET}).")
+    for name, budget in API_BUDGETS.items():
+        if name in api_results and api_results[name]["round_trips"] > budget:
+            exceeded += 1
+            logger.error(f"Przekroczony budżet {name}: {api_results[name]['round_trips']} zapytań na żądanie (limit {budget}).")
+    return exceeded
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Kontrola budżetu zapytań do bazy: na zapisany pociąg i na żądanie API.")
+    parser.add_argument("paths", nargs="*", default=["data"], help="Pliki lub katalogi archiwum JSON (domyślnie: data)")
+    parser.add_argument("--limit", type=int, default=200, help="Liczba pociągów z archiwum")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Symulowane opóźnienie każdego zapytania w ms")
+    parser.add_argument("--supabase", action="store_true",
+                        help="Zamiast bazy w pamięci użyj SUPABASE_URL/SUPABASE_SERVICE_KEY (np. lokalny `supabase start`) "
+                             "— zapisuje dane testowe, tylko dla bazy tymczasowej")
+    parser.add_argument("--json", action="store_true", help="Wypisz wyniki jako JSON")
+    parser.add_argument("--verbose", action="store_true", help="Pokaż liczbę zapytań na tabelę i operację")
+    args = parser.parse_args()
+
+    logger = logging.getLogger("check_db_budget")
+    logger.setLevel(logging.DEBUG if args.verbose else logging.INFO)
+    logger.propagate = False  # api.main konfiguruje własne logowanie na root loggerze
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    logger.addHandler(stream_handler)
+
+    trains = load_trains(args.paths, args.limit)
+    if not trains:
+        logger.error("Brak pociągów z trasą w podanym archiwum.")
+        sys.exit(1)
+    logger.info(f"Wczytano {len(trains)} pociągów z trasą.")
+
+    if args.supabase:
+        shared = create_client(os.environ["SUPABASE_URL"], os.environ["SUPABASE_SERVICE_KEY"])
+        backend_factory = lambda: shared
+    else:
+        def backend_factory():
+            backend = InMemoryClient()
+            seed_dictionaries(backend, trains, logger)
+            return backend
+
+    ingest, backend = measure_ingest(trains, backend_factory, args.latency_ms, logger)
+    if not args.supabase:
+        seed_api_results(backend, trains)
+    api_results = measure_api(backend, trains, args.latency_ms, logger)
+
+    if args.json:
+        print(json.dumps({"ingest": ingest, "api": api_results}, ensure_ascii=False))
+
+    exceeded = check_budgets(ingest, api_results, logger)
+    if exceeded:
+        sys.exit(1)
+    logger.info("Wszystkie budżety zapytań zachowane.")
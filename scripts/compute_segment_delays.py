@@ -0,0 +1,47 @@
+import os
+import sys
+import argparse
+import logging
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
+from dotenv import load_dotenv
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from segment_delays import refresh_segments
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Przeliczenie przyrostów opóźnień na odcinkach tras (tabela run_segments).")
+    parser.add_argument("--date-from", help="Pierwsza data w formacie YYYY-MM-DD")
+    parser.add_argument("--date-to", help="Ostatnia data w formacie YYYY-MM-DD (domyślnie: date-from)")
+    parser.add_argument("--yesterday", action="store_true", help="Przelicz wczorajszą datę")
+    parser.add_argument("--workers", type=int, default=4, help="Liczba miesięcy przeliczanych równolegle")
+    args = parser.parse_args()
+
+    if args.yesterday:
+        date_from = date_to = (datetime.now(ZoneInfo("Europe/Warsaw")) - timedelta(days=1)).date()
+    elif args.date_from:
+        date_from = date.fromisoformat(args.date_from)
+        date_to = date.fromisoformat(args.date_to) if args.date_to else date_from
+    else:
+        parser.error("Należy podać parametr --date-from lub --yesterday.")
+
+    logger = logging.getLogger("compute_segment_delays")
+    logger.setLevel(logging.INFO)
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    logger.addHandler(stream_handler)
+
+    database_url = os.environ.get("DATABASE_URL")
+    if not database_url:
+        logger.critical("Brak DATABASE_URL w środowisku (wymagane bezpośrednie połączenie z Postgresem).")
+        sys.exit(1)
+
+    try:
+        total = refresh_segments(database_url, date_from, date_to, logger, workers=args.workers)
+    except Exception as e:
+        logger.error(f"Błąd podczas przeliczania odcinków {date_from}..{date_to}: {e}", exc_info=True)
+        sys.exit(1)
+    logger.info(f"Zapisano {total} odcinków dla dat {date_from}..{date_to}.")
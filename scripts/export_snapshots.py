@@ -0,0 +1,99 @@
+import os
+import sys
+import argparse
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List
+from zoneinfo import ZoneInfo
+from dotenv import load_dotenv
+from supabase import create_client, Client
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from static_snapshots import (
+    SNAPSHOT_DIR,
+    STATION_SCHEDULE_FIELDS,
+    STATION_SCHEDULES_SNAPSHOT,
+    TRAIN_RUNS_SNAPSHOT,
+    TRAIN_SUMMARY_FIELDS,
+    write_snapshot,
+)
+
+PAGE_SIZE = 1000  # domyślny limit wierszy PostgREST w Supabase
+
+
+def _fetch_all(query_factory, page_size: int = PAGE_SIZE) -> List[dict]:
+    """Pobiera wszystkie wiersze zapytania stronami (.range()); zapytanie musi mieć stały porządek."""
+    rows = []
+    while True:
+        page = query_factory().range(len(rows), len(rows) + page_size - 1).execute().data
+        rows.extend(page)
+        if len(page) < page_size:
+            return rows
+
+
+def export_day(supabase: Client, date_str: str, logger: logging.Logger, base_dir: str = SNAPSHOT_DIR) -> bool:
+    """
+    Eksportuje zamknięty dzień do statycznych plików JSON (gzip): listę przejazdów w kształcie TrainSummary
+    oraz tablice wszystkich stacji ({nazwa stacji: [StationScheduleItem, ...]}).
+    """
+    trains = _fetch_all(lambda: supabase.table("view_train_summaries")
+                        .select(",".join(TRAIN_SUMMARY_FIELDS))
+                        .eq("date", date_str)
+                        .order("number")
+                        .order("id"))
+    if not trains:
+        logger.warning(f"Brak przejazdów dla daty {date_str}. Pomijanie eksportu.")
+        return False
+
+    stops = _fetch_all(lambda: supabase.rpc("get_day_station_schedules", {"p_date": date_str}))
+    boards: Dict[str, List[dict]] = {}
+    for stop in stops:
+        boards.setdefault(stop["station_name"], []).append({f: stop.get(f) for f in STATION_SCHEDULE_FIELDS})
+
+    trains_path = write_snapshot(date_str, TRAIN_RUNS_SNAPSHOT, trains, base_dir)
+    boards_path = write_snapshot(date_str, STATION_SCHEDULES_SNAPSHOT, boards, base_dir)
+    logger.info(f"Wyeksportowano dzień {date_str}: {len(trains)} przejazdów ({trains_path}), "
+                f"{len(boards)} stacji / {len(stops)} postojów ({boards_path}).")
+    return True
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Eksport zamkniętych dni do statycznych snapshotów JSON (GitHub Pages/CDN).")
+    parser.add_argument("--dates", nargs="+", help="Daty do eksportu w formacie YYYY-MM-DD")
+    parser.add_argument("--yesterday", action="store_true", help="Eksportuj wczorajszą datę")
+    parser.add_argument("--out", default=SNAPSHOT_DIR, help=f"Katalog docelowy (domyślnie: {SNAPSHOT_DIR})")
+    args = parser.parse_args()
+
+    dates = list(args.dates or [])
+    if args.yesterday:
+        dates.append((datetime.now(ZoneInfo("Europe/Warsaw")) - timedelta(days=1)).strftime("%Y-%m-%d"))
+    if not dates:
+        parser.error("Należy podać parametr --dates lub --yesterday.")
+
+    logger = logging.getLogger("export_snapshots")
+    logger.setLevel(logging.INFO)
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    logger.addHandler(stream_handler)
+
+    url = os.environ.get("SUPABASE_URL")
+    key = os.environ.get("SUPABASE_SERVICE_KEY")
+    if not url or not key:
+        logger.critical("Brak SUPABASE_URL lub SUPABASE_SERVICE_KEY w środowisku.")
+        sys.exit(1)
+    supabase: Client = create_client(url, key)
+
+    failed = []
+    for date_str in dates:
+        try:
+            if not export_day(supabase, date_str, logger, args.out):
+                failed.append(date_str)
+        except Exception as e:
+            logger.error(f"Błąd podczas eksportu daty {date_str}: {e}", exc_info=True)
+            failed.append(date_str)
+
+    if failed:
+        logger.error(f"Nie wyeksportowano dat: {', '.join(failed)}")
+        sys.exit(1)
@@ -2,6 +2,7 @@ import os
 import sys
 import argparse
 import logging
+from collections import Counter
 from datetime import datetime
 from dotenv import load_dotenv
 from supabase import create_client, Client
@@ -9,9 +10,15 @@ from supabase import create_client, Client
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from get_delays import get_delays
+from json_stream import iter_json_records
 from save_to_postgres import save_data
 
-def patch_delays_for_dates(dates: list[str], logger: logging.Logger, overwrite: bool = False):
+def patch_delays_for_dates(dates: list[str], logger: logging.Logger, overwrite: bool = False, include_final: bool = False):
+    """
+    Pobiera ponownie przejazdy z podanych dni: bez overwrite tylko te bez trasy, z overwrite także
+    przejazdy z trasą, która nie jest ostateczna (train_runs.is_final, sql/run_finality.sql).
+    include_final pobiera ponownie wszystkie przejazdy dnia.
+    """
     url = os.environ.get("SUPABASE_URL")
     key = os.environ.get("SUPABASE_SERVICE_KEY")
     if not url or not key:
@@ -19,96 +26,69 @@ def patch_delays_for_dates(dates: list[str], logger: logging.Logger, overwrite:
         return
 
     supabase: Client = create_client(url, key)
-    
-    trains_to_scrape = []
 
-    for date_str in dates:
-        logger.info(f"Rozpoczęto analizę dla daty: {date_str} (overwrite={overwrite})")
-        
-        try:
-            # 1. Pobierz wszystkie train_runs dla tej daty wraz z ich ID
-            runs_response = supabase.table('train_runs').select('id, service_id, run_stops(id)').eq('date', date_str).execute()
-            runs = runs_response.data
-            
-            # Fallback jeśli brak jakichkolwiek rekordów dla tej daty
-            if not runs:
-                logger.warning(f"Brak rekordów train_runs dla daty {date_str} w bazie. Fallback: pobieranie aktywnych usług z ostatnich 14 dni...")
-                from datetime import timedelta
-                parsed_d = datetime.strptime(date_str, "%Y-%m-%d").date()
-                start_limit = (parsed_d - timedelta(days=7)).strftime("%Y-%m-%d")
-                end_limit = (parsed_d + timedelta(days=7)).strftime("%Y-%m-%d")
-                
-                recent_runs = supabase.table('train_runs').select('service_id').gte('date', start_limit).lte('date', end_limit).execute()
-                active_service_ids = list(set(r['service_id'] for r in recent_runs.data))
-                
-                if not active_service_ids:
-                    logger.error(f"Nie znaleziono żadnych aktywnych usług w przedziale {start_limit} - {end_limit}. Pomijam datę.")
-                    continue
-                
-                # Budujemy sztuczną listę runs do dalszego przetwarzania
-                runs = [{"service_id": sid, "run_stops": []} for sid in active_service_ids]
-            
-            # 2. Wybierz pociągi do przetworzenia w zależności od trybu
+    # 1. Plan dla wszystkich dat jednym zapytaniem: przejazdy bez trasy, nieostateczne (przy overwrite)
+    # oraz, dla dni bez żadnego przejazdu w bazie, usługi jeżdżące w ciągu 7 dni przed i po nim
+    try:
+        targets = supabase.rpc("patch_delay_targets", {
+            "p_dates": sorted(set(dates)),
+            "p_overwrite": overwrite,
+            "p_include_final": include_final,
+        }).execute().data or []
+    except Exception as e:
+        logger.error(f"Błąd podczas planowania łatania dla dat {', '.join(dates)}: {e}", exc_info=True)
+        return
+
+    targets_by_date = {}
+    for target in targets:
+        targets_by_date.setdefault(target["date"], []).append(target)
+
+    for date_str in sorted(set(dates)):
+        date_targets = targets_by_date.get(date_str, [])
+        reasons = Counter(t["reason"] for t in date_targets)
+        if reasons.get("no_runs"):
+            logger.warning(f"Brak rekordów train_runs dla daty {date_str} w bazie. "
+                           f"Fallback: {reasons['no_runs']} aktywnych usług z 7 dni przed i po tej dacie.")
+        elif not date_targets:
             if overwrite:
-                target_runs = runs
+                logger.info(f"Brak pociągów do przetworzenia dla daty {date_str}.")
             else:
-                target_runs = [r for r in runs if not r.get('run_stops')]
-            
-            if not target_runs:
-                if overwrite:
-                    logger.info(f"Brak pociągów do przetworzenia dla daty {date_str}.")
-                else:
-                    logger.info(f"Brak luk w dacie {date_str}. Wszystkie train_runs posiadają odpowiadające run_stops.")
-                continue
-                
-            logger.info(f"Do przetworzenia w dacie {date_str}: {len(target_runs)} pociągów (overwrite={overwrite}).")
-            
-            service_ids = list(set(r['service_id'] for r in target_runs))
-            
-            # 3. Pobierz szczegóły usług dla przejazdów
-            services_response = supabase.table('train_services').select('id, number, name, is_domestic, category_id, start_station_id, end_station_id').in_('id', service_ids).execute()
-            services = {s['id']: s for s in services_response.data}
-            
-            # Pobierz dodatkowo słowniki dla czytelnych nazw
-            categories_response = supabase.table('train_categories').select('id, category_code').execute()
-            categories = {c['id']: c['category_code'] for c in categories_response.data}
-            
-            stations_response = supabase.table('stations').select('id, name').execute()
-            stations = {s['id']: s['name'] for s in stations_response.data}
-            
-            # Format target_date z "YYYY-MM-DD" do "DD.MM.YYYY" wymagany przez portal pasażera
-            parsed_date = datetime.strptime(date_str, "%Y-%m-%d")
-            target_date_formatted = parsed_date.strftime("%d.%m.%Y")
-            
-            # 4. Budowanie listy danych wejściowych
-            for run in target_runs:
-                service = services.get(run['service_id'])
-                if not service:
-                    continue
-                    
-                trains_to_scrape.append({
-                    "number": service["number"],
-                    "name": service["name"],
-                    "category": categories.get(service["category_id"], ""),
-                    "domestic": "Krajowy" if service["is_domestic"] else "Międzynarodowy",
-                    "from": stations.get(service["start_station_id"], ""),
-                    "to": stations.get(service["end_station_id"], ""),
-                    "date": date_str,
-                    "target_date": target_date_formatted
-                })
-        except Exception as e:
-            logger.error(f"Błąd podczas odpytywania bazy danych dla daty {date_str}: {e}", exc_info=True)
+                logger.info(f"Brak luk w dacie {date_str}. Wszystkie train_runs posiadają odpowiadające run_stops.")
+        else:
+            logger.info(f"Do przetworzenia w dacie {date_str}: {len(date_targets)} pociągów "
+                        f"(bez trasy: {reasons.get('no_stops', 0)}, nieostateczne: {reasons.get('not_final', 0)}, "
+                        f"ostateczne: {reasons.get('final', 0)}; overwrite={overwrite}).")
 
-    if not trains_to_scrape:
+    if not targets:
         logger.info("Brak pociągów do przetworzenia.")
         return
 
+    # 2. Słowniki dla czytelnych nazw — raz na całe uruchomienie
+    try:
+        categories = {c['id']: c['category_code'] for c in supabase.table('train_categories').select('id, category_code').execute().data}
+        stations = {s['id']: s['name'] for s in supabase.table('stations').select('id, name').execute().data}
+    except Exception as e:
+        logger.error(f"Błąd podczas wczytywania słowników: {e}", exc_info=True)
+        return
+
+    # 3. Budowanie listy danych wejściowych; target_date w formacie DD.MM.YYYY wymaganym przez portal pasażera
+    trains_to_scrape = [{
+        "number": target["number"],
+        "name": target["name"],
+        "category": categories.get(target["category_id"], ""),
+        "domestic": "Krajowy" if target["is_domestic"] else "Międzynarodowy",
+        "from": stations.get(target["start_station_id"], ""),
+        "to": stations.get(target["end_station_id"], ""),
+        "date": target["date"],
+        "target_date": datetime.strptime(target["date"], "%Y-%m-%d").strftime("%d.%m.%Y")
+    } for target in targets]
+
     logger.info(f"Łącznie pociągów do przetworzenia ze wszystkich dat: {len(trains_to_scrape)}")
     
-    # 5. Uruchomienie scrapera
+    # 4. Uruchomienie scrapera
     scraped_data = get_delays(trains_to_scrape, logger=logger)
     
-    # 6. Zapisanie uzyskanych opóźnień do bazy
+    # 5. Zapisanie uzyskanych opóźnień do bazy
     save_data(scraped_data, logger=logger, overwrite=overwrite)
     logger.info("Zakończono łatanie danych.")
 
@@ -119,7 +99,9 @@ if __name__ == "__main__":
     parser.add_argument("--dates", nargs="+", help="Daty do sprawdzenia w formacie YYYY-MM-DD (np. 2026-06-08)")
     parser.add_argument("--yesterday", action="store_true", help="Uruchom dla wczorajszej daty")
     parser.add_argument("--overwrite", action="store_true", help="Nadpisz istniejące dane w bazie, jeśli są różnice")
-    parser.add_argument("--file", help="Ścieżka do pliku JSON z danymi do wczytania i aktualizacji frekwencji")
+    parser.add_argument("--include-final", action="store_true",
+                        help="Z --overwrite pobierz ponownie także przejazdy z ostateczną trasą")
+    parser.add_argument("--file", help="Ścieżka do pliku JSON lub JSON Lines (.jsonl) z danymi do wczytania i aktualizacji frekwencji")
     args = parser.parse_args()
 
     dates = []
@@ -158,15 +140,14 @@ if __name__ == "__main__":
         logger.addHandler(file_handler)
 
     if args.file:
-        import json
         logger.info(f"Wczytywanie danych z pliku: {args.file}")
         try:
-            with open(args.file, "r", encoding="utf-8-sig") as f:
-                data = json.load(f)
-            logger.info(f"Pomyślnie wczytano {len(data)} rekordów. Rozpoczynanie zapisu i aktualizacji frekwencji.")
+            # Rekordy są parsowane i zapisywane pojedynczo — pierwszy zapis startuje bez czekania na cały plik
+            data = iter_json_records(args.file)
+            logger.info("Rozpoczynanie strumieniowego zapisu i aktualizacji frekwencji.")
             save_data(data, logger=logger, update_occupancy=True, overwrite=args.overwrite)
             logger.info("Zakończono wczytywanie danych z pliku.")
         except Exception as e:
             logger.error(f"Błąd podczas wczytywania/zapisu danych z pliku: {e}", exc_info=True)
     else:
-        patch_delays_for_dates(dates, logger, overwrite=args.overwrite)
+        patch_delays_for_dates(dates, logger, overwrite=args.overwrite, include_final=args.include_final)
@@ -0,0 +1,134 @@
+import os
+import re
+import sys
+import argparse
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Tuple
+from dotenv import load_dotenv
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from json_stream import iter_json_records
+from parquet_archive import read_parquet_file, table_to_trains
+from save_to_postgres import save_data_bulk
+
+ARCHIVE_EXTENSIONS = (".json", ".jsonl", ".parquet")
+_FILENAME_TS_RE = re.compile(r'train_data_(\d{4}-\d{2}-\d{2}-\d{4}(?:\d{2})?)')
+# Dzień jest kompletny, gdy archiwum dochodzi do plików pobranych tyle dni później: pociągi po północy
+# i nocne łatanie zapisują dzień jeszcze następnego dnia
+COMPLETE_AFTER_DAYS = 2
+
+
+def iter_archive_files(paths: List[str]) -> Iterator[str]:
+    """
+    Zwraca pliki archiwum (JSON, JSON Lines i Parquet) z podanych plików i katalogów w kolejności pobrania
+    (czas z nazwy pliku), niezależnie od układu katalogów.
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, n) for n in names if n.endswith(ARCHIVE_EXTENSIONS))
+        elif path.endswith(ARCHIVE_EXTENSIONS):
+            files.append(path)
+    return iter(sorted(files, key=lambda f: (_scrape_time_from_filename(f), f)))
+
+
+def _scrape_time_from_filename(file_path: str) -> datetime:
+    """Czas scrapowania z nazwy pliku train_data_YYYY-MM-DD-HHMM[SS]; w ostateczności mtime pliku."""
+    match = _FILENAME_TS_RE.search(os.path.basename(file_path))
+    if match:
+        ts = match.group(1)
+        return datetime.strptime(ts, "%Y-%m-%d-%H%M%S" if len(ts) == 17 else "%Y-%m-%d-%H%M")
+    return datetime.fromtimestamp(os.path.getmtime(file_path))
+
+
+def iter_trains_from_file(file_path: str) -> Iterator[Tuple[datetime, dict]]:
+    """Zwraca pary (czas scrapowania, przejazd) z pojedynczego pliku archiwum."""
+    if file_path.endswith(".parquet"):
+        for train in table_to_trains(read_parquet_file(file_path)):
+            yield train.pop("scraped_at"), train
+        return
+
+    scraped_at = _scrape_time_from_filename(file_path)
+    for train in iter_json_records(file_path):
+        yield scraped_at, train
+
+
+def _day_runs(runs: Dict[str, Tuple[Tuple[bool, datetime], dict]]) -> List[dict]:
+    return [train for _, train in sorted(runs.values(), key=lambda item: item[1]["number"])]
+
+
+def deduplicate_runs(files: Iterator[str], logger: logging.Logger, date_from: str = None,
+                     date_to: str = None) -> Iterator[List[dict]]:
+    """
+    Wczytuje kolejno pliki archiwum i zostawia jeden rekord na (numer, data).
+    Wygrywa najnowszy scrap z pełną trasą; rekord z błędem (np. "page_load_timeout")
+    nie nadpisuje wcześniejszego rekordu z trasą.
+    Zwraca przejazdy dzień po dniu: dzień jest oddawany i usuwany z pamięci, gdy archiwum dojdzie do plików
+    pobranych COMPLETE_AFTER_DAYS dni później, więc w pamięci są tylko ostatnie dni, a nie całe archiwum.
+    """
+    best: Dict[str, Dict[str, Tuple[Tuple[bool, datetime], dict]]] = {}
+    files_read, records_read = 0, 0
+
+    for file_path in files:
+        try:
+            for scraped_at, train in iter_trains_from_file(file_path):
+                records_read += 1
+                date_str = train.get("date")
+                if not train.get("number") or not date_str:
+                    continue
+                if (date_from and date_str < date_from) or (date_to and date_str > date_to):
+                    continue
+
+                # Czas pobrania z archiwum rozstrzyga o ostateczności przejazdu (save_to_postgres._is_run_final)
+                train.setdefault("scraped_at", scraped_at)
+                rank = (isinstance(train.get("delay_info"), list), scraped_at)
+                day = best.setdefault(date_str, {})
+                if train["number"] not in day or rank >= day[train["number"]][0]:
+                    day[train["number"]] = (rank, train)
+        except Exception as e:
+            logger.error(f"Błąd podczas wczytywania pliku {file_path}: {e}", exc_info=True)
+            continue
+
+        files_read += 1
+        logger.info(f"Wczytano plik {file_path} ({files_read} plików, {records_read} rekordów, "
+                    f"{sum(len(day) for day in best.values())} przejazdów w pamięci).")
+
+        complete_before = (_scrape_time_from_filename(file_path).date() - timedelta(days=COMPLETE_AFTER_DAYS)).isoformat()
+        for date_str in sorted(d for d in best if d <= complete_before):
+            yield _day_runs(best.pop(date_str))
+
+    for date_str in sorted(best):
+        yield _day_runs(best.pop(date_str))
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Zbiorcze odtworzenie bazy danych z lokalnego archiwum (JSON/Parquet).")
+    parser.add_argument("paths", nargs="*", default=["data"], help="Pliki lub katalogi archiwum (domyślnie: data)")
+    parser.add_argument("--date-from", help="Pierwsza data do wczytania w formacie YYYY-MM-DD")
+    parser.add_argument("--date-to", help="Ostatnia data do wczytania w formacie YYYY-MM-DD")
+    parser.add_argument("--overwrite", action="store_true", help="Nadpisz trasy przejazdów istniejących już w bazie")
+    parser.add_argument("--batch-size", type=int, default=100, help="Liczba przejazdów w jednej paczce zapisu")
+    parser.add_argument("--workers", type=int, default=4, help="Liczba równoległych wątków zapisu")
+    args = parser.parse_args()
+
+    logger = logging.getLogger("replay_archive")
+    logger.setLevel(logging.INFO)
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    logger.addHandler(stream_handler)
+
+    runs_saved = 0
+    for trains in deduplicate_runs(iter_archive_files(args.paths), logger, args.date_from, args.date_to):
+        logger.info(f"Do zapisu: {len(trains)} unikalnych przejazdów z dnia {trains[0]['date']}.")
+        save_data_bulk(trains, logger, overwrite=args.overwrite, batch_size=args.batch_size,
+                       workers=args.workers, total=len(trains))
+        runs_saved += len(trains)
+
+    if not runs_saved:
+        logger.info("Brak przejazdów do wczytania.")
+        sys.exit(0)
+    logger.info(f"Zakończono odtwarzanie danych z archiwum ({runs_saved} przejazdów).")
@@ -0,0 +1,134 @@
+import os
+import sys
+import time
+import argparse
+import logging
+import datetime
+from typing import List, Set
+from zoneinfo import ZoneInfo
+
+from dotenv import load_dotenv
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from get_delays import get_delays
+from get_train_data import write_backups
+from logger_config import setup_logging
+from delay_stats import refresh_delay_stats
+from save_to_postgres import _create_client_from_env, _ensure_date_partitions, _load_dictionary_caches, save_data
+from scrape_queue import (
+    DEFAULT_BATCH_SIZE, DEFAULT_LEASE_SECONDS, LEASE_EXPIRED, RETRYABLE_RESULTS, WARSAW_TZ,
+    claim_tasks, complete_task, fail_task, queue_status, worker_id,
+)
+
+
+def process_batch(supabase, tasks: List[dict], worker: str, logger: logging.Logger) -> List[dict]:
+    """
+    Pobiera trasy pociągów z paczki i rozlicza zadania w kolejce. Zwraca pociągi do zapisu: pobrane oraz
+    te, którym skończyły się próby (zapisane bez trasy, jak w pojedynczym przebiegu — nocne łatanie je uzupełni).
+    """
+    to_scrape = [t for t in tasks if not t["give_up"]]
+    inputs = [dict(t["train"]) for t in to_scrape]
+    # Portal bez daty szuka pociągu z bieżącego dnia — pociąg pobierany po północy potrzebuje daty kursu
+    today = datetime.datetime.now(WARSAW_TZ).date().isoformat()
+    for train in inputs:
+        if train.get("date") and train["date"] != today and not train.get("target_date"):
+            train["target_date"] = datetime.date.fromisoformat(train["date"]).strftime("%d.%m.%Y")
+    trains = get_delays(inputs, logger) if inputs else []
+    scraped = {task["id"]: train for task, train in zip(to_scrape, trains)}
+
+    to_save = []
+    for task in tasks:
+        if task["give_up"]:
+            train = dict(task["train"], delay_info=LEASE_EXPIRED)
+        else:
+            train = scraped[task["id"]]
+        result = train.get("delay_info")
+
+        if isinstance(result, str) and (result in RETRYABLE_RESULTS or result == LEASE_EXPIRED):
+            status = fail_task(supabase, task["id"], worker, result)
+            if status == "failed":
+                logger.warning(f"Pociąg {task['number']} ({task['date']}): {result}, wyczerpano {task['attempts']} prób.")
+                to_save.append(train)
+            elif status == "pending":
+                logger.info(f"Pociąg {task['number']} ({task['date']}): {result}, zadanie wraca do kolejki.")
+            else:
+                logger.warning(f"Pociąg {task['number']} ({task['date']}): dzierżawa przejęta przez inny worker.")
+        elif complete_task(supabase, task["id"], worker):
+            to_save.append(train)
+        else:
+            logger.warning(f"Pociąg {task['number']} ({task['date']}): dzierżawa wygasła i przejął ją inny worker. "
+                           f"Pomijanie wyniku.")
+    return to_save
+
+
+def run_worker(supabase, logger: logging.Logger, batch_size: int = DEFAULT_BATCH_SIZE,
+               lease_seconds: int = DEFAULT_LEASE_SECONDS, poll_seconds: float = 30,
+               wait_for_tasks_seconds: float = 0) -> List[dict]:
+    """
+    Pobiera paczki z kolejki, dopóki są zadania do wydania teraz. Worker nie ma stanu poza bieżącą paczką:
+    można uruchomić dowolnie wiele workerów, a paczka workera, który padł, wraca do puli po wygaśnięciu dzierżawy.
+    Gdy wolnych zadań nie ma, ale inne workery trzymają dzierżawy, worker czeka — mogą jeszcze wygasnąć.
+    Zadania zaplanowane na później (pociągi jeszcze w drodze) pobierze kolejne uruchomienie workera.
+    Słowniki i partycje są przygotowywane raz na uruchomienie (przy pierwszej paczce do zapisu),
+    a statystyki opóźnień przeliczane raz na końcu, dla dni zapisanych przez wszystkie paczki.
+    """
+    worker = worker_id()
+    started_at = time.time()
+    saved = []
+    caches = None
+    touched_dates: Set[str] = set()
+    logger.info(f"Worker {worker}: paczki po {batch_size} pociągów, dzierżawa {lease_seconds}s.")
+
+    while True:
+        tasks = claim_tasks(supabase, worker, batch_size, lease_seconds)
+        if not tasks:
+            open_tasks = queue_status(supabase)
+            waiting = open_tasks.get("pending") or open_tasks.get("leased")
+            if not waiting and time.time() - started_at >= wait_for_tasks_seconds:
+                break
+            logger.info(f"Brak wolnych zadań (otwarte: {open_tasks or 'brak'}). Ponowne sprawdzenie za {poll_seconds:.0f}s.")
+            time.sleep(poll_seconds)
+            continue
+
+        logger.info(f"Pobrano z kolejki {len(tasks)} zadań.")
+        trains = process_batch(supabase, tasks, worker, logger)
+        if trains:
+            if caches is None:
+                # Pociągi po północy należą do poprzedniego dnia — na początku miesiąca to poprzednia partycja
+                yesterday = datetime.datetime.now(WARSAW_TZ).date() - datetime.timedelta(days=1)
+                _ensure_date_partitions(supabase, logger, date_from=yesterday.isoformat())
+                try:
+                    caches = _load_dictionary_caches(supabase, logger)
+                except Exception as e:
+                    # Bez cache save_data spróbuje wczytać słowniki sam, a kolejna paczka ponowi próbę
+                    logger.critical(f"Nie udało się wczytać słowników: {e}")
+            save_data(trains, logger, supabase=supabase, caches=caches, touched_dates=touched_dates)
+        saved.extend(trains)
+
+    refresh_delay_stats(supabase, touched_dates, logger)
+    logger.info(f"Worker {worker}: brak zadań do wydania teraz (zaplanowane na później: "
+                f"{open_tasks.get('scheduled', 0)}), zapisano {len(saved)} pociągów.")
+    return saved
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Worker kolejki pobierania opóźnień (sql/scrape_queue.sql).")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Liczba pociągów w paczce")
+    parser.add_argument("--lease-seconds", type=int, default=DEFAULT_LEASE_SECONDS,
+                        help="Czas dzierżawy paczki; po nim zadania wracają do puli")
+    parser.add_argument("--poll-seconds", type=float, default=30, help="Odstęp sprawdzania kolejki, gdy brak wolnych zadań")
+    parser.add_argument("--wait-for-tasks", type=float, default=0,
+                        help="Ile sekund czekać na pierwsze zadania (worker uruchomiony przed get_train_data.py)")
+    args = parser.parse_args()
+
+    logger = setup_logging()
+    supabase = _create_client_from_env(logger)
+    if supabase is None:
+        sys.exit(1)
+
+    now = datetime.datetime.now(ZoneInfo("Europe/Warsaw"))
+    saved = run_worker(supabase, logger, args.batch_size, args.lease_seconds, args.poll_seconds, args.wait_for_tasks)
+    if saved:
+        write_backups(saved, now, logger, name_suffix=f"_{worker_id()}")
@@ -0,0 +1,49 @@
+import os
+import sys
+import argparse
+import logging
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
+from dotenv import load_dotenv
+
+import psycopg
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from delay_model import TRAINING_DAYS, save_delay_model, train_delay_model
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Uczenie modelu predykcji opóźnienia na stacji końcowej (tabela delay_models).")
+    parser.add_argument("--date-to", help="Ostatni dzień okna uczenia w formacie YYYY-MM-DD (domyślnie: wczoraj)")
+    parser.add_argument("--days", type=int, default=TRAINING_DAYS, help=f"Długość okna uczenia w dniach (domyślnie: {TRAINING_DAYS})")
+    parser.add_argument("--dry-run", action="store_true", help="Tylko ucz i oceń model, bez zapisu do bazy")
+    args = parser.parse_args()
+
+    date_to = date.fromisoformat(args.date_to) if args.date_to else \
+        (datetime.now(ZoneInfo("Europe/Warsaw")) - timedelta(days=1)).date()
+    date_from = date_to - timedelta(days=args.days - 1)
+
+    logger = logging.getLogger("train_delay_model")
+    logger.setLevel(logging.INFO)
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    logger.addHandler(stream_handler)
+
+    database_url = os.environ.get("DATABASE_URL")
+    if not database_url:
+        logger.critical("Brak DATABASE_URL w środowisku (wymagane bezpośrednie połączenie z Postgresem).")
+        sys.exit(1)
+
+    try:
+        with psycopg.connect(database_url, autocommit=True) as conn:
+            record = train_delay_model(conn, date_from, date_to, logger)
+            if args.dry_run:
+                logger.info("Tryb dry-run: model nie został zapisany.")
+            else:
+                save_delay_model(conn, record)
+                logger.info(f"Zapisano model dla okna {date_from}..{date_to}.")
+    except Exception as e:
+        logger.error(f"Błąd podczas uczenia modelu dla okna {date_from}..{date_to}: {e}", exc_info=True)
+        sys.exit(1)
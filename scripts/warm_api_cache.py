@@ -0,0 +1,110 @@
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+from urllib.error import HTTPError, URLError
+from urllib.parse import quote, urlencode
+from urllib.request import Request, urlopen
+
+API_URL = os.environ.get("API_URL", "https://api.spoznienia.me")
+
+# Te same kolumny, o które pyta wyszukiwarka we frontendzie (docs/index.html) — inaczej klucz cache byłby inny
+FRONTEND_TRAIN_FIELDS = "name,category,from_station,to_station,scheduled_departure,scheduled_arrival,delay_at_destination,is_cancelled"
+
+
+def fetch(url: str, logger: logging.Logger, max_retries: int = 4, retry_delay_s: float = 15.0) -> Optional[bytes]:
+    """
+    Pobiera adres z nagłówkiem Cache-Control: no-cache, który wymusza ponowne wyliczenie
+    odpowiedzi i nadpisanie wpisu w cache API. Błędy 5xx i sieciowe (cold start na Render) są ponawiane.
+    """
+    request = Request(url, headers={"Cache-Control": "no-cache", "Accept": "application/json"})
+    for attempt in range(1, max_retries + 2):
+        try:
+            t0 = time.time()
+            with urlopen(request, timeout=120) as response:
+                body = response.read()
+            logger.info(f"Rozgrzano {url} ({len(body)} B, {(time.time() - t0) * 1000:.0f} ms).")
+            return body
+        except HTTPError as e:
+            if e.code < 500:
+                logger.warning(f"{url} -> HTTP {e.code}. Pomijanie.")
+                return None
+            logger.warning(f"{url} -> HTTP {e.code} (próba {attempt}/{max_retries + 1}).")
+        except URLError as e:
+            logger.warning(f"{url} -> błąd sieci: {e.reason} (próba {attempt}/{max_retries + 1}).")
+        if attempt <= max_retries:
+            time.sleep(retry_delay_s)
+    logger.error(f"Nie udało się rozgrzać {url}.")
+    return None
+
+
+def wait_until_final(url: str, logger: logging.Logger, timeout_s: float, poll_interval_s: float = 60.0) -> bool:
+    """
+    Czeka, aż API uzna dzień za zamknięty (api/cache.py is_finalised) — odpowiedź dostaje wtedy
+    Cache-Control: immutable. Dopiero wtedy rozgrzewanie trafia w klucze ":final:", a nie w krótkie ":live:".
+    Dzień staje się zamknięty, gdy snapshot z backup_patch.yml trafi do wdrożenia API.
+    """
+    deadline = time.time() + timeout_s
+    while True:
+        try:
+            with urlopen(Request(url, headers={"Accept": "application/json"}), timeout=120) as response:
+                if "immutable" in (response.headers.get("Cache-Control") or ""):
+                    return True
+        except (HTTPError, URLError) as e:
+            logger.warning(f"{url} -> {e}.")
+        if time.time() + poll_interval_s > deadline:
+            return False
+        logger.info(f"API nie uznaje jeszcze dnia za zamknięty, ponowna próba za {poll_interval_s:.0f} s.")
+        time.sleep(poll_interval_s)
+
+
+def warm_api_cache(date_str: str, logger: logging.Logger, api_url: str = API_URL, top_stations: int = 20,
+                   final_timeout_s: float = 1800) -> int:
+    """
+    Wylicza z wyprzedzeniem najczęściej pobierane odpowiedzi API dla zamkniętego dnia: listę przejazdów
+    (/train-runs, także w wariancie z projekcją pól używanym przez frontend) oraz tablice
+    najpopularniejszych stacji. Zwraca liczbę rozgrzanych adresów (0, jeśli API nie uznało dnia za zamknięty).
+    """
+    urls = [
+        f"{api_url}/train-runs?{urlencode({'date': date_str})}",
+        f"{api_url}/train-runs?{urlencode({'date': date_str, 'fields': FRONTEND_TRAIN_FIELDS})}",
+    ]
+    if not wait_until_final(urls[0], logger, final_timeout_s):
+        logger.error(f"API nie uznało dnia {date_str} za zamknięty w ciągu {final_timeout_s:.0f} s "
+                     f"(brak snapshotu we wdrożeniu?). Pomijanie rozgrzewania.")
+        return 0
+
+    # /stations zwraca stacje posortowane wg liczby pasażerów
+    stations_body = fetch(f"{api_url}/stations", logger)
+    stations = json.loads(stations_body)[:top_stations] if stations_body else []
+    for name in stations:
+        urls.append(f"{api_url}/stations/{quote(name)}/schedule?{urlencode({'date': date_str})}")
+
+    warmed = sum(1 for url in urls if fetch(url, logger) is not None)
+    logger.info(f"Rozgrzano cache API dla daty {date_str}: {warmed}/{len(urls)} adresów.")
+    return warmed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rozgrzewanie cache API dla dnia zamkniętego po nocnym łataniu.")
+    parser.add_argument("--date", help="Data w formacie YYYY-MM-DD (domyślnie: wczoraj)")
+    parser.add_argument("--api-url", default=API_URL, help=f"Adres API (domyślnie: {API_URL})")
+    parser.add_argument("--top-stations", type=int, default=20, help="Liczba najpopularniejszych stacji do rozgrzania")
+    parser.add_argument("--final-timeout", type=float, default=1800,
+                        help="Ile sekund czekać, aż API uzna dzień za zamknięty (wdrożenie snapshotu)")
+    args = parser.parse_args()
+
+    logger = logging.getLogger("warm_api_cache")
+    logger.setLevel(logging.INFO)
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    logger.addHandler(stream_handler)
+
+    date_str = args.date or (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+    if not warm_api_cache(date_str, logger, api_url=args.api_url.rstrip("/"), top_stations=args.top_stations,
+                          final_timeout_s=args.final_timeout):
+        sys.exit(1)
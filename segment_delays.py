@@ -0,0 +1,169 @@
+import io
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from typing import Iterator, Tuple
+
+import numpy as np
+import pandas as pd
+import psycopg
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+from psycopg import sql
+
+# Kolumny tabeli run_segments (sql/segment_delays.sql) w kolejności zapisu
+SEGMENT_COLUMNS = [
+    "run_id", "date", "from_stop_order", "from_station_id", "to_station_id", "distance_km",
+    "scheduled_running_min", "delay_gain_min", "dwell_overrun_min", "recovery_min",
+]
+
+# Czasy rozkładowe w minutach od północy; przystanek odwołany albo należący do odwołanego przejazdu
+# nie tworzy odcinków (jego opóźnienie nie jest pomiarem).
+_STOPS_QUERY = """
+    SELECT
+        rs.run_id,
+        rs.date,
+        rs.stop_order,
+        rs.station_id,
+        rs.distance_from_start_km,
+        (EXTRACT(EPOCH FROM rs.scheduled_arrival) / 60)::INT AS scheduled_arrival_min,
+        (EXTRACT(EPOCH FROM rs.scheduled_departure) / 60)::INT AS scheduled_departure_min,
+        rs.delay_arrival_min,
+        rs.delay_departure_min,
+        (COALESCE(rs.is_cancelled, FALSE) OR COALESCE(tr.is_cancelled, FALSE))::INT AS is_cancelled
+    FROM run_stops rs
+    JOIN train_runs tr ON tr.id = rs.run_id AND tr.date = rs.date
+    WHERE rs.date BETWEEN {date_from} AND {date_to}
+        AND tr.date BETWEEN {date_from} AND {date_to}
+"""
+
+_MINUTES_PER_DAY = 24 * 60
+
+
+def load_stops(conn: psycopg.Connection, date_from: date, date_to: date) -> pd.DataFrame:
+    """Wczytuje przystanki z zakresu dat jednym poleceniem COPY (CSV) — bez stronicowania i obiektów na wiersz."""
+    query = sql.SQL(_STOPS_QUERY).format(date_from=sql.Literal(date_from), date_to=sql.Literal(date_to))
+    buffer = io.BytesIO()
+    with conn.cursor() as cur:
+        with cur.copy(sql.SQL("COPY ({}) TO STDOUT WITH (FORMAT csv, HEADER)").format(query)) as copy:
+            for block in copy:
+                buffer.write(block)
+    buffer.seek(0)
+    return pd.read_csv(buffer, dtype={
+        "run_id": np.int64,
+        "stop_order": np.int32,
+        "station_id": np.int32,
+        "distance_from_start_km": np.float64,
+        "scheduled_arrival_min": np.float64,
+        "scheduled_departure_min": np.float64,
+        "delay_arrival_min": np.float64,
+        "delay_departure_min": np.float64,
+        "is_cancelled": np.int8,
+    })
+
+
+def compute_segments(stops: pd.DataFrame) -> pd.DataFrame:
+    """
+    Zamienia przystanki na odcinki (przystanek i -> przystanek i+1 tego samego przejazdu).
+    Wszystkie wielkości są liczone na przesuniętych tablicach NumPy, bez pętli po wierszach:
+      - delay_gain_min: opóźnienie przyjazdu do i+1 minus opóźnienie odjazdu z i,
+      - dwell_overrun_min: przyrost opóźnienia w czasie postoju na i+1 (tylko dodatni),
+      - recovery_min: minuty odrobione w czasie jazdy i przez skrócony postój na i+1.
+    Opóźnienie bez planowej godziny (przyjazd na stacji początkowej, odjazd na końcowej) traktowane jest jako brak,
+    a brakujące opóźnienie odjazdu (przyjazdu) zastępowane jest opóźnieniem przyjazdu (odjazdu) na tym samym przystanku.
+    """
+    if stops.empty:
+        return pd.DataFrame(columns=SEGMENT_COLUMNS)
+
+    stops = stops.sort_values(["run_id", "stop_order"], kind="stable")
+    run_id = stops["run_id"].to_numpy()
+    sched_arr = stops["scheduled_arrival_min"].to_numpy(dtype=np.float64)
+    sched_dep = stops["scheduled_departure_min"].to_numpy(dtype=np.float64)
+    # Scraper zapisuje brakujące opóźnienie jako 0, nie NULL — bez planowego przyjazdu (odjazdu) opóźnienia nie ma
+    delay_arr = np.where(np.isnan(sched_arr), np.nan, stops["delay_arrival_min"].to_numpy(dtype=np.float64))
+    delay_dep = np.where(np.isnan(sched_dep), np.nan, stops["delay_departure_min"].to_numpy(dtype=np.float64))
+    distance = stops["distance_from_start_km"].to_numpy(dtype=np.float64)
+    cancelled = stops["is_cancelled"].to_numpy().astype(bool)
+
+    departure_delay = np.where(np.isnan(delay_dep), delay_arr, delay_dep)
+    arrival_delay = np.where(np.isnan(delay_arr), delay_dep, delay_arr)
+    departure_time = np.where(np.isnan(sched_dep), sched_arr, sched_dep)
+    arrival_time = np.where(np.isnan(sched_arr), sched_dep, sched_arr)
+
+    # Odcinek k łączy wiersz k (początek) z wierszem k+1 (koniec)
+    valid = (run_id[1:] == run_id[:-1]) & ~cancelled[1:] & ~cancelled[:-1]
+    start = np.flatnonzero(valid)
+    end = start + 1
+
+    delay_gain = arrival_delay[end] - departure_delay[start]
+    dwell = delay_dep[end] - delay_arr[end]  # NaN na stacji końcowej (brak odjazdu)
+    recovery = np.maximum(-delay_gain, 0) + np.maximum(np.nan_to_num(-dwell), 0)
+
+    segments = pd.DataFrame({
+        "run_id": run_id[start],
+        "date": stops["date"].to_numpy()[start],
+        "from_stop_order": stops["stop_order"].to_numpy()[start],
+        "from_station_id": stops["station_id"].to_numpy()[start],
+        "to_station_id": stops["station_id"].to_numpy()[end],
+        "distance_km": np.round(distance[end] - distance[start], 1),
+        "scheduled_running_min": np.mod(arrival_time[end] - departure_time[start], _MINUTES_PER_DAY),
+        "delay_gain_min": delay_gain,
+        "dwell_overrun_min": np.maximum(dwell, 0),
+        "recovery_min": recovery,
+    })
+    for column in ("scheduled_running_min", "delay_gain_min", "dwell_overrun_min", "recovery_min"):
+        segments[column] = segments[column].astype("Int32")
+    return segments
+
+
+def write_segments(conn: psycopg.Connection, segments: pd.DataFrame, date_from: date, date_to: date):
+    """Zastępuje odcinki z zakresu dat w jednej transakcji (DELETE + COPY), więc ponowne przeliczenie jest idempotentne."""
+    # CSV z pyarrow (C++) zamiast DataFrame.to_csv — dla roku historii kilkukrotnie szybciej; NULL jako puste pole
+    payload = io.BytesIO()
+    pa_csv.write_csv(pa.Table.from_pandas(segments[SEGMENT_COLUMNS], preserve_index=False), payload,
+                     pa_csv.WriteOptions(include_header=False, quoting_style="none"))
+    with conn.transaction():
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM run_segments WHERE date BETWEEN %s AND %s", (date_from, date_to))
+            copy_sql = sql.SQL("COPY run_segments ({}) FROM STDIN WITH (FORMAT csv)").format(
+                sql.SQL(", ").join(map(sql.Identifier, SEGMENT_COLUMNS)))
+            with cur.copy(copy_sql) as copy:
+                copy.write(payload.getvalue())
+
+
+def _month_ranges(date_from: date, date_to: date) -> Iterator[Tuple[date, date]]:
+    """Dzieli zakres dat na fragmenty w granicach miesięcy (partycji run_stops)."""
+    start = date_from
+    while start <= date_to:
+        next_month = (start.replace(day=1) + timedelta(days=32)).replace(day=1)
+        end = min(next_month - timedelta(days=1), date_to)
+        yield start, end
+        start = end + timedelta(days=1)
+
+
+def _refresh_range(database_url: str, date_from: date, date_to: date, logger: logging.Logger) -> int:
+    """Wczytanie, obliczenie i zapis odcinków jednego fragmentu zakresu (własne połączenie na wątek)."""
+    started_at = time.monotonic()
+    with psycopg.connect(database_url, autocommit=True) as conn:
+        stops = load_stops(conn, date_from, date_to)
+        segments = compute_segments(stops)
+        write_segments(conn, segments, date_from, date_to)
+    logger.info(f"Odcinki {date_from}..{date_to}: {len(stops)} przystanków -> {len(segments)} odcinków "
+                f"({time.monotonic() - started_at:.1f}s).")
+    return len(segments)
+
+
+def refresh_segments(database_url: str, date_from: date, date_to: date, logger: logging.Logger,
+                     workers: int = 4) -> int:
+    """
+    Przelicza tabelę run_segments dla zakresu dat, miesiącami (pamięć zależy od `workers` miesięcy naraz).
+    Miesiące są niezależne (przejazd nie przekracza granicy dnia), więc przetwarzamy je równolegle.
+    Wymaga bezpośredniego połączenia z Postgresem (DATABASE_URL) — COPY nie jest dostępne przez PostgREST.
+    Zwraca liczbę zapisanych odcinków.
+    """
+    ranges = list(_month_ranges(date_from, date_to))
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(ranges)))) as executor:
+        futures = [executor.submit(_refresh_range, database_url, chunk_from, chunk_to, logger)
+                   for chunk_from, chunk_to in ranges]
+        return sum(future.result() for future in futures)
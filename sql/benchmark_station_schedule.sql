@@ -0,0 +1,70 @@
+-- Benchmark tablicy stacji (get_station_schedule): plan i czas zapytania przed i po zmianie indeksów.
+-- Uruchomienie (psql, połączenie bezpośrednie do bazy Supabase):
+--   psql "$DATABASE_URL" -v station='Warszawa Centralna' -v date='2026-06-08' -f sql/benchmark_station_schedule.sql
+-- EXPLAIN na samej funkcji plpgsql pokazuje tylko "Function Scan", dlatego porównujemy jej zapytania wewnętrzne.
+
+\if :{?station}
+\else
+\set station 'Warszawa Centralna'
+\endif
+\if :{?date}
+\else
+\set date 'yesterday'
+\endif
+
+\echo '=== PRZED: filtr ILIKE na nazwie stacji w złączeniu, wszystkie daty stacji przed filtrem tr.date ==='
+EXPLAIN (ANALYZE, BUFFERS)
+SELECT
+    ts.number::TEXT,
+    tc.category_code::TEXT,
+    s_start.name::TEXT,
+    s_end.name::TEXT,
+    rs.scheduled_arrival,
+    rs.scheduled_departure,
+    rs.delay_arrival_min,
+    rs.delay_departure_min
+FROM run_stops rs
+JOIN stations s_limit ON rs.station_id = s_limit.id
+JOIN train_runs tr ON rs.run_id = tr.id
+JOIN train_services ts ON tr.service_id = ts.id
+LEFT JOIN train_categories tc ON ts.category_id = tc.id
+LEFT JOIN stations s_start ON ts.start_station_id = s_start.id
+LEFT JOIN stations s_end ON ts.end_station_id = s_end.id
+WHERE
+    s_limit.name ILIKE :'station'
+    AND tr.date = :'date'::DATE
+ORDER BY
+    COALESCE(rs.scheduled_arrival, rs.scheduled_departure) ASC;
+
+\echo '=== PO: rozwiązanie station_id przez lower(name) ==='
+EXPLAIN (ANALYZE, BUFFERS)
+SELECT s.id FROM stations s WHERE lower(s.name) = lower(:'station') LIMIT 1;
+
+SELECT s.id AS station_id FROM stations s WHERE lower(s.name) = lower(:'station') LIMIT 1 \gset
+
+\echo '=== PO: przejazdy z dnia (date, id) złączone z przystankami stacji (station_id, run_id) ==='
+EXPLAIN (ANALYZE, BUFFERS)
+SELECT
+    ts.number::TEXT,
+    tc.category_code::TEXT,
+    s_start.name::TEXT,
+    s_end.name::TEXT,
+    rs.scheduled_arrival,
+    rs.scheduled_departure,
+    rs.delay_arrival_min,
+    rs.delay_departure_min
+FROM train_runs tr
+JOIN run_stops rs ON rs.run_id = tr.id AND rs.date = tr.date AND rs.station_id = :station_id
+JOIN train_services ts ON tr.service_id = ts.id
+LEFT JOIN train_categories tc ON ts.category_id = tc.id
+LEFT JOIN stations s_start ON ts.start_station_id = s_start.id
+LEFT JOIN stations s_end ON ts.end_station_id = s_end.id
+WHERE tr.date BETWEEN :'date'::DATE AND :'date'::DATE
+    AND rs.date BETWEEN :'date'::DATE AND :'date'::DATE
+ORDER BY
+    COALESCE(rs.scheduled_arrival, rs.scheduled_departure) ASC;
+
+\echo '=== Funkcja end-to-end (czas wykonania) ==='
+\timing on
+SELECT count(*) FROM get_station_schedule(:'station', :'date'::DATE);
+\timing off
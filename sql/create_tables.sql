@@ -11,7 +11,9 @@ CREATE TABLE IF NOT EXISTS stations (
     id SERIAL PRIMARY KEY,
     name TEXT UNIQUE NOT NULL,
     latitude NUMERIC,
-    longitude NUMERIC
+    longitude NUMERIC,
+    is_domestic BOOLEAN DEFAULT TRUE,
+    passenger_volume_rank INTEGER -- 1 = stacja o największej liczbie pasażerów
 );
 COMMENT ON TABLE stations IS 'Unikalna lista wszystkich stacji kolejowych.';
 
@@ -29,19 +31,27 @@ CREATE TABLE IF NOT EXISTS difficulties (
 );
 COMMENT ON TABLE difficulties IS 'Słownik unikalnych opisów utrudnień w ruchu pociągów.';
 
--- przejazdy pociągów
-CREATE TABLE IF NOT EXISTS train_runs (
-    id BIGSERIAL PRIMARY KEY,
+-- pociągi (relacje kursujące pod stałym numerem)
+CREATE TABLE IF NOT EXISTS train_services (
+    id SERIAL PRIMARY KEY,
     number VARCHAR(50) NOT NULL,
     name VARCHAR(255),
+    category_id INTEGER REFERENCES train_categories(id),
     is_domestic BOOLEAN NOT NULL,
+    start_station_id INTEGER REFERENCES stations(id),
+    end_station_id INTEGER REFERENCES stations(id)
+);
+COMMENT ON TABLE train_services IS 'Pociągi: numer, nazwa, kategoria i relacja, wspólne dla wszystkich dni kursowania.';
+
+-- przejazdy pociągów
+CREATE TABLE IF NOT EXISTS train_runs (
+    id BIGSERIAL PRIMARY KEY,
+    service_id INTEGER NOT NULL REFERENCES train_services(id),
     date DATE NOT NULL,
-    category_id INTEGER NOT NULL REFERENCES train_categories(id),
-    start_station_id INTEGER NOT NULL REFERENCES stations(id),
-    end_station_id INTEGER NOT NULL REFERENCES stations(id),
     occupancy_id INTEGER REFERENCES occupancies(id),
+    is_cancelled BOOLEAN DEFAULT FALSE,
 
-    CONSTRAINT uq_train_run UNIQUE (number, date)
+    CONSTRAINT uq_train_run UNIQUE (service_id, date)
 );
 COMMENT ON TABLE train_runs IS 'Główna tabela przechowująca informacje o każdym unikalnym przejeździe pociągu.';
 
@@ -55,7 +65,8 @@ CREATE TABLE IF NOT EXISTS run_stops (
     scheduled_departure TIME,
     delay_arrival_min INTEGER,
     delay_departure_min INTEGER,
-    distance_from_start_km NUMERIC(6, 1) -- np. 99999.9 km
+    distance_from_start_km NUMERIC(6, 1), -- np. 99999.9 km
+    is_cancelled BOOLEAN DEFAULT FALSE
 );
 COMMENT ON TABLE run_stops IS 'Szczegółowa trasa przejazdu z informacjami o każdym przystanku.';
 
@@ -71,9 +82,11 @@ CREATE TABLE IF NOT EXISTS run_stop_difficulties (
 COMMENT ON TABLE run_stop_difficulties IS 'Tabela łącząca przystanki z utrudnieniami (relacja wiele-do-wielu).';
 
 
-CREATE INDEX IF NOT EXISTS idx_train_runs_category_id ON train_runs(category_id);
-CREATE INDEX IF NOT EXISTS idx_train_runs_start_station_id ON train_runs(start_station_id);
-CREATE INDEX IF NOT EXISTS idx_train_runs_end_station_id ON train_runs(end_station_id);
+CREATE INDEX IF NOT EXISTS idx_train_services_category_id ON train_services(category_id);
+CREATE INDEX IF NOT EXISTS idx_train_services_start_station_id ON train_services(start_station_id);
+CREATE INDEX IF NOT EXISTS idx_train_services_end_station_id ON train_services(end_station_id);
+
+CREATE INDEX IF NOT EXISTS idx_train_runs_service_id ON train_runs(service_id);
 
 CREATE INDEX IF NOT EXISTS idx_run_stops_run_id ON run_stops(run_id);
 CREATE INDEX IF NOT EXISTS idx_run_stops_station_id ON run_stops(station_id);
@@ -0,0 +1,16 @@
+-- Wersje modelu predykcji opóźnienia na stacji końcowej (delay_model.py, scripts/train_delay_model.py).
+-- API (/train-runs/{train_id}/prediction) odczytuje najnowszy wiersz i trzyma model w pamięci procesu.
+
+CREATE TABLE IF NOT EXISTS delay_models (
+    id SERIAL PRIMARY KEY,
+    trained_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    date_from DATE NOT NULL,
+    date_to DATE NOT NULL,
+    observations INTEGER NOT NULL,
+    mae NUMERIC(7, 2),
+    baseline_mae NUMERIC(7, 2),
+    model JSONB NOT NULL
+);
+COMMENT ON TABLE delay_models IS 'Wagi modelu liniowego opóźnienia na stacji końcowej (jedna wersja na nocne uczenie).';
+COMMENT ON COLUMN delay_models.mae IS 'Średni błąd bezwzględny (min) na ostatnich 7 dniach okna, przy uczeniu bez nich.';
+COMMENT ON COLUMN delay_models.baseline_mae IS 'Średni błąd prognozy "opóźnienie się nie zmieni" na tych samych dniach.';
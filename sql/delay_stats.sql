@@ -0,0 +1,120 @@
+-- Dzienne statystyki opóźnień (rollupy) dla endpointów /stats w api/main.py.
+--
+-- Każdy dzień jest przeliczany osobno przez refresh_daily_delay_stats(p_date): zapis danych
+-- (save_to_postgres.py, delay_stats.refresh_delay_stats) odświeża tylko dni, których dotyczył,
+-- więc koszt nie rośnie z długością historii. Czyta run_stops jednego dnia (jedna partycja).
+--
+-- Kolejność wdrożenia: create_tables.sql -> partition_by_date.sql -> setup_api.sql -> delay_stats.sql
+-- (korzysta z train_run_summaries utrzymywanej przez setup_api.sql).
+
+-- Opóźnienia liczone są z pomiarów na przystankach (przyjazd, a na stacji początkowej odjazd),
+-- z pominięciem przystanków odwołanych. Wymiary: stacja, numer pociągu, kategoria, godzina rozkładowa.
+CREATE TABLE IF NOT EXISTS daily_delay_stats (
+    date DATE NOT NULL,
+    dimension VARCHAR(16) NOT NULL,
+    key TEXT NOT NULL,
+    runs INTEGER NOT NULL,
+    stops INTEGER NOT NULL,
+    mean_delay NUMERIC(7, 2),
+    median_delay NUMERIC(7, 1),
+    p90_delay NUMERIC(7, 1),
+    delayed_share NUMERIC(5, 4),
+    cancelled_runs INTEGER NOT NULL,
+    cancellation_rate NUMERIC(5, 4) NOT NULL,
+
+    PRIMARY KEY (date, dimension, key),
+    CONSTRAINT chk_daily_delay_stats_dimension CHECK (dimension IN ('station', 'train', 'category', 'hour'))
+);
+COMMENT ON TABLE daily_delay_stats IS 'Dzienne statystyki opóźnień na przystankach wg stacji, numeru pociągu, kategorii i godziny.';
+COMMENT ON COLUMN daily_delay_stats.key IS 'Nazwa stacji, numer pociągu, kod kategorii albo godzina rozkładowa (00-23).';
+COMMENT ON COLUMN daily_delay_stats.stops IS 'Liczba pomiarów opóźnienia (przystanki nieodwołane z podanym opóźnieniem).';
+COMMENT ON COLUMN daily_delay_stats.delayed_share IS 'Udział pomiarów z opóźnieniem powyżej 5 minut (jak is_delayed w tablicy stacji).';
+COMMENT ON COLUMN daily_delay_stats.cancelled_runs IS 'Przejazdy odwołane w całości lub na przystankach należących do grupy.';
+
+-- Rankingi dnia (np. stacje wg p90) oraz szeregi czasowe jednego klucza
+CREATE INDEX IF NOT EXISTS idx_daily_delay_stats_dimension_key_date ON daily_delay_stats (dimension, key, date);
+
+CREATE TABLE IF NOT EXISTS daily_difficulty_stats (
+    date DATE NOT NULL,
+    category TEXT NOT NULL,
+    stops INTEGER NOT NULL,
+    runs INTEGER NOT NULL,
+
+    PRIMARY KEY (date, category)
+);
+COMMENT ON TABLE daily_difficulty_stats IS 'Dzienna liczba zgłoszeń utrudnień wg kategorii (difficulties.description).';
+
+
+CREATE OR REPLACE FUNCTION refresh_daily_delay_stats(p_date DATE)
+RETURNS VOID AS $$
+BEGIN
+    DELETE FROM daily_delay_stats WHERE date = p_date;
+    DELETE FROM daily_difficulty_stats WHERE date = p_date;
+
+    WITH observations AS (
+        SELECT
+            rs.run_id,
+            s.name AS station,
+            trs.number,
+            trs.category,
+            to_char(COALESCE(rs.scheduled_arrival, rs.scheduled_departure), 'HH24') AS hour,
+            (COALESCE(rs.is_cancelled, FALSE) OR trs.is_cancelled) AS is_cancelled,
+            CASE
+                WHEN COALESCE(rs.is_cancelled, FALSE) OR trs.is_cancelled THEN NULL
+                WHEN rs.scheduled_arrival IS NULL THEN rs.delay_departure_min
+                ELSE rs.delay_arrival_min
+            END AS delay
+        FROM run_stops rs
+        JOIN train_run_summaries trs ON trs.run_id = rs.run_id AND trs.date = rs.date
+        JOIN stations s ON rs.station_id = s.id
+        WHERE rs.date = p_date
+            AND trs.date = p_date
+    )
+    INSERT INTO daily_delay_stats (
+        date, dimension, key, runs, stops, mean_delay, median_delay, p90_delay, delayed_share,
+        cancelled_runs, cancellation_rate
+    )
+    SELECT
+        p_date,
+        g.dimension,
+        g.key,
+        COUNT(DISTINCT o.run_id),
+        COUNT(o.delay),
+        ROUND(AVG(o.delay), 2),
+        percentile_cont(0.5) WITHIN GROUP (ORDER BY o.delay),
+        percentile_cont(0.9) WITHIN GROUP (ORDER BY o.delay),
+        ROUND(AVG((o.delay > 5)::INT), 4),
+        COUNT(DISTINCT o.run_id) FILTER (WHERE o.is_cancelled),
+        ROUND(COUNT(DISTINCT o.run_id) FILTER (WHERE o.is_cancelled)::NUMERIC / COUNT(DISTINCT o.run_id), 4)
+    FROM observations o
+    CROSS JOIN LATERAL (VALUES
+        ('station', o.station),
+        ('train', o.number::TEXT),
+        ('category', o.category::TEXT),
+        ('hour', o.hour)
+    ) AS g(dimension, key)
+    WHERE g.key IS NOT NULL
+    GROUP BY g.dimension, g.key;
+
+    INSERT INTO daily_difficulty_stats (date, category, stops, runs)
+    SELECT
+        p_date,
+        d.description,
+        COUNT(*),
+        COUNT(DISTINCT rs.run_id)
+    FROM run_stop_difficulties rsd
+    JOIN run_stops rs ON rs.id = rsd.stop_id AND rs.date = rsd.date
+    JOIN difficulties d ON rsd.difficulty_id = d.id
+    WHERE rsd.date = p_date
+        AND rs.date = p_date
+    GROUP BY d.description;
+END;
+$$ LANGUAGE plpgsql;
+
+
+-- Jednorazowe wypełnienie dla istniejących danych (idempotentne; każdy dzień osobno)
+SELECT refresh_daily_delay_stats(d.date)
+FROM (SELECT DISTINCT date FROM train_run_summaries ORDER BY date) d;
+
+ANALYZE daily_delay_stats;
+ANALYZE daily_difficulty_stats;
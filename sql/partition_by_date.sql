@@ -0,0 +1,121 @@
+-- Migracja: partycjonowanie train_runs i run_stops po dacie (RANGE, partycje miesięczne).
+--
+-- run_stops dostaje zdenormalizowaną kolumnę date (data przejazdu), dzięki czemu zapytania
+-- z filtrem daty (tablica stacji, szczegóły pociągu, łatanie luk) czytają tylko partycje danego miesiąca.
+-- W tabelach partycjonowanych klucz główny musi zawierać klucz partycji, więc klucze obce
+-- do train_runs i run_stops stają się złożone: (run_id, date) i (stop_id, date).
+--
+-- Kolejność wdrożenia (również dla nowej bazy: create_tables.sql -> partition_by_date.sql -> setup_api.sql):
+--   1. psql "$DATABASE_URL" -f sql/partition_by_date.sql
+--   2. psql "$DATABASE_URL" -f sql/setup_api.sql   (odtwarza indeksy, triggery i funkcje na nowych tabelach)
+-- Kod zapisu (save_to_postgres.py) od tej wersji podaje date dla run_stops i run_stop_difficulties.
+
+BEGIN;
+
+-- 1. Odłączenie sekwencji od starych kolumn, aby nie zostały usunięte razem z tabelami
+ALTER SEQUENCE train_runs_id_seq OWNED BY NONE;
+ALTER SEQUENCE run_stops_id_seq OWNED BY NONE;
+
+ALTER TABLE train_runs RENAME TO train_runs_legacy;
+ALTER TABLE run_stops RENAME TO run_stops_legacy;
+-- Nazwy indeksów nie zmieniają się razem z tabelą — zwalniamy nazwy kluczy głównych dla nowych tabel
+ALTER INDEX IF EXISTS train_runs_pkey RENAME TO train_runs_legacy_pkey;
+ALTER INDEX IF EXISTS run_stops_pkey RENAME TO run_stops_legacy_pkey;
+
+
+-- 2. Nowe tabele partycjonowane (te same kolumny i wartości domyślne co dotychczas; LIKE nie kopiuje kluczy obcych)
+CREATE TABLE train_runs (
+    LIKE train_runs_legacy INCLUDING DEFAULTS INCLUDING COMMENTS,
+    PRIMARY KEY (id, date),
+    CONSTRAINT uq_train_runs_service_date UNIQUE (service_id, date),
+    FOREIGN KEY (service_id) REFERENCES train_services (id),
+    FOREIGN KEY (occupancy_id) REFERENCES occupancies (id)
+) PARTITION BY RANGE (date);
+
+CREATE TABLE run_stops (
+    LIKE run_stops_legacy INCLUDING DEFAULTS INCLUDING COMMENTS,
+    date DATE NOT NULL,
+    PRIMARY KEY (id, date),
+    FOREIGN KEY (run_id, date) REFERENCES train_runs (id, date) ON DELETE CASCADE,
+    FOREIGN KEY (station_id) REFERENCES stations (id)
+) PARTITION BY RANGE (date);
+COMMENT ON COLUMN run_stops.date IS 'Data przejazdu (kopia train_runs.date) — klucz partycji.';
+
+ALTER SEQUENCE train_runs_id_seq OWNED BY train_runs.id;
+ALTER SEQUENCE run_stops_id_seq OWNED BY run_stops.id;
+
+
+-- 3. Zarządzanie partycjami: partycje miesięczne tworzone z wyprzedzeniem (wywoływane także przez save_data),
+-- partycja domyślna tylko jako zabezpieczenie przed odrzuceniem zapisu.
+CREATE OR REPLACE FUNCTION create_date_partitions(p_from DATE, p_to DATE)
+RETURNS VOID AS $$
+DECLARE
+    v_month DATE := date_trunc('month', p_from)::DATE;
+    v_table TEXT;
+BEGIN
+    WHILE v_month <= p_to LOOP
+        FOREACH v_table IN ARRAY ARRAY['train_runs', 'run_stops'] LOOP
+            EXECUTE format(
+                'CREATE TABLE IF NOT EXISTS %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                v_table || '_' || to_char(v_month, 'YYYY_MM'),
+                v_table,
+                v_month,
+                (v_month + INTERVAL '1 month')::DATE
+            );
+        END LOOP;
+        v_month := (v_month + INTERVAL '1 month')::DATE;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT create_date_partitions(
+    LEAST((SELECT MIN(date) FROM train_runs_legacy), CURRENT_DATE),
+    (CURRENT_DATE + INTERVAL '3 months')::DATE
+);
+
+CREATE TABLE IF NOT EXISTS train_runs_default PARTITION OF train_runs DEFAULT;
+CREATE TABLE IF NOT EXISTS run_stops_default PARTITION OF run_stops DEFAULT;
+
+
+-- 4. Przeniesienie danych
+INSERT INTO train_runs SELECT * FROM train_runs_legacy;
+
+INSERT INTO run_stops
+SELECT rs.*, tr.date
+FROM run_stops_legacy rs
+JOIN train_runs_legacy tr ON tr.id = rs.run_id;
+
+
+-- 5. Tabele zależne: klucze obce przepinane na klucze złożone
+ALTER TABLE run_stop_difficulties ADD COLUMN IF NOT EXISTS date DATE;
+
+UPDATE run_stop_difficulties rsd
+SET date = rs.date
+FROM run_stops rs
+WHERE rs.id = rsd.stop_id;
+
+ALTER TABLE run_stop_difficulties ALTER COLUMN date SET NOT NULL;
+
+DROP TABLE run_stops_legacy CASCADE;
+DROP TABLE train_runs_legacy CASCADE;
+
+ALTER TABLE run_stop_difficulties
+    ADD CONSTRAINT run_stop_difficulties_stop_fkey
+    FOREIGN KEY (stop_id, date) REFERENCES run_stops (id, date) ON DELETE CASCADE;
+
+-- train_run_summaries istnieje, jeśli setup_api.sql był już wcześniej uruchomiony
+DO $$
+BEGIN
+    IF to_regclass('train_run_summaries') IS NOT NULL THEN
+        ALTER TABLE train_run_summaries
+            ADD CONSTRAINT train_run_summaries_run_fkey
+            FOREIGN KEY (run_id, date) REFERENCES train_runs (id, date) ON DELETE CASCADE;
+    END IF;
+END;
+$$;
+
+COMMIT;
+
+ANALYZE train_runs;
+ANALYZE run_stops;
+ANALYZE run_stop_difficulties;
@@ -0,0 +1,59 @@
+-- Ostateczność przejazdu (save_to_postgres._is_run_final, scripts/patch_delays.py).
+-- is_final = TRUE, gdy trasę pobrano po rzeczywistym przyjeździe pociągu na stację końcową
+-- (planowy przyjazd plus opóźnienie) — późniejsze pobranie nie zmieni już opóźnień.
+-- Nocne łatanie z --overwrite pobiera ponownie tylko przejazdy nieostateczne i brakujące.
+
+ALTER TABLE train_runs ADD COLUMN IF NOT EXISTS is_final BOOLEAN NOT NULL DEFAULT FALSE;
+COMMENT ON COLUMN train_runs.is_final IS 'Trasa pobrana po rzeczywistym przyjeździe na stację końcową; nocne łatanie ją pomija.';
+
+-- Dotychczasowe dni z trasą przeszły już nocne łatanie (pobranie następnego dnia, po przyjeździe pociągów)
+UPDATE train_runs tr
+SET is_final = TRUE
+WHERE tr.date < CURRENT_DATE - 1
+  AND NOT tr.is_final
+  AND EXISTS (SELECT 1 FROM run_stops rs WHERE rs.run_id = tr.id AND rs.date = tr.date);
+
+ANALYZE train_runs;
+
+
+-- Plan nocnego łatania dla wielu dni jednym zapytaniem (scripts/patch_delays.py): przejazdy do ponownego
+-- pobrania razem z polami usługi. reason:
+--   'no_stops'  — przejazd bez trasy (anty-złączenie z run_stops),
+--   'not_final' / 'final' — przejazd z trasą, tylko przy p_overwrite ('final' tylko z p_include_final),
+--   'no_runs'   — dzień bez żadnego przejazdu w bazie: usługi jeżdżące w ciągu 7 dni przed i po nim.
+CREATE OR REPLACE FUNCTION patch_delay_targets(p_dates DATE[], p_overwrite BOOLEAN DEFAULT FALSE,
+                                               p_include_final BOOLEAN DEFAULT FALSE)
+RETURNS TABLE (date DATE, reason TEXT, service_id INTEGER, number TEXT, name TEXT, category_id INTEGER,
+               is_domestic BOOLEAN, start_station_id INTEGER, end_station_id INTEGER) AS $$
+DECLARE
+    v_from DATE := (SELECT min(d) FROM unnest(p_dates) d);
+    v_to DATE := (SELECT max(d) FROM unnest(p_dates) d);
+BEGIN
+    RETURN QUERY
+    WITH runs AS (
+        -- Zakres dat zawęża przeszukiwane partycje, lista dat wybiera dni
+        SELECT tr.id, tr.date, tr.service_id, tr.is_final
+        FROM train_runs tr
+        WHERE tr.date BETWEEN v_from AND v_to AND tr.date = ANY(p_dates)
+    ), targets AS (
+        SELECT r.date, 'no_stops'::TEXT AS reason, r.service_id
+        FROM runs r
+        WHERE NOT EXISTS (SELECT 1 FROM run_stops rs WHERE rs.run_id = r.id AND rs.date = r.date)
+        UNION ALL
+        SELECT r.date, CASE WHEN r.is_final THEN 'final' ELSE 'not_final' END, r.service_id
+        FROM runs r
+        WHERE p_overwrite AND (p_include_final OR NOT r.is_final)
+          AND EXISTS (SELECT 1 FROM run_stops rs WHERE rs.run_id = r.id AND rs.date = r.date)
+        UNION ALL
+        SELECT DISTINCT d.day, 'no_runs', tr.service_id
+        FROM unnest(p_dates) d(day)
+        JOIN train_runs tr ON tr.date BETWEEN d.day - 7 AND d.day + 7
+        WHERE NOT EXISTS (SELECT 1 FROM runs r WHERE r.date = d.day)
+    )
+    SELECT t.date, t.reason, ts.id, ts.number::TEXT, ts.name::TEXT, ts.category_id, ts.is_domestic,
+           ts.start_station_id, ts.end_station_id
+    FROM targets t
+    JOIN train_services ts ON ts.id = t.service_id
+    ORDER BY t.date, ts.number;
+END;
+$$ LANGUAGE plpgsql STABLE;
@@ -0,0 +1,158 @@
+-- Kolejka pobierania opóźnień (scrape_queue.py, scripts/scrape_worker.py).
+-- get_train_data.py wstawia jeden wiersz na pociąg i dzień, a dowolna liczba bezstanowych workerów pobiera
+-- paczki przez claim_scrape_tasks (FOR UPDATE SKIP LOCKED — dwie maszyny nigdy nie dostaną tego samego pociągu).
+-- Dzierżawa (lease) wygasa po p_lease_seconds: zadanie workera, który padł w trakcie, wraca do puli
+-- przy najbliższym claim_scrape_tasks, bez osobnego procesu sprzątającego.
+-- not_before: zadanie jest wydawane dopiero po tej chwili — get_train_data.py rano dodaje cały dzień
+-- z czasem tuż po planowym przyjeździe każdego pociągu na stację końcową (scheduled_final_arrivals),
+-- a workery uruchamiane co kilkanaście minut pobierają pociągi, które właśnie dojechały.
+
+CREATE TABLE IF NOT EXISTS scrape_queue (
+    id BIGSERIAL PRIMARY KEY,
+    date DATE NOT NULL,
+    number VARCHAR(50) NOT NULL,
+    train JSONB NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'leased', 'done', 'failed')),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    leased_by TEXT,
+    lease_expires_at TIMESTAMPTZ,
+    last_error TEXT,
+    enqueued_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    finished_at TIMESTAMPTZ,
+    CONSTRAINT uq_scrape_queue UNIQUE (date, number)
+);
+COMMENT ON TABLE scrape_queue IS 'Pociągi do pobrania z portalu pasażera; jeden wiersz na pociąg i dzień.';
+COMMENT ON COLUMN scrape_queue.train IS 'Rekord pociągu z get_train_data.py (wejście get_delays).';
+COMMENT ON COLUMN scrape_queue.attempts IS 'Liczba pobrań zadania przez workery, także tych przerwanych wygaśnięciem dzierżawy.';
+
+ALTER TABLE scrape_queue ADD COLUMN IF NOT EXISTS not_before TIMESTAMPTZ NOT NULL DEFAULT now();
+COMMENT ON COLUMN scrape_queue.not_before IS 'Najwcześniejsza chwila pobrania: po planowym przyjeździe na stację końcową albo po przerwie przed ponowieniem.';
+
+-- Częściowy indeks: claim przegląda tylko zadania do zrobienia, nie całą historię
+DROP INDEX IF EXISTS idx_scrape_queue_open;
+CREATE INDEX IF NOT EXISTS idx_scrape_queue_due ON scrape_queue (not_before, id)
+    WHERE status IN ('pending', 'leased');
+
+
+-- Dodaje pociągi dnia do kolejki: p_tasks to tablica {"train": rekord pociągu, "not_before": czas albo null}.
+-- Ponowne uruchomienie dla tego samego dnia odświeża zadania, które nie są właśnie przetwarzane
+-- (także zakończone — ręczne ponowienie scrapowania ma je pobrać jeszcze raz).
+DROP FUNCTION IF EXISTS enqueue_scrape_tasks(JSONB);
+CREATE OR REPLACE FUNCTION enqueue_scrape_tasks(p_tasks JSONB)
+RETURNS INTEGER AS $$
+DECLARE
+    v_count INTEGER;
+BEGIN
+    INSERT INTO scrape_queue (date, number, train, not_before)
+    SELECT (t->'train'->>'date')::DATE, t->'train'->>'number', t->'train', coalesce((t->>'not_before')::TIMESTAMPTZ, now())
+    FROM jsonb_array_elements(p_tasks) t
+    WHERE t->'train'->>'number' IS NOT NULL AND t->'train'->>'date' IS NOT NULL
+    ON CONFLICT (date, number) DO UPDATE
+    SET train = EXCLUDED.train,
+        not_before = EXCLUDED.not_before,
+        status = 'pending',
+        attempts = 0,
+        leased_by = NULL,
+        lease_expires_at = NULL,
+        last_error = NULL,
+        enqueued_at = now(),
+        finished_at = NULL
+    WHERE scrape_queue.status <> 'leased' OR scrape_queue.lease_expires_at < now();
+
+    GET DIAGNOSTICS v_count = ROW_COUNT;
+    RETURN v_count;
+END;
+$$ LANGUAGE plpgsql;
+
+
+-- Planowy odjazd ze stacji początkowej i przyjazd na stację końcową każdego z pociągów według jego
+-- ostatniego przejazdu z trasą w ciągu 14 dni przed p_date (rozkład zmienia się rzadko; okno ogranicza
+-- przeszukiwane partycje). Przyjazd wcześniejszy niż odjazd oznacza przyjazd następnego dnia.
+CREATE OR REPLACE FUNCTION scheduled_final_arrivals(p_date DATE, p_numbers TEXT[])
+RETURNS TABLE (number TEXT, scheduled_departure TIME, scheduled_arrival TIME) AS $$
+    SELECT DISTINCT ON (ts.number) ts.number::TEXT, first_stop.scheduled_departure, last_stop.scheduled_arrival
+    FROM train_services ts
+    JOIN train_runs tr ON tr.service_id = ts.id
+    JOIN LATERAL (
+        SELECT rs.scheduled_departure FROM run_stops rs
+        WHERE rs.run_id = tr.id AND rs.date = tr.date
+        ORDER BY rs.stop_order LIMIT 1
+    ) first_stop ON TRUE
+    JOIN LATERAL (
+        SELECT rs.scheduled_arrival FROM run_stops rs
+        WHERE rs.run_id = tr.id AND rs.date = tr.date
+        ORDER BY rs.stop_order DESC LIMIT 1
+    ) last_stop ON TRUE
+    WHERE ts.number = ANY(p_numbers)
+      AND tr.date BETWEEN p_date - 14 AND p_date - 1
+      AND last_stop.scheduled_arrival IS NOT NULL
+    ORDER BY ts.number, tr.date DESC;
+$$ LANGUAGE sql STABLE;
+
+
+-- Pobiera do p_limit zadań dla workera: oczekujące oraz te, których dzierżawa wygasła (worker padł).
+-- Zadanie z wygasłą dzierżawą i wyczerpanym limitem prób wraca z give_up = TRUE: worker go nie pobiera,
+-- tylko zapisuje pociąg bez trasy (nocne łatanie go uzupełni) i oznacza zadanie jako failed.
+CREATE OR REPLACE FUNCTION claim_scrape_tasks(p_worker TEXT, p_limit INTEGER DEFAULT 10, p_lease_seconds INTEGER DEFAULT 900)
+RETURNS TABLE (id BIGINT, date DATE, number VARCHAR, train JSONB, attempts INTEGER, give_up BOOLEAN) AS $$
+BEGIN
+    RETURN QUERY
+    WITH claimed AS (
+        SELECT q.id, q.attempts >= q.max_attempts AS give_up
+        FROM scrape_queue q
+        WHERE (q.status = 'pending' AND q.not_before <= now())
+           OR (q.status = 'leased' AND q.lease_expires_at < now())
+        ORDER BY q.not_before, q.id
+        LIMIT p_limit
+        FOR UPDATE SKIP LOCKED
+    )
+    UPDATE scrape_queue q
+    SET status = 'leased',
+        attempts = CASE WHEN claimed.give_up THEN q.attempts ELSE q.attempts + 1 END,
+        leased_by = p_worker,
+        lease_expires_at = now() + make_interval(secs => p_lease_seconds)
+    FROM claimed
+    WHERE q.id = claimed.id
+    RETURNING q.id, q.date, q.number, q.train, q.attempts, claimed.give_up;
+END;
+$$ LANGUAGE plpgsql;
+
+
+-- Kończy zadanie z wynikiem. Zwraca FALSE, jeśli dzierżawę przejął już inny worker (wynik jest wtedy pomijany).
+CREATE OR REPLACE FUNCTION complete_scrape_task(p_id BIGINT, p_worker TEXT)
+RETURNS BOOLEAN AS $$
+    UPDATE scrape_queue
+    SET status = 'done', leased_by = NULL, lease_expires_at = NULL, last_error = NULL, finished_at = now()
+    WHERE id = p_id AND status = 'leased' AND leased_by = p_worker
+    RETURNING TRUE;
+$$ LANGUAGE sql;
+
+
+-- Zwraca nieudane zadanie do puli albo, po wyczerpaniu prób, oznacza je jako failed.
+-- Ponowienie jest wydawane najwcześniej po 5 minutach, żeby chwilowy błąd portalu zdążył minąć.
+-- Zwraca nowy status albo NULL, jeśli dzierżawę przejął już inny worker.
+CREATE OR REPLACE FUNCTION fail_scrape_task(p_id BIGINT, p_worker TEXT, p_error TEXT)
+RETURNS TEXT AS $$
+    UPDATE scrape_queue
+    SET status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'pending' END,
+        leased_by = NULL,
+        lease_expires_at = NULL,
+        last_error = p_error,
+        not_before = now() + INTERVAL '5 minutes',
+        finished_at = CASE WHEN attempts >= max_attempts THEN now() END
+    WHERE id = p_id AND status = 'leased' AND leased_by = p_worker
+    RETURNING status;
+$$ LANGUAGE sql;
+
+
+-- Liczba zadań w każdym stanie: dla dnia albo (p_date NULL) tylko otwartych zadań ze wszystkich dni.
+-- Zadania oczekujące na swój czas (not_before w przyszłości) mają stan 'scheduled'.
+-- Worker kończy pracę, gdy nie ma zadań do wydania teraz ani dzierżaw, które mogłyby jeszcze wygasnąć.
+CREATE OR REPLACE FUNCTION scrape_queue_status(p_date DATE DEFAULT NULL)
+RETURNS TABLE (status TEXT, tasks BIGINT) AS $$
+    SELECT CASE WHEN q.status = 'pending' AND q.not_before > now() THEN 'scheduled' ELSE q.status END, count(*)
+    FROM scrape_queue q
+    WHERE (p_date IS NULL AND q.status IN ('pending', 'leased')) OR q.date = p_date
+    GROUP BY 1;
+$$ LANGUAGE sql STABLE;
@@ -0,0 +1,113 @@
+-- Syntetyczne dane do testów obciążeniowych API (scripts/benchmark_api.py).
+-- TYLKO dla pustej, lokalnej bazy ze schematem (create_tables.sql, partition_by_date.sql, setup_api.sql):
+--   psql "$BENCHMARK_DATABASE_URL" -v date_from='2025-10-01' -v days=30 -v services=500 -f sql/seed_benchmark.sql
+-- Stacje "Stacja 1".."Stacja N" mają rangę pasażerską równą numerowi; co trzeci przystanek pośredni wypada na jednej
+-- z 20 największych stacji, więc ich tablice są dłuższe, jak w prawdziwych danych. Numery pociągów: 60001, 60002, ...
+-- Podsumowania przejazdów (train_run_summaries) wypełniają wyzwalacze z setup_api.sql.
+
+\set ON_ERROR_STOP on
+
+\if :{?date_from}
+\else
+\set date_from '2025-10-01'
+\endif
+\if :{?days}
+\else
+\set days 30
+\endif
+\if :{?services}
+\else
+\set services 500
+\endif
+\if :{?stations}
+\else
+\set stations 400
+\endif
+\if :{?stops}
+\else
+\set stops 15
+\endif
+
+SELECT EXISTS (SELECT 1 FROM train_runs) AS has_runs \gset
+\if :has_runs
+\echo 'Baza zawiera już przejazdy — seed jest przeznaczony tylko dla pustej bazy testowej. Przerywam.'
+\quit
+\endif
+
+BEGIN;
+
+SELECT create_date_partitions(:'date_from'::DATE, :'date_from'::DATE + :days);
+
+INSERT INTO train_categories (category_code) VALUES ('IC'), ('TLK'), ('EIC'), ('EIP')
+ON CONFLICT DO NOTHING;
+INSERT INTO occupancies (status_description) VALUES ('Niska frekwencja'), ('Średnia frekwencja'), ('Wysoka frekwencja')
+ON CONFLICT DO NOTHING;
+INSERT INTO difficulties (description) VALUES ('Awaria taboru'), ('Utrudnienia na szlaku'), ('Prace torowe')
+ON CONFLICT DO NOTHING;
+
+INSERT INTO stations (name, is_domestic, passenger_volume_rank)
+SELECT 'Stacja ' || g, TRUE, g
+FROM generate_series(1, :stations) g
+ON CONFLICT DO NOTHING;
+
+-- Stacja przystanku o-tego pociągu s (te same wzory przy usługach i przystankach)
+CREATE TEMP TABLE bench_route ON COMMIT DROP AS
+SELECT s AS service_no,
+       o AS stop_order,
+       (SELECT id FROM stations WHERE name = 'Stacja ' || CASE
+            WHEN o % 3 = 0 AND o < :stops THEN 1 + (s + o) % 20
+            ELSE 1 + (s * 37 + o * 11) % :stations
+        END) AS station_id
+FROM generate_series(1, :services) s, generate_series(1, :stops) o;
+
+INSERT INTO train_services (number, name, category_id, is_domestic, start_station_id, end_station_id)
+SELECT (60000 + s)::TEXT,
+       'BENCHMARK ' || s,
+       (SELECT id FROM train_categories ORDER BY id OFFSET s % 4 LIMIT 1),
+       TRUE,
+       (SELECT station_id FROM bench_route WHERE service_no = s AND stop_order = 1),
+       (SELECT station_id FROM bench_route WHERE service_no = s AND stop_order = :stops)
+FROM generate_series(1, :services) s;
+
+INSERT INTO train_runs (service_id, date, occupancy_id, is_cancelled)
+SELECT ts.id,
+       d::DATE,
+       (SELECT id FROM occupancies ORDER BY id OFFSET (ts.id + extract(day FROM d)::INT) % 3 LIMIT 1),
+       (ts.id * 7 + extract(day FROM d)::INT) % 97 = 0
+FROM train_services ts, generate_series(:'date_from'::DATE, :'date_from'::DATE + (:days - 1), '1 day') d
+WHERE ts.name LIKE 'BENCHMARK %';
+
+-- Odjazd ze stacji początkowej między 4:00 a 19:59, kolejne przystanki co 12 minut
+INSERT INTO run_stops (run_id, station_id, stop_order, scheduled_arrival, scheduled_departure,
+                       delay_arrival_min, delay_departure_min, distance_from_start_km, is_cancelled, date)
+SELECT tr.id,
+       br.station_id,
+       br.stop_order,
+       CASE WHEN br.stop_order > 1
+            THEN TIME '04:00' + make_interval(mins => (s.no % 16) * 60 + (s.no * 7) % 60 + br.stop_order * 12 - 1) END,
+       CASE WHEN br.stop_order < :stops
+            THEN TIME '04:00' + make_interval(mins => (s.no % 16) * 60 + (s.no * 7) % 60 + br.stop_order * 12) END,
+       (tr.id + br.stop_order * 3) % 25,
+       (tr.id + br.stop_order * 3) % 26,
+       br.stop_order * 18.5,
+       tr.is_cancelled,
+       tr.date
+FROM train_runs tr
+JOIN train_services ts ON ts.id = tr.service_id
+CROSS JOIN LATERAL (SELECT ts.number::INT - 60000 AS no) s
+JOIN bench_route br ON br.service_no = s.no
+WHERE ts.name LIKE 'BENCHMARK %';
+
+INSERT INTO run_stop_difficulties (stop_id, difficulty_id, location, date)
+SELECT rs.id,
+       (SELECT id FROM difficulties ORDER BY id OFFSET rs.id % 3 LIMIT 1),
+       'Odcinek testowy',
+       rs.date
+FROM run_stops rs
+WHERE rs.id % 40 = 0;
+
+COMMIT;
+
+ANALYZE;
+
+SELECT count(*) AS train_runs, min(date) AS date_from, max(date) AS date_to FROM train_runs;
@@ -0,0 +1,32 @@
+-- Przyrosty opóźnień na odcinkach tras (między kolejnymi przystankami przejazdu).
+--
+-- run_stops przechowuje tylko bezwzględne opóźnienie na każdym przystanku; tabela run_segments
+-- mówi, gdzie na trasie opóźnienie narasta, a gdzie jest odrabiane. Wypełnia ją segment_delays.py
+-- (scripts/compute_segment_delays.py) — obliczenia na tablicach NumPy dla całych miesięcy naraz.
+--
+-- Tabela jest pochodna (zawsze odtwarzana z run_stops dla całych dni), więc nie ma kluczy obcych:
+-- sprawdzanie ich dla każdego wiersza COPY wielokrotnie wydłużało przeliczenie roku historii.
+
+CREATE TABLE IF NOT EXISTS run_segments (
+    run_id BIGINT NOT NULL,
+    date DATE NOT NULL,
+    from_stop_order INTEGER NOT NULL,
+    from_station_id INTEGER NOT NULL,
+    to_station_id INTEGER NOT NULL,
+    distance_km NUMERIC(6, 1),
+    scheduled_running_min INTEGER,
+    delay_gain_min INTEGER,
+    dwell_overrun_min INTEGER,
+    recovery_min INTEGER,
+
+    -- Data na początku klucza: przeliczenie zakresu dat usuwa stare odcinki po indeksie klucza głównego
+    PRIMARY KEY (date, run_id, from_stop_order)
+);
+COMMENT ON TABLE run_segments IS 'Odcinki przejazdów (przystanek -> następny przystanek) z przyrostem opóźnienia, przedłużonym postojem i odrobionym czasem.';
+COMMENT ON COLUMN run_segments.scheduled_running_min IS 'Rozkładowy czas jazdy: odjazd z from_station -> przyjazd do to_station (z przejściem przez północ).';
+COMMENT ON COLUMN run_segments.delay_gain_min IS 'Zmiana opóźnienia w czasie jazdy: opóźnienie przyjazdu do to_station minus opóźnienie odjazdu z from_station.';
+COMMENT ON COLUMN run_segments.dwell_overrun_min IS 'Przedłużenie postoju na to_station (wzrost opóźnienia między przyjazdem a odjazdem); NULL na stacji końcowej.';
+COMMENT ON COLUMN run_segments.recovery_min IS 'Minuty odrobione na odcinku: w czasie jazdy i przez skrócony postój na to_station.';
+
+-- Analizy odcinków (np. najgorsze odcinki w okresie)
+CREATE INDEX IF NOT EXISTS idx_run_segments_stations_date ON run_segments (from_station_id, to_station_id, date);
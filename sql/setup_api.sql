@@ -2,33 +2,185 @@ CREATE INDEX IF NOT EXISTS idx_train_runs_date ON train_runs (date);
 CREATE INDEX IF NOT EXISTS idx_train_runs_service_id ON train_runs (service_id);
 CREATE INDEX IF NOT EXISTS idx_train_services_number ON train_services (number);
 CREATE INDEX IF NOT EXISTS idx_run_stops_scheduled_arrival ON run_stops (scheduled_arrival);
-CREATE INDEX IF NOT EXISTS idx_run_stops_station_id ON run_stops (station_id);
-
-
-
-CREATE OR REPLACE VIEW view_train_summaries AS
-SELECT 
-    tr.id AS internal_id,
-    to_char(tr.date, 'YYYYMMDD') || ts.number AS id,
-    tr.date,
-    ts.number,
-    ts.name,
-    tc.category_code AS category,
-    s_start.name AS from_station,
-    s_end.name AS to_station,
-    ts.is_domestic,
-    occ.status_description AS occupancy,
-    
-    (SELECT rs.scheduled_departure FROM run_stops rs WHERE rs.run_id = tr.id ORDER BY rs.stop_order ASC LIMIT 1) AS scheduled_departure,
-    (SELECT rs.scheduled_arrival FROM run_stops rs WHERE rs.run_id = tr.id ORDER BY rs.stop_order DESC LIMIT 1) AS scheduled_arrival,
-    (SELECT COALESCE(rs.delay_arrival_min, 0) FROM run_stops rs WHERE rs.run_id = tr.id ORDER BY rs.stop_order DESC LIMIT 1) AS delay_at_destination
-
-FROM train_runs tr
-JOIN train_services ts ON tr.service_id = ts.id
-LEFT JOIN train_categories tc ON ts.category_id = tc.id
-LEFT JOIN stations s_start ON ts.start_station_id = s_start.id
-LEFT JOIN stations s_end ON ts.end_station_id = s_end.id
-LEFT JOIN occupancies occ ON tr.occupancy_id = occ.id;
+-- Tablica stacji: wyszukanie stacji bez względu na wielkość liter, a następnie jej przystanków
+-- w obrębie przejazdów z danego dnia. Indeks (station_id, run_id) zastępuje samodzielny indeks na station_id.
+CREATE INDEX IF NOT EXISTS idx_stations_name_lower ON stations (lower(name));
+CREATE INDEX IF NOT EXISTS idx_run_stops_station_id_run_id ON run_stops (station_id, run_id);
+CREATE INDEX IF NOT EXISTS idx_train_runs_date_id ON train_runs (date, id);
+DROP INDEX IF EXISTS idx_run_stops_station_id;
+
+
+
+CREATE INDEX IF NOT EXISTS idx_run_stops_run_id_stop_order ON run_stops (run_id, stop_order);
+
+
+-- Zakłada schemat partycjonowany po dacie (sql/partition_by_date.sql uruchomiony wcześniej).
+
+-- Zmaterializowane podsumowania przejazdów. Wcześniej view_train_summaries liczył pierwszy/ostatni
+-- przystanek trzema skorelowanymi podzapytaniami na każdy przejazd przy każdym zapytaniu do API.
+-- Tabela jest utrzymywana triggerami na run_stops, train_runs i train_services.
+CREATE TABLE IF NOT EXISTS train_run_summaries (
+    run_id BIGINT PRIMARY KEY,
+    date DATE NOT NULL,
+    number VARCHAR(50) NOT NULL,
+    name VARCHAR(255),
+    category VARCHAR(10),
+    from_station TEXT,
+    to_station TEXT,
+    is_domestic BOOLEAN NOT NULL,
+    occupancy TEXT,
+    is_cancelled BOOLEAN NOT NULL DEFAULT FALSE,
+    scheduled_departure TIME,
+    scheduled_arrival TIME,
+    delay_at_destination INTEGER,
+
+    FOREIGN KEY (run_id, date) REFERENCES train_runs (id, date) ON DELETE CASCADE
+);
+COMMENT ON TABLE train_run_summaries IS 'Zdenormalizowane podsumowanie przejazdu (pierwszy/ostatni przystanek) utrzymywane triggerami.';
+
+CREATE INDEX IF NOT EXISTS idx_train_run_summaries_date_number ON train_run_summaries (date, number);
+-- Wyszukiwanie po prefiksie numeru (LIKE '38%') w obrębie dnia, niezależnie od collation bazy
+CREATE INDEX IF NOT EXISTS idx_train_run_summaries_date_number_prefix ON train_run_summaries (date, number varchar_pattern_ops);
+
+
+CREATE OR REPLACE FUNCTION refresh_train_run_summaries(p_run_ids BIGINT[])
+RETURNS VOID AS $$
+    INSERT INTO train_run_summaries AS trs (
+        run_id, date, number, name, category, from_station, to_station, is_domestic, occupancy,
+        is_cancelled, scheduled_departure, scheduled_arrival, delay_at_destination
+    )
+    SELECT
+        tr.id,
+        tr.date,
+        ts.number,
+        ts.name,
+        tc.category_code,
+        s_start.name,
+        s_end.name,
+        ts.is_domestic,
+        occ.status_description,
+        COALESCE(tr.is_cancelled, FALSE),
+        first_stop.scheduled_departure,
+        last_stop.scheduled_arrival,
+        CASE WHEN last_stop.run_id IS NULL THEN NULL ELSE COALESCE(last_stop.delay_arrival_min, 0) END
+    FROM train_runs tr
+    JOIN train_services ts ON tr.service_id = ts.id
+    LEFT JOIN train_categories tc ON ts.category_id = tc.id
+    LEFT JOIN stations s_start ON ts.start_station_id = s_start.id
+    LEFT JOIN stations s_end ON ts.end_station_id = s_end.id
+    LEFT JOIN occupancies occ ON tr.occupancy_id = occ.id
+    LEFT JOIN LATERAL (
+        SELECT rs.scheduled_departure FROM run_stops rs WHERE rs.run_id = tr.id AND rs.date = tr.date ORDER BY rs.stop_order ASC LIMIT 1
+    ) first_stop ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT rs.run_id, rs.scheduled_arrival, rs.delay_arrival_min FROM run_stops rs WHERE rs.run_id = tr.id AND rs.date = tr.date ORDER BY rs.stop_order DESC LIMIT 1
+    ) last_stop ON TRUE
+    WHERE tr.id = ANY(p_run_ids)
+    ON CONFLICT (run_id) DO UPDATE SET
+        date = EXCLUDED.date,
+        number = EXCLUDED.number,
+        name = EXCLUDED.name,
+        category = EXCLUDED.category,
+        from_station = EXCLUDED.from_station,
+        to_station = EXCLUDED.to_station,
+        is_domestic = EXCLUDED.is_domestic,
+        occupancy = EXCLUDED.occupancy,
+        is_cancelled = EXCLUDED.is_cancelled,
+        scheduled_departure = EXCLUDED.scheduled_departure,
+        scheduled_arrival = EXCLUDED.scheduled_arrival,
+        delay_at_destination = EXCLUDED.delay_at_destination;
+$$ LANGUAGE sql;
+
+
+-- Triggery na poziomie instrukcji (z tabelami przejściowymi): zbiorczy insert przystanków
+-- z save_data odświeża podsumowanie raz na instrukcję, a nie raz na każdy przystanek.
+CREATE OR REPLACE FUNCTION trg_refresh_summaries_from_new_stops()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM refresh_train_run_summaries(ARRAY(SELECT DISTINCT run_id FROM new_rows));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION trg_refresh_summaries_from_old_stops()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM refresh_train_run_summaries(ARRAY(SELECT DISTINCT run_id FROM old_rows));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION trg_refresh_summaries_from_runs()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM refresh_train_run_summaries(ARRAY(SELECT id FROM new_rows));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION trg_refresh_summaries_from_services()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM refresh_train_run_summaries(ARRAY(
+        SELECT tr.id FROM train_runs tr JOIN new_rows n ON tr.service_id = n.id
+    ));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS run_stops_summaries_insert ON run_stops;
+CREATE TRIGGER run_stops_summaries_insert AFTER INSERT ON run_stops
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION trg_refresh_summaries_from_new_stops();
+
+DROP TRIGGER IF EXISTS run_stops_summaries_update ON run_stops;
+CREATE TRIGGER run_stops_summaries_update AFTER UPDATE ON run_stops
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION trg_refresh_summaries_from_new_stops();
+
+DROP TRIGGER IF EXISTS run_stops_summaries_delete ON run_stops;
+CREATE TRIGGER run_stops_summaries_delete AFTER DELETE ON run_stops
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION trg_refresh_summaries_from_old_stops();
+
+DROP TRIGGER IF EXISTS train_runs_summaries_insert ON train_runs;
+CREATE TRIGGER train_runs_summaries_insert AFTER INSERT ON train_runs
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION trg_refresh_summaries_from_runs();
+
+DROP TRIGGER IF EXISTS train_runs_summaries_update ON train_runs;
+CREATE TRIGGER train_runs_summaries_update AFTER UPDATE ON train_runs
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION trg_refresh_summaries_from_runs();
+
+DROP TRIGGER IF EXISTS train_services_summaries_update ON train_services;
+CREATE TRIGGER train_services_summaries_update AFTER UPDATE ON train_services
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION trg_refresh_summaries_from_services();
+
+-- Jednorazowe wypełnienie dla istniejących danych (idempotentne)
+SELECT refresh_train_run_summaries(ARRAY(SELECT id FROM train_runs));
+
+
+DROP VIEW IF EXISTS view_train_summaries;
+
+CREATE VIEW view_train_summaries AS
+SELECT
+    trs.run_id AS internal_id,
+    to_char(trs.date, 'YYYYMMDD') || trs.number AS id,
+    trs.date,
+    trs.number,
+    trs.name,
+    trs.category,
+    trs.from_station,
+    trs.to_station,
+    trs.is_domestic,
+    trs.occupancy,
+    trs.scheduled_departure,
+    trs.scheduled_arrival,
+    trs.delay_at_destination,
+    trs.is_cancelled
+FROM train_run_summaries trs;
 
 
 DROP FUNCTION IF EXISTS get_station_schedule(TEXT, DATE);
@@ -48,7 +200,19 @@ RETURNS TABLE (
     is_delayed BOOLEAN,
     train_id TEXT
 ) AS $$
+DECLARE
+    v_station_id INTEGER;
 BEGIN
+    -- Najpierw rozwiązujemy stację (indeks idx_stations_name_lower), zamiast filtrować ILIKE w złączeniu
+    SELECT s.id INTO v_station_id
+    FROM stations s
+    WHERE lower(s.name) = lower(p_station_name)
+    LIMIT 1;
+
+    IF v_station_id IS NULL THEN
+        RETURN;
+    END IF;
+
     RETURN QUERY
     SELECT 
         ts.number::TEXT,
@@ -62,18 +226,242 @@ BEGIN
         rs.delay_departure_min,
         (COALESCE(rs.delay_arrival_min, 0) > 5 OR COALESCE(rs.delay_departure_min, 0) > 5) AS is_delayed,
         (to_char(tr.date, 'YYYYMMDD') || ts.number)::TEXT AS train_id
-    FROM run_stops rs
-    JOIN stations s_limit ON rs.station_id = s_limit.id
-    JOIN train_runs tr ON rs.run_id = tr.id
+    FROM train_runs tr
+    JOIN run_stops rs ON rs.run_id = tr.id AND rs.date = tr.date AND rs.station_id = v_station_id
     JOIN train_services ts ON tr.service_id = ts.id
     LEFT JOIN train_categories tc ON ts.category_id = tc.id
     LEFT JOIN stations s_start ON ts.start_station_id = s_start.id
     LEFT JOIN stations s_end ON ts.end_station_id = s_end.id
-    WHERE 
-        s_limit.name ILIKE p_station_name
-        AND (p_date IS NULL OR tr.date = p_date)
+    -- Zakres zamiast "p_date IS NULL OR ...", aby plan generyczny nadal korzystał z indeksu (date, id)
+    WHERE tr.date BETWEEN COALESCE(p_date, '-infinity'::DATE) AND COALESCE(p_date, 'infinity'::DATE)
+        -- Ten sam zakres na run_stops.date pozwala pominąć partycje przystanków z innych miesięcy
+        AND rs.date BETWEEN COALESCE(p_date, '-infinity'::DATE) AND COALESCE(p_date, 'infinity'::DATE)
     ORDER BY 
         COALESCE(rs.scheduled_arrival, rs.scheduled_departure) ASC;
 END;
-$$ LANGUAGE plpgsql SECURITY DEFINER;
+$$ LANGUAGE plpgsql STABLE SECURITY DEFINER;
+
+
+-- Szczegóły przejazdów (podsumowanie + przystanki + utrudnienia) jako tablica dokumentów JSON.
+-- Klucze odpowiadają polom TrainDetail/StopDetail w api/main.py, więc API przekazuje wynik bez przetwarzania.
+-- Przystanki i utrudnienia wszystkich przejazdów są agregowane jednym zapytaniem (GROUP BY run_id),
+-- a p_dates (daty tych przejazdów) ogranicza odczyt run_stops do właściwych partycji.
+DROP FUNCTION IF EXISTS train_details_json(BIGINT[], DATE[]);
+
+-- plpgsql zamiast sql: plan zapytania jest cache'owany w sesji, więc przy wielu partycjach
+-- nie płacimy za planowanie przy każdym wywołaniu.
+CREATE OR REPLACE FUNCTION train_details_json(p_run_ids BIGINT[], p_dates DATE[])
+RETURNS JSON AS $$
+DECLARE
+    v_result JSON;
+BEGIN
+    WITH stop_difficulties AS (
+        SELECT
+            rsd.stop_id,
+            json_agg(json_build_object(
+                'description', d.description,
+                'location', rsd.location
+            )) AS items
+        FROM run_stop_difficulties rsd
+        JOIN run_stops rs ON rs.id = rsd.stop_id AND rs.date = rsd.date
+        JOIN difficulties d ON rsd.difficulty_id = d.id
+        WHERE rs.run_id = ANY(p_run_ids)
+            AND rs.date = ANY(p_dates)
+            AND rsd.date = ANY(p_dates)
+        GROUP BY rsd.stop_id
+    ),
+    run_stop_lists AS (
+        SELECT
+            rs.run_id,
+            json_agg(json_build_object(
+                'station_name', s.name,
+                'stop_order', rs.stop_order,
+                'arrival_time', rs.scheduled_arrival,
+                'departure_time', rs.scheduled_departure,
+                'delay_minutes_arrival', rs.delay_arrival_min,
+                'delay_minutes_departure', rs.delay_departure_min,
+                'distance_from_start_km', rs.distance_from_start_km,
+                'is_domestic', s.is_domestic,
+                'latitude', s.latitude,
+                'longitude', s.longitude,
+                'difficulties', COALESCE(sd.items, '[]'::JSON),
+                'is_cancelled', COALESCE(rs.is_cancelled, FALSE)
+            ) ORDER BY rs.stop_order) AS items
+        FROM run_stops rs
+        JOIN stations s ON rs.station_id = s.id
+        LEFT JOIN stop_difficulties sd ON sd.stop_id = rs.id
+        WHERE rs.run_id = ANY(p_run_ids)
+            AND rs.date = ANY(p_dates)
+        GROUP BY rs.run_id
+    )
+    SELECT json_agg(json_build_object(
+        'id', to_char(trs.date, 'YYYYMMDD') || trs.number,
+        'date', trs.date,
+        'number', trs.number,
+        'name', trs.name,
+        'category', trs.category,
+        'from_station', trs.from_station,
+        'to_station', trs.to_station,
+        'is_domestic', trs.is_domestic,
+        'occupancy', trs.occupancy,
+        'scheduled_departure', trs.scheduled_departure,
+        'scheduled_arrival', trs.scheduled_arrival,
+        'delay_at_destination', trs.delay_at_destination,
+        'is_cancelled', trs.is_cancelled,
+        'stops', COALESCE(rsl.items, '[]'::JSON)
+    ) ORDER BY trs.date, trs.number)
+    INTO v_result
+    FROM train_run_summaries trs
+    LEFT JOIN run_stop_lists rsl ON rsl.run_id = trs.run_id
+    WHERE trs.run_id = ANY(p_run_ids);
+
+    RETURN v_result;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+
+-- Szczegóły jednego przejazdu (/train-runs/{train_id}) — pojedynczy dokument lub NULL.
+DROP FUNCTION IF EXISTS get_train_detail(DATE, TEXT);
+
+CREATE OR REPLACE FUNCTION get_train_detail(p_date DATE, p_number TEXT)
+RETURNS JSON AS $$
+    SELECT train_details_json(
+        ARRAY(
+            SELECT trs.run_id
+            FROM train_run_summaries trs
+            WHERE trs.date = p_date
+                AND trs.number = p_number
+            LIMIT 1
+        ),
+        ARRAY[p_date]
+    ) -> 0;
+$$ LANGUAGE sql STABLE SECURITY DEFINER;
+
+
+-- Szczegóły wielu przejazdów wskazanych parami (data, numer) — endpoint /train-details?ids=...
+-- Nieistniejące przejazdy są pomijane; brak wyników zwraca pustą tablicę.
+DROP FUNCTION IF EXISTS get_train_details(DATE[], TEXT[]);
+
+CREATE OR REPLACE FUNCTION get_train_details(p_dates DATE[], p_numbers TEXT[])
+RETURNS JSON AS $$
+    SELECT COALESCE(train_details_json(
+        ARRAY(
+            SELECT trs.run_id
+            FROM train_run_summaries trs
+            JOIN unnest(p_dates, p_numbers) AS ids(date, number)
+                ON trs.date = ids.date AND trs.number = ids.number
+        ),
+        ARRAY(SELECT DISTINCT unnest(p_dates))
+    ), '[]'::JSON);
+$$ LANGUAGE sql STABLE SECURITY DEFINER;
+
+
+-- Szczegóły przejazdów jednego dnia z filtrami jak w /train-runs (prefiks numeru, stacja początkowa/końcowa)
+-- — endpoint /train-details?date=...; kolejność i limit jak w /train-runs.
+DROP FUNCTION IF EXISTS get_day_train_details(DATE, TEXT, TEXT, INT);
+
+CREATE OR REPLACE FUNCTION get_day_train_details(
+    p_date DATE,
+    p_number TEXT DEFAULT NULL,
+    p_station TEXT DEFAULT NULL,
+    p_limit INT DEFAULT 100
+)
+RETURNS JSON AS $$
+    SELECT COALESCE(train_details_json(
+        ARRAY(
+            SELECT trs.run_id
+            FROM train_run_summaries trs
+            WHERE trs.date = p_date
+                AND trs.number LIKE COALESCE(p_number, '') || '%'
+                AND (p_station IS NULL
+                     OR lower(trs.from_station) = lower(p_station)
+                     OR lower(trs.to_station) = lower(p_station))
+            ORDER BY trs.number
+            LIMIT p_limit
+        ),
+        ARRAY[p_date]
+    ), '[]'::JSON);
+$$ LANGUAGE sql STABLE SECURITY DEFINER;
+
+
+-- Tablice wszystkich stacji dla jednego dnia (eksport statycznych snapshotów, scripts/export_snapshots.py).
+-- Kolumny jak w get_station_schedule, z nazwą stacji na początku; porządek jest deterministyczny,
+-- bo eksport pobiera wynik stronami (.range()).
+DROP FUNCTION IF EXISTS get_day_station_schedules(DATE);
+
+CREATE OR REPLACE FUNCTION get_day_station_schedules(p_date DATE)
+RETURNS TABLE (
+    station_name TEXT,
+    train_number TEXT,
+    train_category TEXT,
+    from_station TEXT,
+    to_station TEXT,
+    scheduled_arrival TIME,
+    scheduled_departure TIME,
+    delay_arrival_min INT,
+    delay_departure_min INT,
+    is_delayed BOOLEAN,
+    train_id TEXT
+) AS $$
+    SELECT
+        s.name::TEXT,
+        ts.number::TEXT,
+        tc.category_code::TEXT,
+        s_start.name::TEXT,
+        s_end.name::TEXT,
+        rs.scheduled_arrival,
+        rs.scheduled_departure,
+        rs.delay_arrival_min,
+        rs.delay_departure_min,
+        (COALESCE(rs.delay_arrival_min, 0) > 5 OR COALESCE(rs.delay_departure_min, 0) > 5),
+        (to_char(tr.date, 'YYYYMMDD') || ts.number)::TEXT
+    FROM train_runs tr
+    JOIN run_stops rs ON rs.run_id = tr.id AND rs.date = tr.date
+    JOIN stations s ON rs.station_id = s.id
+    JOIN train_services ts ON tr.service_id = ts.id
+    LEFT JOIN train_categories tc ON ts.category_id = tc.id
+    LEFT JOIN stations s_start ON ts.start_station_id = s_start.id
+    LEFT JOIN stations s_end ON ts.end_station_id = s_end.id
+    WHERE tr.date = p_date
+        AND rs.date = p_date
+    ORDER BY
+        s.name,
+        COALESCE(rs.scheduled_arrival, rs.scheduled_departure),
+        ts.number,
+        rs.id;
+$$ LANGUAGE sql STABLE SECURITY DEFINER;
+
 
+-- Płaski eksport przejazdów z przystankami (jeden wiersz na przystanek) dla endpointu /export.
+-- Widok jest wstawiany w zapytanie, więc filtr po date (= run_stops.date) ogranicza odczyt do partycji z zakresu.
+CREATE OR REPLACE VIEW view_run_stops_export AS
+SELECT
+    rs.date,
+    to_char(trs.date, 'YYYYMMDD') || trs.number AS train_id,
+    trs.number,
+    trs.name,
+    trs.category,
+    trs.from_station,
+    trs.to_station,
+    trs.is_domestic,
+    trs.occupancy,
+    trs.is_cancelled AS run_is_cancelled,
+    rs.stop_order,
+    s.name AS station_name,
+    rs.scheduled_arrival,
+    rs.scheduled_departure,
+    rs.delay_arrival_min,
+    rs.delay_departure_min,
+    rs.distance_from_start_km::FLOAT8 AS distance_from_start_km,
+    COALESCE(rs.is_cancelled, FALSE) AS stop_is_cancelled,
+    diffs.difficulties
+FROM run_stops rs
+JOIN train_run_summaries trs ON trs.run_id = rs.run_id AND trs.date = rs.date
+JOIN stations s ON rs.station_id = s.id
+LEFT JOIN LATERAL (
+    SELECT string_agg(d.description || COALESCE(' (' || rsd.location || ')', ''), '; ') AS difficulties
+    FROM run_stop_difficulties rsd
+    JOIN difficulties d ON rsd.difficulty_id = d.id
+    WHERE rsd.stop_id = rs.id
+        AND rsd.date = rs.date
+) diffs ON TRUE;
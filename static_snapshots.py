@@ -0,0 +1,59 @@
+import os
+import gzip
+import json
+from functools import lru_cache
+from typing import Any, Optional
+
+# Snapshoty trafiają do katalogu strony (GitHub Pages), więc frontend pobiera je bez udziału API
+SNAPSHOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "docs", "snapshots")
+
+TRAIN_RUNS_SNAPSHOT = "train-runs"
+STATION_SCHEDULES_SNAPSHOT = "stations"
+
+# Kształt rekordów taki sam jak modele TrainSummary i StationScheduleItem w api/main.py
+TRAIN_SUMMARY_FIELDS = [
+    "id", "date", "number", "name", "category", "from_station", "to_station", "is_domestic", "occupancy",
+    "scheduled_departure", "scheduled_arrival", "delay_at_destination", "is_cancelled",
+]
+STATION_SCHEDULE_FIELDS = [
+    "train_number", "train_category", "from_station", "to_station", "scheduled_arrival", "scheduled_departure",
+    "delay_arrival_min", "delay_departure_min", "is_delayed", "train_id",
+]
+
+
+def snapshot_path(date_str: str, name: str, base_dir: str = SNAPSHOT_DIR) -> str:
+    """Ścieżka snapshotu: base_dir/YYYY-MM-DD/<nazwa>.json.gz."""
+    return os.path.join(base_dir, date_str, f"{name}.json.gz")
+
+
+def write_snapshot(date_str: str, name: str, data: Any, base_dir: str = SNAPSHOT_DIR) -> str:
+    """
+    Zapisuje snapshot jako skompresowany, zwarty JSON. Nagłówek gzip nie zawiera czasu (mtime=0),
+    więc ponowny eksport tych samych danych daje identyczny plik i nie tworzy zmian w repozytorium.
+    """
+    path = snapshot_path(date_str, name, base_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    payload = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    with open(path, "wb") as f:
+        f.write(gzip.compress(payload, compresslevel=9, mtime=0))
+    return path
+
+
+def read_snapshot(date_str: str, name: str, base_dir: str = SNAPSHOT_DIR) -> Optional[Any]:
+    """
+    Wczytuje snapshot dnia (z pamięci podręcznej procesu); None, jeśli dzień nie został wyeksportowany.
+    Zapamiętywane są tylko wczytane pliki — snapshot wdrożony po wcześniejszym chybieniu (albo wyeksportowany
+    ponownie) jest widoczny bez restartu workera, kosztem jednego os.stat na żądanie.
+    """
+    path = snapshot_path(date_str, name, base_dir)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    return _load_snapshot(path, mtime)
+
+
+@lru_cache(maxsize=64)
+def _load_snapshot(path: str, mtime: int) -> Any:
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return json.load(f)
@@ -0,0 +1,53 @@
+import os
+import sys
+import json
+import glob
+import logging
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from db_roundtrips import InMemoryClient
+from scripts.check_db_budget import seed_dictionaries
+
+PORTAL_FIXTURES = os.path.join(ROOT, "fixtures", "portal")
+
+
+@pytest.fixture
+def logger() -> logging.Logger:
+    return logging.getLogger("tests")
+
+
+@pytest.fixture
+def portal_trains() -> list:
+    """Pociągi z trasą z korpusu stron portalu (fixtures/portal) w postaci wyjścia get_delays."""
+    trains = []
+    for path in sorted(glob.glob(os.path.join(PORTAL_FIXTURES, "*.expected.json"))):
+        with open(path, encoding="utf-8") as f:
+            fixture = json.load(f)
+        route = fixture["expected"]
+        if not isinstance(route, list):
+            continue
+        trains.append({
+            "number": fixture["train_number"],
+            "name": f"Pociąg {fixture['train_number']}",
+            "category": "IC",
+            "domestic": "Krajowy",
+            "from": route[0]["station_name"],
+            "to": route[-1]["station_name"],
+            "date": fixture["target_date"],
+            "delay_info": route,
+            "is_cancelled": False,
+        })
+    return trains
+
+
+@pytest.fixture
+def backend(portal_trains, logger) -> InMemoryClient:
+    """Baza w pamięci z istniejącymi stacjami i kategoriami (jak w codziennym przebiegu)."""
+    db = InMemoryClient()
+    seed_dictionaries(db, portal_trains, logger)
+    return db
+
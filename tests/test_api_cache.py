@@ -0,0 +1,45 @@
+from datetime import date
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.requests import Request
+
+import api.cache as api_cache
+import api.main as api
+from db_roundtrips import InMemoryClient
+from scripts.check_db_budget import DELAY_MODEL_ROW, train_detail_document
+
+
+def make_request(path: str) -> Request:
+    return Request({"type": "http", "method": "GET", "path": path, "query_string": b"", "headers": []})
+
+
+@pytest.fixture
+def closed_days(monkeypatch):
+    """Każdy dzień przed dzisiejszym jest zamknięty (jak po wdrożeniu jego snapshotu)."""
+    monkeypatch.setattr(api_cache, "is_finalised", lambda day, now=None: day < date.today())
+
+
+def test_train_detail_of_closed_day_is_final(closed_days):
+    assert api_cache.is_final_request(make_request("/train-runs/202510181620"))
+
+
+def test_prediction_of_closed_day_is_live(closed_days, portal_trains):
+    train = portal_trains[0]
+    train_id = train["date"].replace("-", "") + train["number"]
+    path = f"/train-runs/{train_id}/prediction"
+    key = api_cache.request_key_builder(api.predict_train_delay, "fastapi-cache", request=make_request(path),
+                                        kwargs={"train_id": train_id})
+    assert ":live:" in key
+
+    db = InMemoryClient(tables={"delay_models": [dict(DELAY_MODEL_ROW)]},
+                        rpc_results={"get_train_detail": train_detail_document(train)})
+    api.app.dependency_overrides[api.get_db] = lambda: db
+    api.limiter.enabled = False
+    try:
+        with TestClient(api.app) as http:
+            response = http.get(path)
+    finally:
+        api.app.dependency_overrides.clear()
+    assert response.status_code == 200
+    assert "immutable" not in response.headers.get("cache-control", "")
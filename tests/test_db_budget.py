@@ -0,0 +1,33 @@
+import pytest
+
+from db_roundtrips import InMemoryClient
+from scripts.check_db_budget import (
+    API_BUDGETS, check_budgets, measure_api, measure_ingest, seed_api_results, seed_dictionaries,
+)
+
+# Budżety są średnią na pociąg przy paczkach po 100 pociągów — tyle samo co domyślne --limit skryptu
+TRAINS = 200
+
+
+@pytest.fixture
+def day_of_trains(portal_trains) -> list:
+    """Trasy z korpusu portalu powtórzone pod kolejnymi numerami, aby wypełnić pełne paczki zapisu."""
+    return [dict(portal_trains[i % len(portal_trains)], number=str(10000 + i)) for i in range(TRAINS)]
+
+
+def test_round_trips_within_budget(day_of_trains, logger):
+    def backend_factory():
+        db = InMemoryClient()
+        seed_dictionaries(db, day_of_trains, logger)
+        return db
+
+    ingest, backend = measure_ingest(day_of_trains, backend_factory, 0, logger)
+    seed_api_results(backend, day_of_trains)
+    api_results = measure_api(backend, day_of_trains, 0, logger)
+
+    # Każde żądanie przechodzi pełną ścieżkę odpowiedzi, a nie gałąź pustego wyniku lub 404
+    assert set(api_results) == set(API_BUDGETS)
+    for name, result in api_results.items():
+        assert result["status"] == 200, name
+        assert result["items"] > 0, name
+    assert check_budgets(ingest, api_results, logger) == 0
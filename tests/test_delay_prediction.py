@@ -0,0 +1,38 @@
+from datetime import datetime
+
+from delay_prediction import WARSAW_TZ, latest_observed_stop
+
+
+def stop(departure, arrival=None, delay=0, cancelled=False):
+    return {"departure_time": departure, "arrival_time": arrival, "delay_minutes_departure": delay,
+            "delay_minutes_arrival": delay, "is_cancelled": cancelled}
+
+
+def run(*stops, date="2025-10-15"):
+    return {"date": date, "stops": list(stops)}
+
+
+def at(day, hhmm):
+    return datetime.fromisoformat(f"{day}T{hhmm}").replace(tzinfo=WARSAW_TZ)
+
+
+def test_zero_delays_before_departure_are_not_observations():
+    detail = run(stop("08:00:00"), stop("09:00:00", "08:58:00"), stop(None, "10:00:00"))
+    assert latest_observed_stop(detail, now=at("2025-10-15", "07:30")) is None
+    assert latest_observed_stop(detail, now=at("2025-10-15", "08:30")) == 0
+
+
+def test_non_zero_delay_marks_stop_as_passed():
+    detail = run(stop("08:00:00"), stop("09:00:00", "08:58:00", delay=20), stop(None, "10:00:00"))
+    assert latest_observed_stop(detail, now=at("2025-10-15", "08:30")) == 1
+
+
+def test_overnight_stops_belong_to_next_day():
+    detail = run(stop("23:30:00"), stop("00:30:00", "00:28:00"), stop(None, "02:00:00"))
+    assert latest_observed_stop(detail, now=at("2025-10-15", "23:45")) == 0
+    assert latest_observed_stop(detail, now=at("2025-10-16", "00:45")) == 1
+
+
+def test_cancelled_stops_are_skipped():
+    detail = run(stop("08:00:00"), stop("09:00:00", "08:58:00", cancelled=True), stop(None, "10:00:00"))
+    assert latest_observed_stop(detail, now=at("2025-10-15", "09:30")) == 0
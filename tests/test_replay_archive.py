@@ -0,0 +1,40 @@
+import json
+
+from scripts.replay_archive import deduplicate_runs, iter_archive_files
+
+
+def write_dump(directory, scraped_at: str, trains: list) -> str:
+    path = directory / f"train_data_{scraped_at}.json"
+    path.write_text(json.dumps(trains), encoding="utf-8")
+    return str(path)
+
+
+def test_days_are_flushed_once_complete(tmp_path, logger):
+    route = [{"station_name": "A"}]
+    write_dump(tmp_path, "2025-10-15-2200", [{"number": "1620", "date": "2025-10-15", "delay_info": route}])
+    # Pociąg po północy pobrany następnego dnia i błąd scrapu, który nie nadpisuje trasy
+    write_dump(tmp_path, "2025-10-16-0130", [{"number": "3510", "date": "2025-10-15", "delay_info": route},
+                                             {"number": "1620", "date": "2025-10-15", "delay_info": "page_load_timeout"}])
+    write_dump(tmp_path, "2025-10-17-2200", [{"number": "1620", "date": "2025-10-17", "delay_info": route}])
+
+    files_read = []
+
+    def tracked_files():
+        for path in iter_archive_files([str(tmp_path)]):
+            files_read.append(path)
+            yield path
+
+    days = deduplicate_runs(tracked_files(), logger)
+    first = next(days)
+    assert [(t["number"], t["date"]) for t in first] == [("1620", "2025-10-15"), ("3510", "2025-10-15")]
+    assert first[0]["delay_info"] == route
+    assert len(files_read) == 3
+    assert [[t["date"] for t in day] for day in days] == [["2025-10-17"]]
+
+
+def test_files_are_read_in_scrape_order(tmp_path):
+    (tmp_path / "parquet" / "date=2025-10-14").mkdir(parents=True)
+    later = write_dump(tmp_path, "2025-10-15-2200", [])
+    earlier = str(tmp_path / "parquet" / "date=2025-10-14" / "train_data_2025-10-14-220000.parquet")
+    open(earlier, "wb").close()
+    assert list(iter_archive_files([str(tmp_path)])) == [earlier, later]
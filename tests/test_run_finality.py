@@ -0,0 +1,36 @@
+from save_to_postgres import FINAL_MARGIN_MINUTES, _is_run_final
+
+
+def route(*stops) -> list:
+    """Trasa z krotek (przyjazd, odjazd, opóźnienie przyjazdu, opóźnienie odjazdu)."""
+    return [{"arrival_time": arr, "departure_time": dep, "delay_minutes_arrival": arr_delay,
+             "delay_minutes_departure": dep_delay} for arr, dep, arr_delay, dep_delay in stops]
+
+
+def train(delay_info: list, scraped_at: str, date_str: str = "2025-10-11") -> dict:
+    return {"date": date_str, "delay_info": delay_info, "scraped_at": scraped_at}
+
+
+def test_late_train_scraped_before_its_actual_arrival_is_not_final():
+    # 60 min opóźnienia na przedostatniej stacji; stacja końcowa jeszcze bez danych (0), pobranie 30 min po planie
+    late = route((None, "16:00", 0, 0), ("17:00", "17:05", 60, 60), ("18:00", None, 0, 0))
+    assert not _is_run_final(train(late, "2025-10-11T18:30:00+02:00"))
+    assert _is_run_final(train(late, f"2025-10-11T19:{FINAL_MARGIN_MINUTES:02d}:00+02:00"))
+
+
+def test_on_time_train_is_final_after_arrival_and_margin():
+    on_time = route((None, "16:00", 0, 0), ("18:00", None, 0, 0))
+    assert not _is_run_final(train(on_time, "2025-10-11T18:05:00+02:00"))
+    assert _is_run_final(train(on_time, f"2025-10-11T18:{FINAL_MARGIN_MINUTES:02d}:00+02:00"))
+
+
+def test_arrival_after_midnight_counts_next_day():
+    overnight = route((None, "22:10", 0, 0), ("23:50", "23:55", 5, 5), ("01:20", None, 15, 0))
+    assert not _is_run_final(train(overnight, "2025-10-11T23:59:00+02:00"))
+    assert _is_run_final(train(overnight, "2025-10-12T02:00:00+02:00"))
+
+
+def test_without_scrape_time_or_route_is_not_final():
+    on_time = route((None, "16:00", 0, 0), ("18:00", None, 0, 0))
+    assert not _is_run_final({"date": "2025-10-11", "delay_info": on_time})
+    assert not _is_run_final(train("N/A", "2030-01-01T00:00:00"))
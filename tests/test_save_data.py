@@ -0,0 +1,18 @@
+from db_roundtrips import RecordingClient, RoundTripLog
+from save_to_postgres import _load_dictionary_caches, save_data
+
+
+def test_batches_share_caches_and_stats_refresh(backend, portal_trains, logger):
+    caches = _load_dictionary_caches(backend, logger)
+    log = RoundTripLog()
+    client = RecordingClient(backend, log)
+    touched_dates = set()
+
+    for train in portal_trains:
+        save_data([train], logger, supabase=client, caches=caches, touched_dates=touched_dates)
+
+    targets = log.summary()["by_target"]
+    assert not any(t.startswith(("rpc:create_date_partitions", "rpc:refresh_daily_delay_stats")) for t in targets)
+    assert "table:stations:select" not in targets
+    assert touched_dates == {t["date"] for t in portal_trains}
+    assert len(backend.tables["train_runs"]) == len(portal_trains)
@@ -0,0 +1,71 @@
+from save_to_postgres import save_data_bulk
+
+
+def on_date(train: dict, date_str: str) -> dict:
+    return dict(train, date=date_str)
+
+
+def stops_of(db, number: str, date_str: str) -> list:
+    service_ids = {s["id"] for s in db.tables["train_services"] if s["number"] == number}
+    run = next(r for r in db.tables["train_runs"] if r["service_id"] in service_ids and r["date"] == date_str)
+    return [s for s in db.tables["run_stops"] if s["run_id"] == run["id"] and s["date"] == date_str]
+
+
+def by_number(trains: list, number: str) -> dict:
+    return next(t for t in trains if t["number"] == number)
+
+
+def test_overwrite_keeps_runs_outside_batch(backend, portal_trains, logger):
+    first, second = by_number(portal_trains, "1620"), by_number(portal_trains, "3510")
+    days = ("2025-10-15", "2025-10-16")
+    save_data_bulk([on_date(t, d) for t in portal_trains for d in days], logger, workers=1, supabase=backend)
+    keys = [(t["number"], d) for t in portal_trains for d in days]
+    before = {key: len(stops_of(backend, *key)) for key in keys}
+    difficulties_before = len(backend.tables["run_stop_difficulties"])
+
+    # Paczka z (pierwszy, 15.10) i (drugi, 16.10) — iloczyn usług i dat obejmuje też pozostałe dwa przejazdy
+    save_data_bulk([on_date(first, days[0]), on_date(second, days[1])], logger, overwrite=True, workers=1,
+                   supabase=backend)
+
+    after = {key: len(stops_of(backend, *key)) for key in keys}
+    assert after == before
+    assert all(count > 0 for count in after.values())
+    assert len(backend.tables["run_stop_difficulties"]) == difficulties_before
+
+
+def test_overwrite_without_route_keeps_existing_stops(backend, portal_trains, logger):
+    train = portal_trains[0]
+    save_data_bulk([train], logger, workers=1, supabase=backend)
+    stops_before = len(stops_of(backend, train["number"], train["date"]))
+
+    save_data_bulk([dict(train, delay_info=[])], logger, overwrite=True, workers=1, supabase=backend)
+
+    assert len(stops_of(backend, train["number"], train["date"])) == stops_before
+
+
+def test_creates_partitions_for_replayed_dates(backend, portal_trains, logger):
+    calls = []
+    rpc = backend.rpc
+
+    def recording_rpc(fn, params=None):
+        calls.append((fn, params))
+        return rpc(fn, params)
+
+    backend.rpc = recording_rpc
+    save_data_bulk([on_date(t, "2024-03-15") for t in portal_trains] + [on_date(portal_trains[0], "2024-05-02")],
+                   logger, workers=1, supabase=backend)
+
+    partitions = [params for fn, params in calls if fn == "create_date_partitions"]
+    assert len(partitions) == 1
+    assert partitions[0]["p_from"] <= "2024-03-01"
+    assert partitions[0]["p_to"] >= "2024-05-02"
+
+
+def test_overwrite_keeps_final_flag(backend, portal_trains, logger):
+    train = portal_trains[0]
+    # Pobrany dzień po kursie (ostateczny), potem powtórka ze starszego zrzutu bez czasu pobrania
+    save_data_bulk([dict(train, scraped_at=f"{train['date']}T23:59:00")], logger, workers=1, supabase=backend)
+    save_data_bulk([train], logger, overwrite=True, workers=1, supabase=backend)
+
+    run = next(r for r in backend.tables["train_runs"] if r["date"] == train["date"])
+    assert run["is_final"] is True
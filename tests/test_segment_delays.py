@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+
+from segment_delays import compute_segments
+
+
+def stops_frame(rows: list) -> pd.DataFrame:
+    """Przystanki jednego przejazdu z krotek (przyjazd, odjazd, opóźnienie przyjazdu, opóźnienie odjazdu) w minutach doby."""
+    return pd.DataFrame({
+        "run_id": 1,
+        "date": "2025-10-11",
+        "stop_order": range(1, len(rows) + 1),
+        "station_id": range(10, 10 + len(rows)),
+        "scheduled_arrival_min": [r[0] for r in rows],
+        "scheduled_departure_min": [r[1] for r in rows],
+        "delay_arrival_min": [float(r[2]) for r in rows],
+        "delay_departure_min": [float(r[3]) for r in rows],
+        "distance_from_start_km": [10.0 * i for i in range(len(rows))],
+        "is_cancelled": 0,
+    })
+
+
+def test_terminal_stop_placeholder_departure_delay_is_ignored():
+    # Scraper zapisuje brak odjazdu na stacji końcowej jako opóźnienie 0
+    segments = compute_segments(stops_frame([
+        (np.nan, 600.0, 0, 0),
+        (660.0, 665.0, 5, 5),
+        (720.0, np.nan, 10, 0),
+    ]))
+
+    last = segments.iloc[-1]
+    assert last["delay_gain_min"] == 5
+    assert last["recovery_min"] == 0
+    assert pd.isna(last["dwell_overrun_min"])
+
+
+def test_origin_placeholder_arrival_delay_is_ignored():
+    segments = compute_segments(stops_frame([
+        (np.nan, 600.0, 0, 7),
+        (660.0, np.nan, 4, 0),
+    ]))
+
+    first = segments.iloc[0]
+    assert first["delay_gain_min"] == -3
+    assert first["recovery_min"] == 3
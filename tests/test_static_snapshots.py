@@ -0,0 +1,23 @@
+import os
+
+from static_snapshots import TRAIN_RUNS_SNAPSHOT, read_snapshot, snapshot_path, write_snapshot
+
+
+def test_snapshot_deployed_after_miss_is_read(tmp_path):
+    base_dir = str(tmp_path)
+    assert read_snapshot("2025-10-15", TRAIN_RUNS_SNAPSHOT, base_dir) is None
+
+    write_snapshot("2025-10-15", TRAIN_RUNS_SNAPSHOT, [{"number": "1620"}], base_dir)
+    assert read_snapshot("2025-10-15", TRAIN_RUNS_SNAPSHOT, base_dir) == [{"number": "1620"}]
+
+
+def test_reexported_snapshot_replaces_cached_one(tmp_path):
+    base_dir = str(tmp_path)
+    write_snapshot("2025-10-15", TRAIN_RUNS_SNAPSHOT, [{"number": "1620"}], base_dir)
+    assert read_snapshot("2025-10-15", TRAIN_RUNS_SNAPSHOT, base_dir) == [{"number": "1620"}]
+
+    path = write_snapshot("2025-10-15", TRAIN_RUNS_SNAPSHOT, [{"number": "3510"}], base_dir)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert read_snapshot("2025-10-15", TRAIN_RUNS_SNAPSHOT, base_dir) == [{"number": "3510"}]
+    assert path == snapshot_path("2025-10-15", TRAIN_RUNS_SNAPSHOT, base_dir)